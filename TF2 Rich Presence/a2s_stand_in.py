@@ -0,0 +1,131 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+
+import collections
+import socket
+import struct
+import threading
+from typing import Deque, List, Optional, Tuple
+
+
+# a fake TF2 server on localhost that speaks just enough A2S (info, players, challenges, split packets) to test and benchmark server.py without the internet
+# it can also be told to misbehave: delay replies, drop requests, or send garbage. behaviour is set with attributes and can be changed while it's running
+class StandInServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.socket: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.05)  # so that serve() notices close() (closing doesn't interrupt a blocking recvfrom on Linux)
+        self.address: str = f'{host}:{self.socket.getsockname()[1]}'  # formatted like GameState.server_address
+        self.thread: Optional[threading.Thread] = None
+        self.running: bool = False
+
+        self.server_name: str = "Stand-in server"
+        self.map_name: str = 'pl_upward'
+        self.keywords: str = 'payload'
+        self.max_players: int = 24
+        self.players: List[Tuple[str, int, float]] = []  # name, score, seconds connected
+        self.bots: int = 0
+        self.challenge: Optional[int] = 0x4B617461  # None to not require one
+        self.split_size: Optional[int] = None  # split replies into fragments with this many bytes of payload each
+        self.delay: float = 0.0  # seconds before replying
+
+        # per-request behaviour, used up in order before falling back to replying normally: 'reply', 'drop', 'malformed', or 'challenge' (send one even if not needed)
+        self.script: Deque[str] = collections.deque()
+        self.requests: List[int] = []  # types of requests received (0x54 info, 0x55 players)
+        self.replies: int = 0
+        self.next_message_id: int = 1
+
+    def __repr__(self) -> str:
+        return f"a2s_stand_in.StandInServer ({self.address}, {len(self.players)} players, requests={len(self.requests)}, replies={self.replies})"
+
+    def start(self) -> 'StandInServer':
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, name=f'A2S stand-in {self.address}', daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.running = False
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+        self.socket.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                request, client = self.socket.recvfrom(1400)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            if len(request) < 5 or request[:4] != b'\xFF\xFF\xFF\xFF' or request[4] not in (a2s_info_request, a2s_players_request):
+                continue
+
+            self.requests.append(request[4])
+            action: str = self.script.popleft() if self.script else 'reply'
+
+            if action == 'drop':
+                continue
+            elif action == 'malformed':
+                self.send(b'\xFF\xFF\xFF\xFF' + bytes((a2s_info_response if request[4] == a2s_info_request else a2s_players_response,)) + b'\x11tru', client)
+            elif action == 'challenge' or (self.challenge is not None and self.request_challenge(request) != self.challenge):
+                self.send(b'\xFF\xFF\xFF\xFF' + bytes((a2s_challenge_response,)) + struct.pack('<I', self.challenge or 0), client)
+            else:
+                self.send(self.info_reply() if request[4] == a2s_info_request else self.players_reply(), client)
+
+    # info requests have the challenge at the end (if at all), players requests always have one (-1 or 0 for "please give me one")
+    def request_challenge(self, request: bytes) -> Optional[int]:
+        if request[4] == a2s_info_request:
+            return struct.unpack('<I', request[-4:])[0] if len(request) == 5 + len(b'Source Engine Query\x00') + 4 else None
+        else:
+            return struct.unpack('<I', request[5:9])[0] if len(request) >= 9 else None
+
+    def send(self, packet: bytes, client: tuple):
+        packets: List[bytes] = self.split(packet) if self.split_size and packet[4] != a2s_challenge_response else [packet]
+
+        for packet_part in packets:
+            if self.delay:
+                threading.Timer(self.delay, self.send_now, (packet_part, client)).start()
+            else:
+                self.send_now(packet_part, client)
+
+        self.replies += 1
+
+    def send_now(self, packet: bytes, client: tuple):
+        try:
+            self.socket.sendto(packet, client)
+        except OSError:
+            pass
+
+    # Source engine style split packets (uncompressed), sent in reverse order to make sure the client actually reassembles them
+    def split(self, packet: bytes) -> List[bytes]:
+        chunks: List[bytes] = [packet[position:position + self.split_size] for position in range(0, len(packet), self.split_size)]
+        message_id: int = self.next_message_id
+        self.next_message_id += 1
+        return [b'\xFE\xFF\xFF\xFF' + struct.pack('<IBBH', message_id, len(chunks), chunk_number, self.split_size) + chunk for chunk_number, chunk in reversed(tuple(enumerate(chunks)))]
+
+    def info_reply(self) -> bytes:
+        return b''.join((b'\xFF\xFF\xFF\xFF', bytes((a2s_info_response, 17)), cstring(self.server_name), cstring(self.map_name), cstring('tf'), cstring('Team Fortress'),
+                         struct.pack('<HBBBccBB', 440, len(self.players), self.max_players, self.bots, b'd', b'l', 0, 1), cstring('8635208'),
+                         bytes((edf_keywords | edf_game_id,)), cstring(self.keywords), struct.pack('<Q', 440)))
+
+    def players_reply(self) -> bytes:
+        return b'\xFF\xFF\xFF\xFF' + bytes((a2s_players_response, len(self.players))) + \
+               b''.join(bytes((index,)) + cstring(name) + struct.pack('<if', score, duration) for index, (name, score, duration) in enumerate(self.players))
+
+
+def cstring(text: str) -> bytes:
+    return text.encode('UTF8') + b'\x00'
+
+
+a2s_info_request: int = 0x54
+a2s_players_request: int = 0x55
+a2s_info_response: int = 0x49
+a2s_players_response: int = 0x44
+a2s_challenge_response: int = 0x41
+edf_keywords: int = 0x20
+edf_game_id: int = 0x01
@@ -0,0 +1,498 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import psutil
+
+import a2s_stand_in
+import console_log
+import logger
+import processes
+import server
+import settings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmarks console.log parsing, with synthetic logs so that TF2/Steam/Discord aren't needed")
+    arg_parser.add_argument('--compare', action='store_true', help="Compare parsing methods on the big test console.logs instead")
+    arg_parser.add_argument('--servers', action='store_true', help="Benchmark server queries against local A2S stand-ins instead")
+    arg_parser.add_argument('--processes', action='store_true', help="Benchmark process scanning against generated /proc trees instead")
+    arg_parser.add_argument('--scenarios', nargs='+', choices=tuple(synthetic_scenarios), default=list(synthetic_scenarios), help="Which synthetic scenarios to run")
+    arg_parser.add_argument('--full', action='store_true', help="Include the 100 MB and 1 GB logs (slow)")
+    arg_parser.add_argument('--save-baseline', metavar='PATH', help="Save the results as a JSON baseline")
+    arg_parser.add_argument('--check', metavar='PATH', help="Compare the results against a JSON baseline, exits with 1 on regressions")
+    arg_parser.add_argument('--tolerance', type=float, default=0.25, help="How much worse than the baseline counts as a regression (default 0.25 = 25%%)")
+    args = arg_parser.parse_args()
+
+    os.makedirs('logs', exist_ok=True)
+    log = logger.Log(os.path.join('logs', 'benchmarks.log'))
+    log.force_disabled = True
+    log.to_stderr = False
+
+    if args.compare:
+        compare_parsing_methods(log)
+        return
+
+    if args.servers:
+        results: Dict[str, Dict[str, float]] = run_server_suite(log)
+    elif args.processes:
+        results = run_process_suite(log)
+    else:
+        sizes: Tuple[int, ...] = synthetic_sizes if args.full else synthetic_sizes[:3]
+        results = run_suite(log, args.scenarios, sizes)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'time': int(time.time()), 'results': results}, baseline_file, indent=4)
+
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.check:
+        with open(args.check, 'r') as baseline_file:
+            regressions: List[str] = find_regressions(json.load(baseline_file)['results'], results, args.tolerance)
+
+        if regressions:
+            print(f"{len(regressions)} regression(s) compared to {args.check}:")
+
+            for regression in regressions:
+                print(f"  {regression}")
+
+            sys.exit(1)
+        else:
+            print(f"No regressions compared to {args.check}")
+
+
+# generates each scenario at each size, then times interpret() on it a few ways
+def run_suite(log: logger.Log, scenarios: List[str], sizes: Tuple[int, ...]) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for scenario in scenarios:
+            for size in sizes:
+                console_log_path: str = os.path.join(temp_dir, 'console.log')
+                line_count: int = generate_console_log(console_log_path, scenario, size)
+                result_name: str = f'{scenario}/{format_size(size)}'
+                results[result_name] = benchmark_synthetic(log, console_log_path, scenario, line_count)
+                result: Dict[str, float] = results[result_name]
+                print(f"{result_name} ({line_count} lines): fresh scan {result['fresh_scan_ms']} ms, full parse {result['full_parse_mb_s']} MB/s "
+                      f"({result['full_parse_lines_s']} lines/s), incremental scans p50 {result['incremental_p50_ms']} ms / p95 {result['incremental_p95_ms']} ms, "
+                      f"restart scan {result['restart_scan_ms']} ms, peak memory {result['peak_memory_mb']} MB")
+                os.remove(console_log_path)
+
+    return results
+
+
+def benchmark_synthetic(log: logger.Log, console_log_path: str, scenario: str, line_count: int) -> Dict[str, float]:
+    console_log_size: int = os.stat(console_log_path).st_size
+    runs: int = 10 if console_log_size < 104857600 else 3
+
+    # what happens when the program (or TF2) starts: no parser state, scan back from EOF
+    fresh_scan_times: List[float] = benchmark(lambda: BenchmarkApp(log).scan(console_log_path, True), runs)
+
+    # the worst case for resuming: parsing every byte of the file
+    full_parse_times: List[float] = benchmark(lambda: parse_markers(log, console_log_path), runs)
+    peak: int = max(peak_memory(lambda: BenchmarkApp(log).scan(console_log_path, True)), peak_memory(lambda: parse_markers(log, console_log_path)))
+
+    # the normal case: TF2 appends a bit, then the main loop scans again
+    app: BenchmarkApp = BenchmarkApp(log)
+    app.scan(console_log_path, True)
+    append_rng: random.Random = random.Random(1)
+    incremental_times: List[float] = []
+
+    for _ in range(incremental_scans):
+        with open(console_log_path, 'ab') as console_log_file:
+            console_log_file.write(b''.join(synthetic_lines(append_rng, scenario, incremental_append_units)))
+
+        start_time: float = time.perf_counter()
+        app.scan(console_log_path, False)
+        incremental_times.append(time.perf_counter() - start_time)
+
+    # restarting the program mid-game: no parser, but the last one's checkpoint
+    app.console_log_checkpoint.save(app.console_log_parser, True)
+    restart_scan_times: List[float] = benchmark(lambda: BenchmarkApp(log).scan(console_log_path, False), runs)
+    app.console_log_checkpoint.discard()
+
+    incremental_times.sort()
+    return {'size_bytes': console_log_size,
+            'lines': line_count,
+            'fresh_scan_ms': round(min(fresh_scan_times) * 1000, 3),
+            'full_parse_mb_s': round(console_log_size / 1048576 / min(full_parse_times), 1),
+            'full_parse_lines_s': round(line_count / min(full_parse_times)),
+            'incremental_p50_ms': round(statistics.median(incremental_times) * 1000, 3),
+            'incremental_p95_ms': round(incremental_times[int(len(incremental_times) * 0.95)] * 1000, 3),
+            'restart_scan_ms': round(min(restart_scan_times) * 1000, 3),
+            'peak_memory_mb': round(peak / 1048576, 2)}
+
+
+# times server queries against stand-in servers that behave in a few different ways
+def run_server_suite(log: logger.Log) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    for condition in server_conditions:
+        result_name: str = f'server/{condition}'
+        results[result_name] = benchmark_server_queries(log, condition)
+        result: Dict[str, float] = results[result_name]
+        print(f"{result_name}: query p50 {result['query_p50_ms']} ms / p95 {result['query_p95_ms']} ms, {result['queries_s']} queries/s over {server_benchmark_servers} servers, "
+              f"main thread {result['main_thread_ms']} ms per query")
+
+    return results
+
+
+# latency is one server queried over and over (like the main loop does), throughput is many servers queried at once
+def benchmark_server_queries(log: logger.Log, condition: str) -> Dict[str, float]:
+    query_engine: server.QueryEngine = server.QueryEngine(log)
+    stand_ins: List[a2s_stand_in.StandInServer] = [a2s_stand_in.StandInServer().start() for _ in range(server_benchmark_servers)]
+    addresses: List[Tuple[str, int]] = []
+
+    for stand_in in stand_ins:
+        stand_in.players = [(name, score, 60.0) for score, name in enumerate(synthetic_names)]
+        stand_in.split_size = 64 if condition == 'split' else None
+        stand_in.delay = 0.002 if condition == 'slow' else 0.0
+        addresses.append((stand_in.address.split(':')[0], int(stand_in.address.split(':')[1])))
+
+    query_times: List[float] = []
+    main_thread_times: List[float] = []
+
+    for _ in range(server_benchmark_queries):
+        start_time: float = time.perf_counter()
+        query: concurrent.futures.Future = query_engine.query(addresses[0], True, True, server_benchmark_timeout)
+        main_thread_times.append(time.perf_counter() - start_time)
+        query.result()
+        query_times.append(time.perf_counter() - start_time)
+
+    throughput_times: List[float] = benchmark(lambda: [query.result() for query in [query_engine.query(address, True, True, server_benchmark_timeout) for address in addresses]], 10)
+    query_engine.close()
+
+    for stand_in in stand_ins:
+        stand_in.close()
+
+    query_times.sort()
+    return {'query_p50_ms': round(statistics.median(query_times) * 1000, 3),
+            'query_p95_ms': round(query_times[int(len(query_times) * 0.95)] * 1000, 3),
+            'queries_s': round(server_benchmark_servers / min(throughput_times)),
+            'main_thread_ms': round(statistics.median(main_thread_times) * 1000, 3)}
+
+
+# times finding TF2, Steam, and Discord's PIDs by reading /proc directly against walking it with psutil, on fake /proc trees so that the process count is known
+def run_process_suite(log: logger.Log) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    for process_count in process_benchmark_counts:
+        result_name: str = f'processes/{process_count}'
+        results[result_name] = benchmark_process_scanning(log, process_count)
+        result: Dict[str, float] = results[result_name]
+        print(f"{result_name}: procfs scan {result['procfs_scan_ms']} ms, psutil scan {result['psutil_scan_ms']} ms ({result['speedup']}x faster), "
+              f"steady state scan {result['steady_scan_ms']} ms")
+
+    return results
+
+
+def benchmark_process_scanning(log: logger.Log, process_count: int) -> Dict[str, float]:
+    process_scanner: processes.ProcessScanner = processes.ProcessScanner(log)
+    old_roots: Tuple[str, str] = (processes.procfs_root, psutil.PROCFS_PATH)
+
+    # both start from no known PIDs each time, the worst case
+    def find_pids(method: Callable) -> Dict[str, Optional[int]]:
+        for program in process_scanner.process_data:
+            process_scanner.process_data[program]['pid'] = None
+
+        method()
+        return {program: process_scanner.process_data[program]['pid'] for program in process_scanner.process_data}
+
+    with tempfile.TemporaryDirectory() as procfs_root:
+        expected_pids: Dict[str, int] = generate_procfs(procfs_root, process_count)
+        processes.procfs_root = psutil.PROCFS_PATH = procfs_root
+
+        try:
+            if find_pids(process_scanner.find_pids_procfs) != expected_pids or find_pids(process_scanner.find_pids_psutil) != expected_pids:
+                raise AssertionError(f"Process scanning found the wrong PIDs (expected {expected_pids})")
+
+            procfs_times: List[float] = benchmark(lambda: find_pids(process_scanner.find_pids_procfs), process_benchmark_runs)
+            psutil_times: List[float] = benchmark(lambda: find_pids(process_scanner.find_pids_psutil), process_benchmark_runs)
+
+            # the usual case: everything's already been found, and just needs to be checked to still be running
+            steady_scanner: processes.ProcessScanner = processes.ProcessScanner(log)
+            steady_scanner.process_watcher.pidfd_failed = True  # the PIDs aren't real, so this is the cost without pidfds (with them it's one select())
+            steady_scanner.probes = {}
+            steady_scanner.scan_posix()
+            steady_times: List[float] = benchmark(steady_scanner.scan_posix, process_benchmark_runs)
+        finally:
+            processes.procfs_root, psutil.PROCFS_PATH = old_roots
+
+    return {'procfs_scan_ms': round(min(procfs_times) * 1000, 3),
+            'psutil_scan_ms': round(min(psutil_times) * 1000, 3),
+            'steady_scan_ms': round(min(steady_times) * 1000, 3),
+            'speedup': round(min(psutil_times) / min(procfs_times), 1)}
+
+
+# compares metrics where they exist in both, higher is worse for everything except throughput
+def find_regressions(baseline: Dict[str, Dict[str, float]], results: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions: List[str] = []
+
+    for result_name in results:
+        if result_name not in baseline:
+            continue
+
+        for metric in ('fresh_scan_ms', 'full_parse_mb_s', 'full_parse_lines_s', 'incremental_p50_ms', 'incremental_p95_ms', 'restart_scan_ms', 'peak_memory_mb',
+                       'query_p50_ms', 'query_p95_ms', 'queries_s', 'main_thread_ms', 'procfs_scan_ms', 'psutil_scan_ms', 'steady_scan_ms'):
+            if metric not in baseline[result_name]:
+                continue
+
+            baseline_value: float = baseline[result_name][metric]
+            value: float = results[result_name][metric]
+
+            if metric in ('full_parse_mb_s', 'full_parse_lines_s', 'queries_s'):
+                regressed: bool = value * (1 + tolerance) < baseline_value
+            elif metric.endswith('_ms'):
+                regressed = value > baseline_value * (1 + tolerance) and value - baseline_value > timing_noise_ms  # sub-millisecond scans are mostly noise
+            else:
+                regressed = value > baseline_value * (1 + tolerance)
+
+            if regressed:
+                regressions.append(f"{result_name} {metric}: {value} (baseline {baseline_value})")
+
+    return regressions
+
+
+# write a console.log that looks sort of like a real one, made of randomly chosen (but seeded) bits from a scenario
+def generate_console_log(path: str, scenario: str, size: int, seed: int = 0) -> int:
+    rng: random.Random = random.Random(seed)
+    written_bytes: int = 0
+    line_count: int = 0
+
+    with open(path, 'wb') as console_log_file:
+        while written_bytes < size:
+            block: bytes = b''.join(synthetic_lines(rng, scenario, 1000))
+
+            if written_bytes + len(block) > size:
+                block = block[:block.rfind(b'\n', 0, size - written_bytes) + 1]  # end on a whole line, so appending later works like it would in TF2
+
+                if not block:
+                    break
+
+            console_log_file.write(block)
+            written_bytes += len(block)
+            line_count += block.count(10)
+
+    return line_count
+
+
+# each unit is one thing happening in game, which can be more than one line
+def synthetic_lines(rng: random.Random, scenario: str, units: int) -> List[bytes]:
+    kinds: Tuple[str, ...] = tuple(synthetic_scenarios[scenario])
+    lines: List[bytes] = []
+
+    for kind in rng.choices(kinds, weights=tuple(synthetic_scenarios[scenario].values()), k=units):
+        if kind == 'kill':
+            lines.append(f"{rng.choice(synthetic_names)} killed {rng.choice(synthetic_names)} with {rng.choice(synthetic_weapons)}.{rng.choice(('', ' (crit)'))}\n".encode())
+        elif kind == 'chat':
+            lines.append(f"{rng.choice(('', '*DEAD* ', '(TEAM) '))}{rng.choice(synthetic_names)} :  {rng.choice(synthetic_messages)}\n".encode())
+        elif kind == 'queue':
+            lines.append(rng.choice((b'[PartyClient] Entering queue for match group 12v12 Casual Match\n', b'[PartyClient] Leaving queue\n',
+                                     b'[PartyClient] Entering queue for match group MvM Practice\n')))
+        elif kind == 'transition':
+            if rng.random() < 0.5:
+                lines.append(f"Connected to 169.254.{rng.randrange(256)}.{rng.randrange(256)}:27015\nTeam Fortress\nMap: {rng.choice(synthetic_maps)}\n"
+                             f"Players: {rng.randrange(1, 25)} / 24\nBuild: 6121893\nServer Number: {rng.randrange(1, 20)}\n".encode())
+            else:
+                lines.append(rng.choice((b'Disconnect: Server shutting down.\n', b'Lobby destroyed\n', b'Disconnect: Kicked by Console.\n')))
+        elif kind == 'class':
+            lines.append(f"{rng.choice(synthetic_classes)} selected \n".encode())
+        elif kind == 'blank':
+            lines.append(b'\n' * rng.randrange(1, 20))  # bots
+        elif kind == 'error':
+            lines.append(rng.choice((b'Attemped to precache unknown particle system "blood_impact_red"!\n', b'DataTable warning: (class player): Out-of-range value (-1.0) in '
+                                     b'SendPropFloat \'m_flWeaponBar\', clamping.\n', b'SOLID_VPHYSICS static prop with no vphysics model! (models/props_gameplay/sign.mdl)\n')))
+        else:
+            lines.append(rng.choice((b'Saving C:\\Steam\\steamapps\\common\\Team Fortress 2\\tf\\custom\\Hitsound.vpk.sound.cache\n',
+                                     b'--- Missing Vgui material vgui/..\\vgui\\maps\\menu_thumb_Missing\n',
+                                     b'CMaterial::PrecacheVars: error loading vmt file for effects/jumper_arrow\n', b'Differing lobby received.\n')))
+
+    return lines
+
+
+# a fake /proc with enough in it for psutil (and procfs_pids) to find processes: a boot time, and each process's name, stat, cmdline, and cwd. only one of each of
+# TF2, Steam, and Discord is made, and returns their PIDs
+def generate_procfs(path: str, process_count: int, seed: int = 0) -> Dict[str, int]:
+    rng: random.Random = random.Random(seed)
+    pids: List[int] = sorted(rng.sample(range(2, process_count * 20), process_count))
+    names: List[str] = rng.choices(synthetic_process_names, k=process_count)
+    programs: Dict[str, int] = {}
+
+    for program, program_name in zip(('TF2', 'Steam', 'Discord'), ('hl2_linux', 'steam', 'Discord')):
+        program_index: int = rng.randrange(process_count)
+
+        while names[program_index] in ('hl2_linux', 'steam', 'Discord'):
+            program_index = rng.randrange(process_count)
+
+        names[program_index] = program_name
+        programs[program] = pids[program_index]
+
+    with open(os.path.join(path, 'stat'), 'w') as stat_file:
+        stat_file.write(f"cpu  0 0 0 0 0 0 0 0 0 0\nbtime {int(time.time()) - 3600}\n")
+
+    for pid, name in zip(pids, names):
+        process_path: str = os.path.join(path, str(pid))
+        os.mkdir(process_path)
+
+        with open(os.path.join(process_path, 'comm'), 'w') as comm_file:
+            comm_file.write(f'{name}\n')
+        with open(os.path.join(process_path, 'stat'), 'w') as stat_file:
+            stat_file.write(f"{pid} ({name}) S 1 {pid} {pid} 0 -1 4194560 100 0 0 0 10 5 0 0 20 0 1 0 {rng.randrange(100, 300000)} 1000000 100 18446744073709551615 0 0 0 0 "
+                            f"0 0 0 0 0 0 0 0 17 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n")
+        with open(os.path.join(process_path, 'cmdline'), 'w') as cmdline_file:
+            cmdline_file.write(f'/usr/bin/{name}\0-condebug\0' if name == 'hl2_linux' else f'/usr/bin/{name}\0')
+
+        os.symlink(path, os.path.join(process_path, 'cwd'))
+
+    return programs
+
+
+# just enough of main.TF2RichPresense for console_log.interpret(), without a GUI
+class BenchmarkApp:
+    def __init__(self, log: logger.Log):
+        self.log: logger.Log = log
+        self.gui: BenchmarkGUI = BenchmarkGUI()
+        self.no_condebug: bool = False
+        self.console_log_mtime: Optional[Tuple[int, int]] = None
+        self.old_console_log_mtime: Optional[Tuple[int, int]] = None
+        self.cleanup_primed: bool = False
+        self.console_log_parser: Optional[console_log.ConsoleLogParser] = None
+        self.console_log_cleaner: Optional[console_log.ConsoleLogCleaner] = None
+        self.console_scan_window: console_log.ScanWindow = console_log.ScanWindow(log)
+        self.console_log_checkpoint: console_log.ConsoleLogCheckpoint = console_log.ConsoleLogCheckpoint(log, os.path.join(tempfile.gettempdir(), 'tf2rpbenchmark_checkpoint.json'))
+
+    def __repr__(self) -> str:
+        return f"benchmarks.BenchmarkApp ({self.console_log_parser})"
+
+    # trimming and cleaning are disabled by an infinite size limit and never priming cleanup, since they'd change the file being measured
+    def scan(self, console_log_path: str, fresh: bool) -> Optional[Tuple[bool, str, str, str, str, bool]]:
+        self.cleanup_primed = False
+        parsed: Optional[Tuple[bool, str, str, str, str, bool]] = console_log.interpret(self, console_log_path, benchmark_usernames,
+                                                                                      float(settings.get('console_scan_kb')) if fresh else float('inf'), fresh)
+        self.old_console_log_mtime = self.console_log_mtime
+        return parsed
+
+
+class BenchmarkGUI:
+    def __init__(self):
+        self.clean_console_log: bool = False
+
+    def set_cleanup_progress(self, progress: Optional[float]):
+        pass
+
+    def set_bottom_text(self, state: str, enabled: bool):
+        pass
+
+    def safe_update(self):
+        pass
+
+
+# times parsing the big test console.logs a few different ways, to make sure console_log.py changes are actually improvements
+def compare_parsing_methods(log: logger.Log):
+    for console_log_path in (os.path.join('test_resources', 'console_chat.log'), os.path.join('test_resources', 'console_canceled_load.log')):
+        console_log_size = os.stat(console_log_path).st_size
+        print(f"{console_log_path} ({round(console_log_size / 1048576, 2)} MB)")
+        line_loop_times = benchmark(lambda: parse_every_line(log, console_log_path))
+        scanner_times = benchmark(lambda: parse_markers(log, console_log_path))
+        backward_times = benchmark(lambda: parse_backward(log, console_log_path))
+        print_times("Line loop", line_loop_times, console_log_size, peak_memory(lambda: parse_every_line(log, console_log_path)))
+        print_times("Marker scanner", scanner_times, console_log_size, peak_memory(lambda: parse_markers(log, console_log_path)))
+        print_times("Backward scan", backward_times, console_log_size, peak_memory(lambda: parse_backward(log, console_log_path)))
+        print(f"  Speedup: {round(min(line_loop_times) / min(scanner_times), 2)}x (scanner), {round(min(line_loop_times) / min(backward_times), 2)}x (backward)\n")
+
+
+# the pre-scanner way: every line gets decoded and split out of the file, and goes through the whole substring cascade
+def parse_every_line(log, console_log_path):
+    parser = console_log.ConsoleLogParser(log, console_log_path, {'not Kataiser'})
+
+    with open(console_log_path, 'r', errors='replace', encoding=parser.encoding) as console_log_file:
+        for line in console_log_file.readlines():
+            parser.parse_line(line)
+
+    return parser
+
+
+# one regex over the whole (undecoded) buffer, only lines with markers get decoded and parsed (used when resuming)
+def parse_markers(log, console_log_path):
+    parser = console_log.ConsoleLogParser(log, console_log_path, {'not Kataiser'})
+    parser.feed(parser.read(os.stat(console_log_path), 0))
+    return parser
+
+
+# the current way for fresh scans: only read back from EOF as far as is needed, then parse that with the marker scanner
+def parse_backward(log, console_log_path):
+    parser = console_log.ConsoleLogParser(log, console_log_path, {'not Kataiser'})
+    parser.feed(parser.read_backward(os.stat(console_log_path), 0))
+    return parser
+
+
+def benchmark(func: Callable, runs: int = 10) -> List[float]:
+    times = []
+
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+
+    return times
+
+
+# the most memory allocated at once (by Python) while running a function
+def peak_memory(func: Callable) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def print_times(name, times, size, peak):
+    print(f"  {name}: best {round(min(times) * 1000, 1)} ms, median {round(statistics.median(times) * 1000, 1)} ms ({round(size / 1048576 / min(times), 1)} MB/s), "
+          f"peak memory {round(peak / 1048576, 2)} MB")
+
+
+def format_size(size: int) -> str:
+    return f'{size // 1024} KB' if size < 1048576 else f'{size // 1048576} MB'
+
+
+# relative weights of each kind of unit, see synthetic_lines()
+synthetic_scenarios: Dict[str, Dict[str, int]] = {'casual': {'kill': 40, 'chat': 10, 'queue': 1, 'transition': 1, 'class': 2, 'blank': 5, 'error': 10, 'misc': 30},
+                                                  'chatty': {'kill': 15, 'chat': 70, 'queue': 1, 'transition': 1, 'class': 1, 'blank': 2, 'error': 5, 'misc': 5},
+                                                  'bot_spam': {'kill': 20, 'chat': 5, 'queue': 1, 'transition': 1, 'class': 1, 'blank': 60, 'error': 5, 'misc': 7},
+                                                  'queueing': {'kill': 5, 'chat': 5, 'queue': 30, 'transition': 10, 'class': 10, 'blank': 5, 'error': 15, 'misc': 20}}
+server_conditions: Tuple[str, ...] = ('clean', 'split', 'slow')  # normal replies, split into fragments, and slightly delayed
+server_benchmark_servers: int = 32
+server_benchmark_queries: int = 200
+server_benchmark_timeout: float = 2.0
+process_benchmark_counts: Tuple[int, ...] = (500, 2000, 5000)
+process_benchmark_runs: int = 5
+synthetic_process_names: Tuple[str, ...] = ('systemd', 'kworker/0:1-events', 'bash', 'firefox', 'Web Content', 'pipewire', 'Xwayland', 'gnome-shell', 'sshd', 'dbus-daemon',
+                                            'steamwebhelper', 'python3', 'rcu_gp', 'ksoftirqd/3', 'code', 'zsh', 'wineserver', 'pulseaudio', 'NetworkManager', 'cron')
+synthetic_sizes: Tuple[int, ...] = (102400, 1048576, 10485760, 104857600, 1073741824)
+synthetic_names: Tuple[str, ...] = ('Rook Me Amadeus', 'IgnisGlasses', 'Castoreo', 'Mushroom Hunting', 'NintenZero', 'DoggyProject', 'The_Cow.Mp4', 'Oven', 'Mindspook',
+                                    'chronoculus', 'BOT Saxton Hale', 'v a p o r w a v e')
+synthetic_weapons: Tuple[str, ...] = ('tomislav', 'knife', 'brass_beast', 'tf_projectile_rocket', 'sniperrifle', 'scattergun', 'claidheamohmor', 'disciplinary_action')
+synthetic_messages: Tuple[str, ...] = ('gg', 'where is underworld portal', 'cringe', 'nice shot', 'medic!', 'anyone got a spare spy-cicle', 'lol', 'push cart pls')
+synthetic_maps: Tuple[str, ...] = ('pl_badwater', 'cp_manor_event', 'koth_highpass', 'ctf_2fort', 'pl_snowycoast', 'cp_process_final')
+synthetic_classes: Tuple[str, ...] = ('Scout', 'Soldier', 'Pyro', 'Demoman', 'Heavy', 'Engineer', 'Medic', 'Sniper', 'Spy')
+benchmark_usernames: Set[str] = {'Benchmark Player'}
+incremental_scans: int = 40
+incremental_append_units: int = 200
+timing_noise_ms: float = 0.5
+
+
+if __name__ == '__main__':
+    main()
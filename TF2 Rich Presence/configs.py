@@ -3,7 +3,6 @@
 # cython: language_level=3
 
 import os
-import winreg
 from typing import Callable, List, Optional, Tuple, Union, Set
 
 import vdf
@@ -11,6 +10,11 @@ import vdf
 import console_log
 import logger
 
+try:
+    import winreg
+except ImportError:  # not on Windows (e.g. replaying a console.log), so the Steam username has to come from somewhere else
+    winreg = None
+
 
 # allows for detecting which class the user is playing as
 def class_config_files(log, exe_location: str):
@@ -2,11 +2,27 @@
 # https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
 # cython: language_level=3
 
+import collections
+import concurrent.futures
+import contextlib
+import ctypes
+import functools
+import itertools
+import locale
+import mmap
 import os
 import re
+import sys
+import threading
+import time
 from tkinter import messagebox
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Set, Tuple, Union
 
+import psutil
+import ujson
+
+import file_identity
+import file_watch
 import settings
 
 
@@ -17,7 +33,6 @@ def interpret(self, console_log_path: str, user_usernames: Set[str], kb_limit: f
     SIZE_LIMIT_MULTIPLE_TRIGGER: int = 4
     SIZE_LIMIT_MULTIPLE_TARGET: int = 2
     SIZE_LIMIT_MIN_LINES: int = 15000
-    KATAISER_LOOP_FREQ: int = 4
 
     # defaults
     in_menus: bool = True
@@ -30,126 +45,834 @@ def interpret(self, console_log_path: str, user_usernames: Set[str], kb_limit: f
 
     # console.log is a log of tf2's console (duh), only exists if tf2 has -condebug (see no_condebug_warning() in GUI)
     self.log.debug(f"Looking for console.log at {console_log_path}")
+    self.console_log_events = None  # only known when resuming, a fresh scan replays history instead of saying what just happened
 
     if not os.path.isfile(console_log_path):
         self.log.error(f"console.log doesn't exist, issuing warning (files/dirs in /tf/: {os.listdir(os.path.dirname(console_log_path))})", reportable=False)
         self.no_condebug = False
         return default_state  # might as well
 
-    # only interpret console.log again if it's been modified
-    self.console_log_mtime = int(os.stat(console_log_path).st_mtime)
+    # console.log can't be read while it's being cleaned up, so just keep the current state until that's done
+    cleaner: Optional[ConsoleLogCleaner] = self.console_log_cleaner
+    if cleaner:
+        if cleaner.thread.is_alive():
+            if self.gui.clean_console_log:
+                cleaner.forced = True  # so the results still get shown
+                self.gui.clean_console_log = False
+
+            self.log.debug(f"console.log cleanup is {round(cleaner.progress * 100)}% done, not rescanning")
+            return None
+        else:
+            self.console_log_cleaner = None
+            finish_cleanup(self, cleaner)
+
+    # only interpret console.log again if it's been modified (nanosecond mtime + size, since several writes can happen in one second)
+    self.console_log_mtime = file_watch.stat_signature(console_log_path)
     if not force and self.console_log_mtime == self.old_console_log_mtime and not self.gui.clean_console_log:
         self.log.debug("Not rescanning console.log")
         return None
 
     # TF2 takes some time to load the console when starting up, so wait until it's been modified to avoid getting outdated information
-    console_log_mtime_relative: int = self.console_log_mtime - tf2_start_time
+    console_log_mtime_relative: int = self.console_log_mtime[0] // 1000000000 - tf2_start_time
     if console_log_mtime_relative <= TF2_LOAD_TIME_ASSUMPTION:
         self.log.debug(f"console.log's mtime relative to TF2's start time is {console_log_mtime_relative} (<= {TF2_LOAD_TIME_ASSUMPTION}), assuming default state")
         return default_state
 
-    consolelog_file_size: int = os.stat(console_log_path).st_size
+    console_log_stat: os.stat_result = os.stat(console_log_path)
+    consolelog_file_size: int = console_log_stat.st_size
     byte_limit: float = kb_limit * 1024.0
+    parser: Optional[ConsoleLogParser] = self.console_log_parser
+    resumable: bool = parser is not None  # from the last scan this run, not a checkpoint (which the game state doesn't know about yet)
+    resumed: bool = False
 
-    if self.last_console_log_size is not None:
-        if consolelog_file_size < self.last_console_log_size:
-            self.log.error("console.log seems to have been externally shortened (possibly TF2BD)")
-            # TODO: try to account for this somehow, if need be
+    # after a restart, pick up where the last run left off (unless that'd mean reading more than a fresh scan would)
+    if not parser and not force:
+        parser = self.console_log_checkpoint.load(console_log_path, console_log_stat, user_usernames)
 
-        self.last_console_log_size = consolelog_file_size
+        if parser and consolelog_file_size - parser.offset > byte_limit:
+            self.log.debug(f"console.log checkpoint is {consolelog_file_size - parser.offset} bytes behind, not using it")
+            parser = None
 
-    # decode console.log with UTF8 if any usernames need it
-    if non_ascii_in_usernames(user_usernames):
-        decode_mode: Optional[str] = 'UTF8'
-        self.log.debug("Decoding console.log with UTF8")
-    else:
-        decode_mode = None
+        self.console_log_parser = parser
 
-    # actually open the file finally
-    with open(console_log_path, 'r', errors='replace', encoding=decode_mode) as consolelog_file:
-        if consolelog_file_size > byte_limit:
-            skip_to_byte: int = consolelog_file_size - int(byte_limit)
-            consolelog_file.seek(skip_to_byte, 0)  # skip to last few KBs
+    # only parse what's been appended since the last scan, unless the file has been shortened or replaced (or this is the first scan)
+    if force or not parser or not parser.resync(console_log_path, console_log_stat, user_usernames):
+        if parser and parser.path == console_log_path and consolelog_file_size < parser.offset:
+            self.log.error("console.log seems to have been externally shortened (possibly TF2BD), rescanning")
 
-            lines: List[str] = consolelog_file.readlines()
-            self.log.debug(f"console.log: {consolelog_file_size} bytes, skipped to {skip_to_byte}, read {int(byte_limit)} bytes and {len(lines)} lines")
-        else:
-            lines = consolelog_file.readlines()
-            self.log.debug(f"console.log: {consolelog_file_size} bytes, {len(lines)} lines (didn't skip lines)")
+        # console_scan_kb is only where the window starts, after that it fits itself to how far back the state has actually been (see ScanWindow)
+        # it's only bounded by the file's size, since guessing would be wrong. a window past parallel_scan_min_bytes is read with read_parallel(), and still stops at the last map load
+        window: float = self.console_scan_window.size if self.console_scan_window.size else byte_limit
+        attempts: int = 0
+
+        while True:
+            attempts += 1
+            parser = ConsoleLogParser(self.log, console_log_path, user_usernames)
+            self.console_log_parser = parser
+
+            if consolelog_file_size > window:
+                skip_to_byte: int = consolelog_file_size - int(window)
+            else:
+                skip_to_byte = 0
+
+            # the window is only a cap here, normally not nearly that much needs to be read
+            if consolelog_file_size - skip_to_byte > parallel_scan_min_bytes and parallel_scan_processes > 1:
+                # with a huge cap (and trimming off), going backwards through all of it would take a while. so try just the end first, and if that's not enough, use more cores
+                buffer: bytes = parser.read_backward(console_log_stat, consolelog_file_size - parallel_scan_min_bytes)
+
+                if not parser.found_replay_start:
+                    buffer = parser.read_parallel(console_log_stat, skip_to_byte, parallel_scan_processes, self.gui.safe_update)
+                    self.log.debug(f"console.log: {consolelog_file_size} bytes, capped at {skip_to_byte}, summarized in {parallel_scan_processes} processes to {buffer.count(10)} lines")
+                else:
+                    self.log.debug(f"console.log: {consolelog_file_size} bytes, capped at {skip_to_byte}, scanned back to the last {len(buffer)} bytes ({buffer.count(10)} lines)")
+            else:
+                buffer = parser.read_backward(console_log_stat, skip_to_byte)
+                self.log.debug(f"console.log: {consolelog_file_size} bytes, capped at {skip_to_byte}, scanned back to the last {len(buffer)} bytes ({buffer.count(10)} lines)")
+
+            if parser.found_replay_start or skip_to_byte == 0:
+                break
+
+            # the state from a window that's too short could be wrong (usually "in menus"), so go further back instead of guessing
+            window = (consolelog_file_size - skip_to_byte) * scan_window_growth
+            self.log.debug(f"console.log scan window was too short to know the state, retrying with {int(window)} bytes")
+
+        self.console_scan_window.record(consolelog_file_size - parser.replay_start, attempts == 1)
+    else:
+        resumed_from: int = parser.offset
+        buffer = parser.read(console_log_stat, resumed_from)
+        self.log.debug(f"console.log: {consolelog_file_size} bytes, resumed from {resumed_from}, read {parser.offset - resumed_from} bytes and {buffer.count(10)} lines")
+        resumed = resumable
 
     # update this again late, fixes wrong detections but may cause a duplicate scan
-    self.console_log_mtime = int(os.stat(console_log_path).st_mtime)
+    self.console_log_mtime = file_watch.stat_signature(console_log_path)
 
-    # limit the file size, for better readlines performance
-    if consolelog_file_size > byte_limit * SIZE_LIMIT_MULTIPLE_TRIGGER and len(lines) > SIZE_LIMIT_MIN_LINES and settings.get('trim_console_log') and not force:
+    # limit the file size, for better read performance
+    if consolelog_file_size > byte_limit * SIZE_LIMIT_MULTIPLE_TRIGGER and settings.get('trim_console_log') and not force:
         trim_size = int(byte_limit * SIZE_LIMIT_MULTIPLE_TARGET)
         self.log.debug(f"Limiting console.log to {trim_size} bytes")
 
         try:
-            with open(console_log_path, 'rb+') as consolelog_file_b:
-                # this can probably be done faster and/or cleaner
-                consolelog_file_b.seek(-trim_size, 2)
-                consolelog_file_trimmed: bytes = consolelog_file_b.read()
-                trimmed_line_count: int = consolelog_file_trimmed.count(b'\n')
+            with open(console_log_path, 'rb+', buffering=0) as consolelog_file_b:
+                trim_from_byte: int = max(os.fstat(consolelog_file_b.fileno()).st_size - trim_size, 0)
+                trimmed_line_count: int = count_lines(consolelog_file_b, trim_from_byte)
 
                 if trimmed_line_count > SIZE_LIMIT_MIN_LINES:
-                    consolelog_file_b.seek(0)
-                    consolelog_file_b.truncate()
-                    consolelog_file_b.write(consolelog_file_trimmed)
+                    self.console_log_checkpoint.discard()
+                    parser.rebase(drop_head(self.log, consolelog_file_b, trim_from_byte), os.fstat(consolelog_file_b.fileno()))
                 else:
-                    self.log.error(f"Trimmed line count will be {trimmed_line_count} (< {SIZE_LIMIT_MIN_LINES}), aborting (trim len = {len(consolelog_file_trimmed)})")
+                    self.log.error(f"Trimmed line count will be {trimmed_line_count} (< {SIZE_LIMIT_MIN_LINES}), aborting (trim len = {trim_size})")
         except PermissionError as error:
             self.log.error(f"Failed to trim console.log: {error}")
 
-    # setup
-    now_in_menus: bool = False
-    just_started_server: bool = False
-    server_still_running: bool = False
-    using_wav_cache: bool = False
-    connecting_to_matchmaking: bool = False
-    found_first_wav_cache: bool = False
-    with_optimization: bool = True  # "with" optimization, not "with optimization"
-    chat_safety: bool = True
-    self.kataiser_scan_loop += 1
-    kataiser_scan: bool = self.kataiser_scan_loop == KATAISER_LOOP_FREQ if not force else True
-    if kataiser_scan:
-        self.kataiser_scan_loop = 0
-    user_is_kataiser: bool = 'Kataiser' in user_usernames
-    kataiser_seen_on: str = ''
-    # TODO: detection for canceling loading into community servers (if possible)
-    match_types: Dict[str, str] = {'12v12 Casual Match': 'Casual', 'MvM Practice': 'MvM (Boot Camp)', 'MvM MannUp': 'MvM (Mann Up)', '6v6 Ladder Match': 'Competitive'}
-    menus_messages: Tuple[str, ...] = ('For FCVAR_REPLICATED', '[TF Workshop]', 'request to abandon', 'Server shutting down', 'Lobby destroyed', 'Disconnect:', 'destroyed CAsyncWavDataCache',
-                                       'ShutdownGC', 'Connection failed after', 'Host_Error')
-    menus_message_used: Optional[str] = None
-    menus_message: str
-    gui_update: int = 0
-    gui_updates: int = 0
-
-    for username in user_usernames:
-        if 'with' in username:
-            with_optimization = False
-        if ' :  ' in username:
-            chat_safety = False
-
-    # iterates though 0 (initially) to roughly 16000 lines from console.log and learns (almost) everything from them
-    line: str
-    for line in lines:
-        gui_update += 1
-
-        if gui_update == 1500:
-            # update the GUI occasionally, to prevent UI lag
-            self.gui.safe_update()
-            gui_update = 0
-            gui_updates += 1
+    gui_updates: int = parser.feed(buffer, self.gui.safe_update)
+
+    if resumed:
+        self.console_log_events = parser.new_events
+
+    if not force:
+        self.console_log_checkpoint.save(parser)
+
+    in_menus: bool = parser.in_menus
+    tf2_map: str = parser.tf2_map
+    tf2_class: str = parser.tf2_class
+    server_address: str = parser.server_address
+    queued_state: str = parser.queued_state
+    hosting: bool = False
+    user_is_kataiser: bool = parser.user_is_kataiser
+
+    if not user_is_kataiser and not in_menus and parser.kataiser_seen_on == tf2_map:
+        self.log.debug(f"Kataiser located, telling user :D (on {tf2_map})")
+        self.gui.set_bottom_text('kataiser', True)
+
+    if in_menus:
+        tf2_map = ''
+        tf2_class = ''
+        server_address = ''
+        hosting = False
+        self.gui.set_bottom_text('kataiser', False)
+
+        if parser.menus_message_used:
+            self.log.debug(f"Menus message used: \"{parser.menus_message_used.strip()}\"")
+    else:
+        if tf2_class != '' and tf2_map == '':
+            self.log.error("Have class without map")
+
+        if parser.server_still_running:
+            hosting = True
+            server_address = ''
+        elif server_address == '':
+            self.log.error("Server address is blank but user isn't hosting")
+
+    if settings.get('hide_queued_gamemode') and "Queued" in queued_state:
+        self.log.debug(f"Hiding queued state (\"{queued_state}\" to \"Queued\")")
+        queued_state = "Queued"
+
+    scan_results = (in_menus, tf2_map, tf2_class, server_address, queued_state, hosting)
+    self.log.debug(f"console.log parse results: {scan_results}")
+
+    if gui_updates != 0:
+        self.log.debug(f"Mid-parse GUI updates: {gui_updates}")
+
+    # remove empty lines (bot spam probably) and some error logs, in the background since it can take a while
+    if (in_menus and settings.get('trim_console_log') and not force and self.cleanup_primed and parser.cleaned_offset < parser.offset) or self.gui.clean_console_log:
+        if self.gui.clean_console_log:
+            self.log.debug("Forcing cleanup of console.log")
+        else:
+            self.log.debug(f"Potentially cleaning up console.log (from byte {parser.cleaned_offset})")
+
+        self.console_log_checkpoint.discard()
+        self.console_log_cleaner = ConsoleLogCleaner(self.log, parser, user_is_kataiser, self.gui.clean_console_log)
+        self.console_log_cleaner.start()
+        self.gui.clean_console_log = False
+        self.cleanup_primed = False
+    else:
+        self.cleanup_primed = True
+
+    return scan_results
+
+
+# applies a finished background cleanup to the parser (if it's still the same one) and reports it
+def finish_cleanup(self, cleaner: 'ConsoleLogCleaner'):
+    line_count_text: str = f"{cleaner.error_line_count} error lines and {cleaner.blank_line_count} blank lines (total: {cleaner.error_line_count + cleaner.blank_line_count})"
+
+    if cleaner.error:
+        self.log.error(f"Failed to clean up console.log: {cleaner.error}")
+    elif cleaner.removed_bytes:
+        # the cleanup only covers what's been parsed, so all the removed lines were before the parser's offset
+        cleaned_stat: os.stat_result = os.stat(cleaner.parser.path)
+
+        if self.console_log_parser is cleaner.parser and (cleaned_stat.st_dev, cleaned_stat.st_ino) == cleaner.parser.identity.file_id:
+            cleaner.parser.cleaned_offset = cleaner.end
+            cleaner.parser.rebase(cleaner.removed_bytes, cleaned_stat)
+            self.console_log_checkpoint.save(cleaner.parser, True)
+        else:
+            self.console_log_parser = None
+
+        self.log.debug(f"Removed {line_count_text} from console.log in {round(cleaner.duration, 2)} seconds")
+    else:
+        self.log.debug(f"Didn't remove {line_count_text} from console.log")
+
+    self.gui.set_cleanup_progress(None)
+
+    if cleaner.forced:
+        self.gui.pause()
+        messagebox.showinfo("TF2 Rich Presence", f"Removed {line_count_text} from console.log.")
+        self.gui.unpause()
+
+
+# learns how far back from EOF fresh scans have needed to go to know the state, so that the next scan's window fits that instead of a fixed size
+# a window that turns out to be too short just gets retried bigger by interpret(), so this only has to be a good guess
+class ScanWindow:
+    def __init__(self, log):
+        self.log = log
+        self.size: Optional[int] = None  # until the first scan
+        self.distances: collections.deque = collections.deque(maxlen=scan_window_history)
+        self.scans: int = 0
+        self.hits: int = 0  # scans where the first window was enough
+
+    def __repr__(self) -> str:
+        return f"console_log.ScanWindow ({self.size} bytes, {self.hits}/{self.scans} hits)"
+
+    def record(self, distance: int, hit: bool):
+        self.distances.append(distance)
+        self.scans += 1
+
+        if hit:
+            self.hits += 1
+
+        self.size = max(int(max(self.distances) * scan_window_headroom), scan_window_min)
+        self.log.debug(f"console.log scan window is now {self.size} bytes (state was {distance} bytes from EOF, hit rate {self.hits}/{self.scans})")
+
+
+# saves a parser's state to disk so that after a restart, scanning can resume from where it was instead of starting over
+# written atomically and at most every few seconds, since an older checkpoint is still correct (just with a bit more to read)
+class ConsoleLogCheckpoint:
+    def __init__(self, log, path: str):
+        self.log = log
+        self.path: str = path
+        self.last_save_time: float = 0.0
+        self.last_saved: Optional[dict] = None
+
+    def __repr__(self) -> str:
+        return f"console_log.ConsoleLogCheckpoint ({self.path}, saved={self.last_saved is not None})"
+
+    def save(self, parser: 'ConsoleLogParser', force: bool = False):
+        if not force and time.perf_counter() - self.last_save_time < checkpoint_interval:
+            return
+
+        self.last_save_time = time.perf_counter()
+
+        checkpoint: dict = parser.checkpoint()
+        if checkpoint == self.last_saved:
+            return
+
+        try:
+            with open(f'{self.path}.tmp', 'w', encoding='UTF8') as checkpoint_file:
+                ujson.dump(checkpoint, checkpoint_file, ensure_ascii=False, escape_forward_slashes=False)
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+
+            os.replace(f'{self.path}.tmp', self.path)
+            self.last_saved = checkpoint
+        except OSError as error:
+            self.log.error(f"Couldn't save console.log checkpoint: {error}", reportable=False)
+
+    # returns a parser with the saved state if the checkpoint matches this console.log and scanning can continue from it (see ConsoleLogParser.resync()), otherwise None
+    def load(self, console_log_path: str, console_log_stat: os.stat_result, usernames: Set[str]) -> Optional['ConsoleLogParser']:
+        try:
+            with open(self.path, 'r', encoding='UTF8') as checkpoint_file:
+                checkpoint: dict = ujson.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            self.log.error(f"Couldn't load console.log checkpoint: {error}", reportable=False)
+            return None
+
+        try:
+            if checkpoint['version'] != checkpoint_version or checkpoint['path'] != console_log_path or set(checkpoint['usernames']) != usernames:
+                self.log.debug("console.log checkpoint is for a different file, version, or user")
+                return None
+
+            parser: ConsoleLogParser = ConsoleLogParser(self.log, console_log_path, usernames)
+            parser.restore(checkpoint)
+
+            if not parser.resync(console_log_path, console_log_stat, usernames):
+                return None
+        except (KeyError, TypeError, ValueError, OSError) as error:
+            self.log.error(f"Invalid console.log checkpoint: {repr(error)}", reportable=False)
+            return None
+
+        self.last_saved = checkpoint
+        self.log.debug(f"Loaded console.log checkpoint: {parser}")
+        return parser
+
+    # for right before console.log is modified by this program, since the checkpoint's offset would then be wrong
+    def discard(self):
+        self.last_save_time = 0.0
+        self.last_saved = None
+
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            self.log.error(f"Couldn't delete console.log checkpoint: {error}", reportable=False)
+
+
+# removes empty lines (bot spam probably) and some error logs from the part of console.log that's been parsed but not yet cleaned, on a background thread
+# done in place a chunk at a time (the same way as drop_head()) instead of via a temp file, since TF2 keeps console.log open
+class ConsoleLogCleaner:
+    def __init__(self, log, parser: 'ConsoleLogParser', user_is_kataiser: bool, forced: bool):
+        self.log = log
+        self.parser: ConsoleLogParser = parser
+        self.forced: bool = forced
+        self.start_byte: int = 0 if forced else parser.cleaned_offset
+        self.end: int = parser.offset
+        self.min_removed_lines: int = 1 if forced else 50
+        self.progress: float = 0.0
+        self.error_line_count: int = 0
+        self.blank_line_count: int = 0
+        self.removed_bytes: int = 0
+        self.duration: float = 0.0
+        self.error: Optional[OSError] = None
+        self.thread: threading.Thread = threading.Thread(target=self.run, name='console.log cleanup', daemon=True)
+
+        error_substrings: Tuple[str, ...] = ('bad reference count', 'particle system', 'DataTable warning', 'SOLID_VPHYSICS', 'BlockingGetDataPointer', 'No such variable')
+        if user_is_kataiser:
+            error_substrings += ('Usage: spec_player',)  # cause I have a bind that errors a lot
+
+        # either a blank line or an error substring (which still needs the line to be checked for chat)
+        self.removal_regex: Pattern[bytes] = re.compile(b'(?m)^[ \t]*\r?\n|' + literals_pattern(error_substrings).encode())
+
+    def __repr__(self) -> str:
+        return f"console_log.ConsoleLogCleaner ({self.parser.path}, {self.start_byte} to {self.end}, progress={round(self.progress, 2)})"
+
+    def start(self):
+        self.log.debug(f"Starting {self}")
+        self.thread.start()
+
+    def run(self):
+        start_time: float = time.perf_counter()
+        lower_thread_priority()
+
+        try:
+            with open(self.parser.path, 'rb+', buffering=0) as console_log_file:
+                # first just count, since it's not worth moving the rest of the file around for a few lines
+                if self.clean(console_log_file, False) >= self.min_removed_lines:
+                    self.clean(console_log_file, True)
+        except OSError as error:
+            self.error = error
+
+        self.duration = time.perf_counter() - start_time
+        self.progress = 1.0
+
+    # filters the lines in the cleanup range a chunk at a time, and if removing, moves everything after them back to fill the gap, returns removed line count
+    def clean(self, console_log_file, removing: bool) -> int:
+        read_position: int = self.start_byte
+        write_position: int = self.start_byte
+        removed_lines: int = 0
+        self.error_line_count = 0
+        self.blank_line_count = 0
+        progress_base: float = 0.5 if removing else 0.0
+
+        while read_position < self.end:
+            console_log_file.seek(read_position)
+            chunk: bytes = console_log_file.read(min(trim_chunk_size, self.end - read_position))
+            chunk = chunk[:chunk.rfind(b'\n') + 1] if len(chunk) == trim_chunk_size else chunk  # only whole lines (the end is always at the start of a line)
+
+            if not chunk:
+                break  # a single line longer than a chunk, just leave the rest alone
+
+            kept_parts: List[bytes] = []
+            kept_from: int = 0
+            next_line_start: int = 0
+
+            for removal_match in self.removal_regex.finditer(chunk):
+                if removal_match.start() < next_line_start:
+                    continue
+
+                line_start, line_end = line_bounds(chunk, removal_match.start())
+                next_line_start = line_end
+
+                if removal_match.group().endswith(b'\n'):
+                    self.blank_line_count += 1
+                elif b' :  ' not in chunk[line_start:line_end]:
+                    self.error_line_count += 1
+                else:
+                    continue  # chat
+
+                kept_parts.append(chunk[kept_from:line_start])
+                kept_from = line_end
+
+            kept_parts.append(chunk[kept_from:])
+            removed_lines = self.error_line_count + self.blank_line_count
+
+            if removing and (write_position != read_position or kept_from != 0):
+                console_log_file.seek(write_position)
+                console_log_file.write(b''.join(kept_parts))
+
+            read_position += len(chunk)
+            write_position += sum(len(kept_part) for kept_part in kept_parts)
+            self.progress = progress_base + ((read_position - self.start_byte) / max(self.end - self.start_byte, 1)) * 0.5
+
+        if removing and read_position != write_position:
+            # then move back whatever's after the cleanup range (including anything TF2 has written since), and cut off the end
+            self.removed_bytes = read_position - write_position
+
+            while True:
+                console_log_file.seek(read_position)
+                chunk = console_log_file.read(trim_chunk_size)
+
+                if not chunk:
+                    break
+
+                console_log_file.seek(write_position)
+                console_log_file.write(chunk)
+                read_position += len(chunk)
+                write_position += len(chunk)
+
+            console_log_file.truncate(write_position)
+
+        return removed_lines
+
+
+# keeps console.log's parse state between scans, so that only newly appended lines need to be read
+class ConsoleLogParser:
+    def __init__(self, log, path: str, usernames: Set[str]):
+        self.log = log
+        self.path: str = path
+        self.usernames: Set[str] = set(usernames)
+        self.offset: int = 0  # in bytes, always at the start of a line
+        self.cleaned_offset: int = 0  # everything before this has already been through ConsoleLogCleaner
+        self.identity: file_identity.FileIdentity = file_identity.FileIdentity()  # of console.log up to the offset
+        self.found_replay_start: bool = False  # whether the last read_backward() or read_parallel() went back far enough to know the state, rather than hitting its cap
+        self.replay_start: int = 0  # where the last read_backward() started parsing from, or the start of the window if it's unknown
+
+        # decode console.log with UTF8 if any usernames need it
+        if non_ascii_in_usernames(self.usernames):
+            self.encoding: str = 'UTF8'
+            self.log.debug("Decoding console.log with UTF8")
+        else:
+            self.encoding = locale.getpreferredencoding(False)
 
         # lines that have "with" in them are basically always kill logs and can be safely ignored
         # this (probably) improves performance
         # same goes for chat logs, this one's actually to reduce false detections
-        if (with_optimization and 'with' in line) or (chat_safety and ' :  ' in line):
-            if not kataiser_scan or user_is_kataiser or 'Kataiser' not in line:
+        self.with_optimization: bool = True  # "with" optimization, not "with optimization"
+        self.chat_safety: bool = True
+        self.user_is_kataiser: bool = 'Kataiser' in self.usernames
+
+        for username in self.usernames:
+            if 'with' in username:
+                self.with_optimization = False
+            if ' :  ' in username:
+                self.chat_safety = False
+
+        # the user's kill feed lines are markers too, to count kills from (see is_kill_line())
+        self.markers_regex: Pattern[bytes] = user_markers_regex(tuple(sorted(self.usernames)), self.encoding)
+
+        # the actual state
+        self.in_menus: bool = True
+        self.tf2_map: str = ''
+        self.tf2_class: str = ''
+        self.server_address: str = ''
+        self.queued_state: str = "Not queued"
+        self.just_started_server: bool = False
+        self.server_still_running: bool = False
+        self.using_wav_cache: bool = False
+        self.connecting_to_matchmaking: bool = False
+        self.connecting_address: str = ''  # known from "Connecting to" while still in menus, so the server can be queried while the map loads
+        self.found_first_wav_cache: bool = False
+        self.kataiser_seen_on: str = ''
+        self.kills: int = 0  # on the current map, from the kill feed
+        self.menus_message_used: Optional[str] = None
+        self.new_events: List[ConsoleLogEvent] = []  # from the last feed()
+        self.peeked_offset: int = 0  # how far appended_markers() has looked
+
+    def __repr__(self) -> str:
+        return f"console_log.ConsoleLogParser ({self.path}, offset={self.offset}, in_menus={self.in_menus}, map={self.tf2_map}, class={self.tf2_class})"
+
+    # so that summarize() can be run in other processes (the log has an open file, and isn't needed there anyway)
+    def __getstate__(self) -> dict:
+        state: dict = self.__dict__.copy()
+        state['log'] = None
+        return state
+
+    # the parse state and where it came from, as something that can be saved to JSON (see ConsoleLogCheckpoint)
+    def checkpoint(self) -> dict:
+        return {'version': checkpoint_version, 'path': self.path, 'usernames': sorted(self.usernames), 'offset': self.offset, 'identity': self.identity.checkpoint(),
+                'state': {attribute: getattr(self, attribute) for attribute in checkpoint_attributes}}
+
+    # the opposite of checkpoint(), which still needs resync() to know if it matches the current file
+    def restore(self, checkpoint: dict):
+        self.offset = checkpoint['offset']
+        self.identity.restore(checkpoint['identity'])
+
+        for attribute in checkpoint_attributes:
+            setattr(self, attribute, checkpoint['state'][attribute])
+
+    # whether scanning can continue from the offset, which is moved if something else has trimmed the start of console.log (or copied it) since the last scan
+    # if it's been rewritten or replaced with something else, the part that was parsed is gone and it has to be scanned from scratch
+    def resync(self, path: str, console_log_stat: os.stat_result, usernames: Set[str]) -> bool:
+        if path != self.path or usernames != self.usernames:
+            return False
+
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            change, resync_offset = self.identity.compare(console_log_map, console_log_stat)
+
+            if change == 'appended':
+                return True
+            elif resync_offset == -1:
+                self.log.debug(f"console.log has been {change} since the last scan, can't resync")
+                return False
+
+            self.log.debug(f"console.log has been {change} since the last scan, resyncing from byte {self.offset} to {resync_offset}")
+            self.cleaned_offset = max(self.cleaned_offset - (self.offset - resync_offset), 0)
+            self.offset = resync_offset
+            self.identity.update(console_log_map, console_log_stat, self.offset)
+            return True
+
+    # read whole lines from a byte offset to EOF, leaving any incomplete last line for next time
+    # returns them undecoded, since only the few lines that feed() finds markers in ever need to be decoded
+    def read(self, console_log_stat: os.stat_result, from_byte: int) -> bytes:
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            window_start, window_end = self.whole_lines(console_log_map, from_byte)
+            complete_bytes: bytes = console_log_map[window_start:window_end]
+            self.identity.update(console_log_map, console_log_stat, window_end)
+
+        self.offset = window_end
+        return complete_bytes
+
+    # like read(), but walks backwards from EOF and stops once it's gone past enough map loads and returns to menus to know the current state
+    # so a fresh scan normally only needs the last few games, with from_byte (the console_scan_kb limit) just being a cap
+    def read_backward(self, console_log_stat: os.stat_result, from_byte: int) -> bytes:
+        looking_for: int = 0  # 0: the last map load, 1: the last return to menus before it, 2: the map load before that (which is where parsing starts), 3: done
+        lookback_lines: Dict[int, bytes] = {}
+
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            window_start, window_end = self.whole_lines(console_log_map, from_byte)
+            replay_start: int = window_start
+            blocks: Iterator[Tuple[int, int]] = backward_blocks(console_log_map, window_start, window_end)
+
+            for block_start, block_end in blocks:
+                previous_line_start: int = -1
+
+                for decisive_match in reversed(list(decisive_regex.finditer(console_log_map, block_start, block_end))):
+                    line_start, line_end = line_bounds(console_log_map, decisive_match.start(), block_start)
+
+                    if line_start == previous_line_start:
+                        continue  # already checked this line for another match
+
+                    previous_line_start = line_start
+
+                    for line in reversed(self.decode_lines(console_log_map[line_start:line_end])):
+                        if self.skips_line(line):
+                            continue
+                        elif line.startswith('Map:'):
+                            if looking_for == 0:
+                                looking_for = 1
+                            elif looking_for == 2:
+                                looking_for = 3
+                                break
+                        elif looking_for == 1 and self.is_menus_line(line):
+                            looking_for = 2
+
+                    if looking_for == 3:
+                        replay_start = line_start
+                        break
+
+                if looking_for == 3:
+                    blocks = itertools.chain([(block_start, replay_start)], blocks)
+                    break
+
+            replay_bytes: bytes = console_log_map[replay_start:window_end]
+
+            # queued state and server address can be from before the replayed part, so look back a bit further (up to the cap) for just those
+            if looking_for == 3:
+                missing_needles: List[bytes] = [needle for needle, counted in lookback_needles.items() if not any(marker in replay_bytes for marker in counted)]
+
+                for block_start, block_end in blocks:
+                    if not missing_needles:
+                        break
+
+                    for needle in missing_needles.copy():
+                        needle_position: int = console_log_map.rfind(needle, block_start, block_end)
+
+                        while needle_position != -1:
+                            line_start, line_end = line_bounds(console_log_map, needle_position, block_start)
+                            line_bytes: bytes = console_log_map[line_start:line_end]
+
+                            if any(marker in line_bytes for marker in lookback_needles[needle]) and not self.skips_line(line_bytes.decode(self.encoding, errors='replace')):
+                                lookback_lines[line_start] = line_bytes
+                                missing_needles.remove(needle)
+                                break
+
+                            needle_position = console_log_map.rfind(needle, block_start, line_start)
+
+            self.identity.update(console_log_map, console_log_stat, window_end)
+
+        self.offset = window_end
+        self.found_replay_start = looking_for == 3
+        self.replay_start = replay_start
+        return b''.join([lookback_lines[position] for position in sorted(lookback_lines)] + [replay_bytes])
+
+    # like read_backward(), but for when it would have to go through a huge amount of console.log: splits it into chunks that get summarized in other processes
+    # returns the merged summary (the lines that matter, in order) to be fed like any other buffer
+    def read_parallel(self, console_log_stat: os.stat_result, from_byte: int, processes: int, gui_update_func: Optional[Callable] = None) -> bytes:
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            window_start, window_end = self.whole_lines(console_log_map, from_byte)
+            chunks: List[Tuple[int, int]] = list(forward_blocks(console_log_map, window_start, window_end, -(-(window_end - window_start) // processes)))
+            self.identity.update(console_log_map, console_log_stat, window_end)
+
+        try:
+            with concurrent.futures.ProcessPoolExecutor(min(processes, len(chunks)) or 1) as pool:
+                futures: List[concurrent.futures.Future] = [pool.submit(self.summarize, chunk_start, chunk_end) for chunk_start, chunk_end in chunks]
+
+                while concurrent.futures.wait(futures, timeout=1 / 30)[1]:
+                    if gui_update_func:
+                        gui_update_func()
+
+                summaries: List[List[bytes]] = [future.result() for future in futures]
+        except (OSError, concurrent.futures.process.BrokenProcessPool) as error:
+            self.log.error(f"Couldn't summarize console.log in other processes ({repr(error)}), doing it here instead")
+            summaries = [self.summarize(chunk_start, chunk_end) for chunk_start, chunk_end in chunks]
+
+        summary: List[bytes] = functools.reduce(self.merge_summaries, summaries, [])
+        self.offset = window_end
+        self.found_replay_start = self.find_replay_start(summary) != -1
+        self.replay_start = window_start  # somewhere after this, not worth finding exactly
+        return b''.join(summary)
+
+    # the lines from a range of whole lines in console.log that could still matter after it, in order. neighbouring ranges' summaries can be merged with merge_summaries()
+    def summarize(self, start: int, end: int) -> List[bytes]:
+        summary: List[bytes] = []
+
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            for block_start, block_end in forward_blocks(console_log_map, start, end, summary_block_size):
+                summary = self.merge_summaries(summary, list(self.raw_marker_lines(console_log_map[block_start:block_end])))
+
+        return summary
+
+    # combines the summaries of two neighbouring parts of console.log (earlier one first), using the same rules as read_backward() to drop what's been made irrelevant
+    # the result is the same as summarizing both parts as one, so this can be done in any grouping
+    def merge_summaries(self, earlier: List[bytes], later: List[bytes]) -> List[bytes]:
+        lines: List[bytes] = earlier + later
+        replay_index: int = self.find_replay_start(lines)
+
+        if replay_index == -1:
+            return lines
+
+        replay_lines: List[bytes] = lines[replay_index:]
+        lookback_indices: Set[int] = set()
+
+        for counted in lookback_needles.values():
+            if any(marker in replay_line for replay_line in replay_lines for marker in counted):
                 continue
 
-        if not in_menus:
+            for lookback_index in range(replay_index - 1, -1, -1):
+                if any(marker in lines[lookback_index] for marker in counted) and not self.skips_line(lines[lookback_index].decode(self.encoding, errors='replace')):
+                    lookback_indices.add(lookback_index)
+                    break
+
+        return [lines[lookback_index] for lookback_index in sorted(lookback_indices)] + replay_lines
+
+    # the index of the line that parsing can start from (the map load before the last return to menus before the last map load), or -1 if there isn't one
+    def find_replay_start(self, lines: List[bytes]) -> int:
+        looking_for: int = 0
+
+        for replay_index in range(len(lines) - 1, -1, -1):
+            for line in reversed(self.decode_lines(lines[replay_index])):
+                if self.skips_line(line):
+                    continue
+                elif line.startswith('Map:'):
+                    if looking_for == 0:
+                        looking_for = 1
+                    elif looking_for == 2:
+                        return replay_index
+                elif looking_for == 1 and self.is_menus_line(line):
+                    looking_for = 2
+
+        return -1
+
+    # the range of whole lines from a byte offset to EOF
+    # starting right after a newline also means never starting in the middle of a multi-byte character, since no encoding TF2 could use has newline bytes inside characters
+    def whole_lines(self, console_log_map, from_byte: int) -> Tuple[int, int]:
+        if from_byte > 0 and from_byte != self.offset:
+            # skipped into the middle of a line, so start at the next one
+            first_newline: int = console_log_map.find(b'\n', from_byte)
+            from_byte = first_newline + 1 if first_newline != -1 else len(console_log_map)
+
+        return from_byte, max(console_log_map.rfind(b'\n', from_byte) + 1, from_byte)
+
+    # account for bytes removed from before the offset (by trimming or cleaning up)
+    def rebase(self, dropped_bytes: int, console_log_stat: os.stat_result):
+        self.offset = min(max(self.offset - dropped_bytes, 0), console_log_stat.st_size)
+        self.cleaned_offset = min(max(self.cleaned_offset - dropped_bytes, 0), self.offset)
+        self.peeked_offset = self.offset
+
+        with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+            self.identity.update(console_log_map, console_log_stat, self.offset)
+
+    # whether any lines that could matter have been appended since the last scan, without parsing them. only looks at each new line once
+    # a file that's gotten shorter than what's been read counts too, since that means rescanning
+    def appended_markers(self) -> bool:
+        try:
+            with open(self.path, 'rb') as consolelog_file, mapped(consolelog_file) as console_log_map:
+                peek_start: int = max(self.offset, self.peeked_offset)
+
+                if len(console_log_map) < peek_start:
+                    return True
+
+                peek_end: int = max(console_log_map.rfind(b'\n', peek_start) + 1, peek_start)
+                self.peeked_offset = peek_end
+                return self.markers_regex.search(console_log_map, peek_start, peek_end) is not None
+        except OSError:
+            return True
+
+    # learns (almost) everything from the lines that could matter, keeping what happened in new_events, returns how many GUI updates were done
+    def feed(self, buffer: bytes, gui_update_func: Optional[Callable] = None) -> int:
+        gui_update: int = 0
+        gui_updates: int = 0
+        self.new_events = []
+
+        for line in self.marker_lines(buffer):
+            self.new_events.extend(self.parse_line(line))
+            gui_update += 1
+
+            if gui_update == 1500 and gui_update_func:
+                # update the GUI occasionally, to prevent UI lag
+                gui_update_func()
+                gui_update = 0
+                gui_updates += 1
+
+        return gui_updates
+
+    # same as feed(), but as a generator of what happened
+    def events(self, buffer: bytes) -> Iterator['ConsoleLogEvent']:
+        for line in self.marker_lines(buffer):
+            yield from self.parse_line(line)
+
+    # finds (and decodes) the lines from console.log that could matter
+    # lines that don't contain any marker are never split out of the buffer or decoded, which is most of them
+    def marker_lines(self, buffer: bytes) -> Iterator[str]:
+        for line_bytes in self.raw_marker_lines(buffer):
+            yield from self.decode_lines(line_bytes)
+
+    # same as marker_lines(), but without decoding
+    def raw_marker_lines(self, buffer: bytes) -> Iterator[bytes]:
+        next_line_start: int = 0
+
+        marker_match: re.Match
+        for marker_match in self.markers_regex.finditer(buffer):
+            match_start: int = marker_match.start()
+
+            if match_start < next_line_start:
+                continue  # another marker on a line that's already been parsed
+
+            line_start, next_line_start = line_bounds(buffer, match_start)
+            yield buffer[line_start:next_line_start]
+
+    # decodes a line from console.log, which gets split if it has any carriage returns in it
+    def decode_lines(self, line_bytes: bytes) -> List[str]:
+        line: str = line_bytes.decode(self.encoding, errors='replace')
+
+        if '\r' not in line:
+            return [line]
+
+        split_lines: List[str] = line.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return [f'{split_line}\n' for split_line in split_lines[:-1]] + ([split_lines[-1]] if split_lines[-1] else [])
+
+    # whether a line should be ignored entirely (kill logs and chat, see __init__)
+    def skips_line(self, line: str) -> bool:
+        if (self.with_optimization and 'with' in line) or (self.chat_safety and ' :  ' in line):
+            return self.user_is_kataiser or 'Kataiser' not in line
+
+        return False
+
+    # kill feed lines look like "<killer> killed <victim> with <weapon>." (maybe with " (crit)" after), killing yourself doesn't count
+    def is_kill_line(self, line: str) -> bool:
+        if ' killed ' not in line or ' with ' not in line:
+            return False
+
+        for user_username in self.usernames:
+            if line.startswith(f'{user_username} killed ') and not line.startswith(f'{user_username} killed {user_username} with '):
+                return True
+
+        return False
+
+    # whether parse_line() would go to the menus because of this line, if currently in a game (ignoring the CAsyncWavDataCache method, which depends on earlier lines)
+    def is_menus_line(self, line: str) -> bool:
+        for menus_message in menus_messages:
+            if menus_message in line:
+                return True
+
+        if line.endswith(' selected \n'):
+            return False
+        elif 'Disconnect by user' in line:
+            for user_username in self.usernames:
+                if user_username in line:
+                    return True
+        elif 'Missing map' in line and 'Missing map material' not in line:
+            return True
+
+        return False
+
+    # the state machine itself, for a single line (including its newline), returns what changed as events
+    def parse_line(self, line: str) -> List['ConsoleLogEvent']:
+        menus_message: str
+        now_in_menus: bool = False
+        line_events: List[ConsoleLogEvent] = []
+        # TODO: detection for canceling loading into community servers (if possible)
+
+        # kill feed lines would otherwise be skipped, since they have "with" in them
+        if not self.in_menus and self.is_kill_line(line):
+            self.kills += 1
+            return line_events
+
+        if self.skips_line(line):
+            return line_events
+
+        if not self.in_menus:
             for menus_message in menus_messages:
                 if menus_message in line:
                     now_in_menus = True
@@ -159,10 +882,11 @@ def interpret(self, console_log_path: str, user_usernames: Set[str], kb_limit: f
                 class_line_possibly: List[str] = line[:-11].split()
 
                 if class_line_possibly and class_line_possibly[-1] in tf2_classes:
-                    tf2_class = class_line_possibly[-1]
+                    self.tf2_class = class_line_possibly[-1]
+                    line_events.append(ClassSelected(self.tf2_class))
 
             elif 'Disconnect by user' in line:
-                for user_username in user_usernames:
+                for user_username in self.usernames:
                     if user_username in line:
                         now_in_menus = True
                         break
@@ -170,167 +894,164 @@ def interpret(self, console_log_path: str, user_usernames: Set[str], kb_limit: f
             elif 'Missing map' in line and 'Missing map material' not in line:
                 now_in_menus = True
 
-            if kataiser_scan and not user_is_kataiser and 'Kataiser' in line:
+            if not self.user_is_kataiser and 'Kataiser' in line:
                 # makes sure no one's just talking about me for some reason
                 if not (line.count(' :  ') == 1 and 'Kataiser' not in line.split(' :  ')[0] and 'Kataiser' in line.split(' :  ')[1]):
-                    kataiser_seen_on = tf2_map
+                    self.kataiser_seen_on = self.tf2_map
 
         elif 'SV_ActivateServer' in line:  # full line: "SV_ActivateServer: setting tickrate to 66.7"
-            just_started_server = True
+            self.just_started_server = True
+            line_events.append(ServerStarted())
 
         if line.startswith('Map:'):
-            in_menus = False
-            tf2_map = line[5:-1]
-            tf2_class = ''
-
-            if just_started_server:
-                server_still_running = True
-                just_started_server = False
+            self.in_menus = False
+            self.tf2_map = line[5:-1]
+            self.tf2_class = ''
+            self.kills = 0
+            self.connecting_address = ''
+
+            if self.just_started_server:
+                self.server_still_running = True
+                self.just_started_server = False
             else:
-                just_started_server = False
-                server_still_running = False
+                self.just_started_server = False
+                self.server_still_running = False
+
+            line_events.append(MapLoaded(self.tf2_map, self.server_still_running))
 
         elif 'Connected to' in line:
-            server_address = line.split()[-1]
+            self.server_address = line.split()[-1]
+            line_events.append(ConnectedTo(self.server_address))
 
-            if not connecting_to_matchmaking:
+            if not self.connecting_to_matchmaking:
                 # joined a community server, so must use CAsyncWavDataCache method to detect disconnects
-                using_wav_cache = True
-                found_first_wav_cache = False
-                connecting_to_matchmaking = False
+                self.using_wav_cache = True
+                self.found_first_wav_cache = False
+                self.connecting_to_matchmaking = False
+
+        elif 'matchmaking server' in line:  # full line: "Connecting to matchmaking server 1.2.3.4:27015"
+            self.connecting_to_matchmaking = True
+            line_events.extend(self.connecting_to(line))
 
-        elif 'matchmaking server' in line:
-            connecting_to_matchmaking = True
+        elif line.startswith('Connecting to '):  # full line: "Connecting to 1.2.3.4:27015" or with "..." after
+            line_events.extend(self.connecting_to(line))
 
-        elif using_wav_cache and 'CAsyncWavDataCache' in line:
-            if found_first_wav_cache:
+        elif self.connecting_address and self.in_menus and self.is_menus_line(line):
+            self.connecting_address = ''  # canceled
+
+        elif self.using_wav_cache and 'CAsyncWavDataCache' in line:
+            if self.found_first_wav_cache:
                 # it's the one after disconnecting
 
-                if in_menus:
+                if self.in_menus:
                     # ...unless it isn't?
                     self.log.error("Found CAsyncWavDataCache despite being in menus already")
                 else:
                     now_in_menus = True
             else:
                 # it's the one after loading in
-                found_first_wav_cache = True
+                self.found_first_wav_cache = True
 
         elif '[P' in line:
             if '[PartyClient] L' in line:  # full line: "[PartyClient] Leaving queue"
                 # queueing is not necessarily only in menus
-                queued_state = "Not queued"
+                self.queued_state = "Not queued"
+                line_events.append(QueueLeft())
 
             elif '[PartyClient] Entering q' in line:  # full line: "[PartyClient] Entering queue for match group " + whatever mode
                 match_type: str = line.split('match group ')[-1][:-1]
-                queued_state = f"Queued for {match_types[match_type]}"
+                self.queued_state = f"Queued for {match_types[match_type]}"
+                line_events.append(QueueEntered(self.queued_state))
 
             elif '[PartyClient] Entering s' in line:  # full line: "[PartyClient] Entering standby queue"
-                queued_state = 'Queued for a party\'s match'
+                self.queued_state = 'Queued for a party\'s match'
+                line_events.append(QueueEntered(self.queued_state))
 
         if now_in_menus:
-            now_in_menus = False
-            in_menus = True
-            menus_message_used = line
-            kataiser_seen_on = ''
-            connecting_to_matchmaking = False
-            using_wav_cache = False
-            found_first_wav_cache = False
-
-    if not user_is_kataiser and not in_menus and kataiser_seen_on == tf2_map:
-        self.log.debug(f"Kataiser located, telling user :D (on {tf2_map})")
-        self.gui.set_bottom_text('kataiser', True)
+            self.in_menus = True
+            self.menus_message_used = line
+            self.kataiser_seen_on = ''
+            self.connecting_to_matchmaking = False
+            self.using_wav_cache = False
+            self.found_first_wav_cache = False
+            line_events.append(ReturnedToMenus(line))
 
-    if in_menus:
-        tf2_map = ''
-        tf2_class = ''
-        server_address = ''
-        hosting = False
-        self.gui.set_bottom_text('kataiser', False)
+        return line_events
 
-        if menus_message_used:
-            self.log.debug(f"Menus message used: \"{menus_message_used.strip()}\"")
-    else:
-        if tf2_class != '' and tf2_map == '':
-            self.log.error("Have class without map")
+    # the same address gets logged a few times while connecting, so only the first is an event
+    def connecting_to(self, line: str) -> List['ConsoleLogEvent']:
+        connecting_address: str = line.split()[-1].rstrip('.')
 
-        if server_still_running:
-            hosting = True
-            server_address = ''
-        elif server_address == '':
-            self.log.error("Server address is blank but user isn't hosting")
+        if connecting_address == self.connecting_address or ':' not in connecting_address:
+            return []
 
-    if settings.get('hide_queued_gamemode') and "Queued" in queued_state:
-        self.log.debug(f"Hiding queued state (\"{queued_state}\" to \"Queued\")")
-        queued_state = "Queued"
+        self.connecting_address = connecting_address
+        return [ConnectingTo(connecting_address)]
 
-    scan_results = (in_menus, tf2_map, tf2_class, server_address, queued_state, hosting)
-    self.log.debug(f"console.log parse results: {scan_results}")
 
-    if gui_updates != 0:
-        self.log.debug(f"Mid-parse GUI updates: {gui_updates}")
+# something that happened in console.log, as parsed by ConsoleLogParser, for GameState.apply() (see game_state.py)
+class ConsoleLogEvent:
+    __slots__ = ()
 
-    # remove empty lines (bot spam probably) and some error logs
-    # TODO: move this into a function
-    if (in_menus and settings.get('trim_console_log') and not force and self.cleanup_primed) or self.gui.clean_console_log:
-        if self.gui.clean_console_log:
-            self.log.debug("Forcing cleanup of console.log")
-        else:
-            self.log.debug("Potentially cleaning up console.log")
+    def __repr__(self) -> str:
+        return f"console_log.{type(self).__name__} ({', '.join(f'{slot}={getattr(self, slot)!r}' for slot in self.__slots__)})"
 
-        console_log_lines_out: List[str] = []
-        total_line_count: int = 0
-        blank_line_count: int = 0
-        error_line_count: int = 0
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
 
-        with open(console_log_path, 'r', encoding='UTF8', errors='replace') as console_log_read:
-            console_log_lines_in: List[str] = console_log_read.readlines()
 
-        error_substrings: Tuple[str, ...] = ('bad reference count', 'particle system', 'DataTable warning', 'SOLID_VPHYSICS', 'BlockingGetDataPointer', 'No such variable')
-        if user_is_kataiser:
-            error_substrings += ('Usage: spec_player',)  # cause I have a bind that errors a lot
+class MapLoaded(ConsoleLogEvent):
+    __slots__ = ('tf2_map', 'hosting')
 
-        for line in console_log_lines_in:
-            remove_line: bool = False
+    def __init__(self, tf2_map: str, hosting: bool):
+        self.tf2_map: str = tf2_map
+        self.hosting: bool = hosting
 
-            for error_substring in error_substrings:
-                if error_substring in line and ' :  ' not in line:
-                    remove_line = True
-                    error_line_count += 1
-                    break
 
-            if not remove_line:
-                if line.strip(' \t') == '\n':
-                    remove_line = True
-                    blank_line_count += 1
+class ClassSelected(ConsoleLogEvent):
+    __slots__ = ('tf2_class',)
 
-            if remove_line:
-                total_line_count += 1
-            else:
-                console_log_lines_out.append(line)
+    def __init__(self, tf2_class: str):
+        self.tf2_class: str = tf2_class
 
-        line_count_text: str = f"{error_line_count} error lines and {blank_line_count} blank lines (total: {total_line_count})"
 
-        if total_line_count >= (1 if self.gui.clean_console_log else 50):
-            with open(console_log_path, 'w', encoding='UTF8') as console_log_write:
-                for line in console_log_lines_out:
-                    console_log_write.write(line)
+class ConnectedTo(ConsoleLogEvent):
+    __slots__ = ('server_address',)
 
-            self.last_console_log_size = os.stat(console_log_path).st_size
-            self.log.debug(f"Removed {line_count_text} from console.log")
-        else:
-            self.log.debug(f"Didn't remove {line_count_text} from console.log")
+    def __init__(self, server_address: str):
+        self.server_address: str = server_address
 
-        if self.gui.clean_console_log:
-            self.gui.pause()
-            messagebox.showinfo("TF2 Rich Presence", f"Removed {line_count_text} from console.log.")
-            self.gui.unpause()
-            self.gui.clean_console_log = False
 
-        self.cleanup_primed = False
-    else:
-        self.cleanup_primed = True
+# before ConnectedTo, and before the map has loaded
+class ConnectingTo(ConsoleLogEvent):
+    __slots__ = ('server_address',)
+
+    def __init__(self, server_address: str):
+        self.server_address: str = server_address
+
+
+class QueueEntered(ConsoleLogEvent):
+    __slots__ = ('queued_state',)
+
+    def __init__(self, queued_state: str):
+        self.queued_state: str = queued_state
+
+
+class QueueLeft(ConsoleLogEvent):
+    __slots__ = ()
+
+
+# line is whatever console.log line caused it
+class ReturnedToMenus(ConsoleLogEvent):
+    __slots__ = ('line',)
+
+    def __init__(self, line: str):
+        self.line: str = line
 
-    return scan_results
+
+# hosting a server, the map it's on gets loaded next
+class ServerStarted(ConsoleLogEvent):
+    __slots__ = ()
 
 
 # check if any characters outside of ASCII exist in any usernames
@@ -342,5 +1063,192 @@ def non_ascii_in_usernames(usernames: Set[str]) -> bool:
     return False
 
 
+# removes the first drop_bytes of a file (opened unbuffered in rb+ mode) in place and returns how many bytes were actually removed
+# in place instead of writing a new file and replacing, because TF2 keeps console.log open the whole time it's running
+def drop_head(log, file, drop_bytes: int) -> int:
+    if drop_bytes <= 0:
+        return 0
+
+    file_stat: os.stat_result = os.fstat(file.fileno())
+    collapse_bytes: int = drop_bytes - (drop_bytes % file_stat.st_blksize) if hasattr(file_stat, 'st_blksize') else 0
+
+    # best case: have the filesystem just forget the first blocks, which copies nothing (but has to be block aligned, so it may drop a bit less)
+    if collapse_bytes > 0 and collapse_range(file, collapse_bytes):
+        log.debug(f"Dropped the first {collapse_bytes} bytes of {file.name} with FALLOC_FL_COLLAPSE_RANGE")
+        return collapse_bytes
+
+    # otherwise move the rest of the file to the start, a chunk at a time so memory use doesn't depend on file size
+    read_position: int = drop_bytes
+    write_position: int = 0
+    use_copy_file_range: bool = hasattr(os, 'copy_file_range') and drop_bytes >= trim_chunk_size  # so that the ranges never overlap, which it doesn't allow
+
+    while True:
+        chunk_size: int = min(trim_chunk_size, os.fstat(file.fileno()).st_size - read_position)
+
+        if chunk_size <= 0:
+            break
+
+        if use_copy_file_range:
+            try:
+                copied: int = os.copy_file_range(file.fileno(), file.fileno(), chunk_size, read_position, write_position)
+            except OSError as error:
+                log.debug(f"copy_file_range failed ({error}), copying through memory instead")
+                use_copy_file_range = False
+                continue
+        else:
+            file.seek(read_position)
+            chunk: bytes = file.read(chunk_size)
+            file.seek(write_position)
+            file.write(chunk)
+            copied = len(chunk)
+
+        if copied == 0:
+            break
+
+        read_position += copied
+        write_position += copied
+
+    file.truncate(write_position)
+    log.debug(f"Dropped the first {drop_bytes} bytes of {file.name} by {'copy_file_range' if use_copy_file_range else 'copying'}")
+    return drop_bytes
+
+
+# so that cleaning up console.log doesn't get in the way of TF2 (or anything else) using the disk
+def lower_thread_priority():
+    try:
+        if sys.platform == 'win32':
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), thread_mode_background_begin)
+        else:
+            psutil.Process(threading.get_native_id()).ionice(psutil.IOPRIO_CLASS_IDLE)  # on Linux, thread IDs work as PIDs here
+    except (OSError, AttributeError, ValueError, psutil.Error):
+        pass
+
+
+# fallocate(2) with FALLOC_FL_COLLAPSE_RANGE on the start of a file, returns whether it worked (needs Linux and a filesystem that supports it, like ext4 or XFS)
+def collapse_range(file, length: int) -> bool:
+    if not sys.platform.startswith('linux'):
+        return False
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+        return libc.fallocate(file.fileno(), falloc_fl_collapse_range, 0, length) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+# how many lines are in a file after a byte offset, without reading it all at once
+def count_lines(file, from_byte: int) -> int:
+    line_count: int = 0
+    file.seek(from_byte)
+
+    for chunk in iter(lambda: file.read(trim_chunk_size), b''):
+        line_count += chunk.count(b'\n')
+
+    return line_count
+
+
+# memory-maps a whole file (read-only), so that it can be searched without reading it all first
+@contextlib.contextmanager
+def mapped(file) -> Iterator[Union[mmap.mmap, bytes]]:
+    if os.fstat(file.fileno()).st_size == 0:
+        yield b''  # empty files can't be mapped
+    else:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+            yield file_map
+
+
+# splits a range of whole lines into chunks of whole lines, newest first
+def backward_blocks(buffer, start: int, end: int) -> Iterator[Tuple[int, int]]:
+    while end > start:
+        block_start: int = max(end - backward_chunk_size, start)
+
+        if block_start > start:
+            previous_newline: int = buffer.rfind(b'\n', start, block_start)
+            block_start = previous_newline + 1 if previous_newline != -1 else start
+
+        yield block_start, end
+        end = block_start
+
+
+# splits a range of whole lines into chunks of whole lines, oldest first
+def forward_blocks(buffer, start: int, end: int, block_size: int) -> Iterator[Tuple[int, int]]:
+    while start < end:
+        block_end: int = min(start + max(block_size, 1), end)
+
+        if block_end < end:
+            next_newline: int = buffer.find(b'\n', block_end - 1, end)
+            block_end = next_newline + 1 if next_newline != -1 else end
+
+        yield start, block_end
+        start = block_end
+
+
+# the start and end (including the newline) of the line that a position is in, for a buffer that doesn't start in the middle of a line
+def line_bounds(buffer, position: int, start: int = 0) -> Tuple[int, int]:
+    previous_newline: int = buffer.rfind(b'\n', start, position)
+    line_end: int = buffer.find(b'\n', position)
+    return previous_newline + 1 if previous_newline != -1 else start, line_end + 1 if line_end != -1 else len(buffer)
+
+
+# line_markers plus the start of the users' kill feed lines, cached since building the pattern takes a bit
+@functools.cache
+def user_markers_regex(usernames: Tuple[str, ...], encoding: str) -> Pattern[bytes]:
+    return re.compile(literals_pattern(line_markers + tuple(f'{username} killed ' for username in usernames)).encode(encoding))
+
+
+# builds a regex that matches any of some literal strings, with common prefixes factored out (a trie, basically) since re doesn't do that itself
+def literals_pattern(literals: Iterable[str]) -> str:
+    trie: dict = {}
+
+    for literal in literals:
+        node: dict = trie
+
+        for char in literal:
+            node = node.setdefault(char, {})
+
+        node[''] = {}  # marks the end of a literal
+
+    def node_pattern(node_: dict) -> str:
+        branches: List[str] = [re.escape(char) + node_pattern(child) for char, child in sorted(node_.items()) if char]
+
+        if not branches:
+            return ''
+
+        pattern: str = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+        return f'(?:{pattern})?' if '' in node_ else pattern
+
+    return node_pattern(trie)
+
+
 tf2_classes: Tuple[str, ...] = ('Scout', 'Soldier', 'Pyro', 'Demoman', 'Heavy', 'Engineer', 'Medic', 'Sniper', 'Spy')
 non_ascii_regex = re.compile('[^\x00-\x7F]')
+match_types: Dict[str, str] = {'12v12 Casual Match': 'Casual', 'MvM Practice': 'MvM (Boot Camp)', 'MvM MannUp': 'MvM (Mann Up)', '6v6 Ladder Match': 'Competitive'}
+menus_messages: Tuple[str, ...] = ('For FCVAR_REPLICATED', '[TF Workshop]', 'request to abandon', 'Server shutting down', 'Lobby destroyed', 'Disconnect:', 'destroyed CAsyncWavDataCache',
+                                   'ShutdownGC', 'Connection failed after', 'Host_Error')
+# a substring of everything that parse_line() can do anything with, so any line without one of these can be skipped without even being looked at
+# (" selected" is missing its leading space because regex searching is much slower when a marker can start with a space)
+# each ConsoleLogParser also adds the start of the user's own kill feed lines
+line_markers: Tuple[str, ...] = ('For FCVAR_REPLICATED', '[TF Workshop]', 'request to abandon', 'Server shutting down', 'Lobby destroyed', 'Disconnect', 'ShutdownGC', 'Connection failed after',
+                                 'Host_Error', 'Kataiser', 'selected \n', 'Missing map', 'SV_ActivateServer', 'Map:', 'Connected to', 'Connecting to', 'matchmaking server', 'CAsyncWavDataCache', '[PartyClient] ')
+# the lines that read_backward() uses to decide how far back it needs to go
+decisive_regex: Pattern[bytes] = re.compile(literals_pattern(menus_messages + ('Disconnect by user', 'Missing map', 'Map:')).encode())
+backward_chunk_size: int = 65536
+summary_block_size: int = 16777216
+parallel_scan_min_bytes: int = 33554432
+parallel_scan_processes: int = min(os.cpu_count() or 1, 8)
+trim_chunk_size: int = 1048576
+scan_window_history: int = 10
+scan_window_headroom: float = 2.0
+# what read_backward() looks further back for, and which of the lines with that in them actually change the state (most [PartyClient] lines don't affect queuing)
+lookback_needles: Dict[bytes, Tuple[bytes, ...]] = {b'[PartyClient] ': (b'[PartyClient] L', b'[PartyClient] Entering q', b'[PartyClient] Entering s'), b'Connected to': (b'Connected to',)}
+scan_window_growth: int = 4
+scan_window_min: int = 65536
+checkpoint_version: int = 4
+checkpoint_interval: float = 5.0
+checkpoint_attributes: Tuple[str, ...] = ('cleaned_offset', 'in_menus', 'tf2_map', 'tf2_class', 'server_address', 'queued_state', 'just_started_server', 'server_still_running',
+                                          'using_wav_cache', 'connecting_to_matchmaking', 'connecting_address', 'found_first_wav_cache', 'kataiser_seen_on', 'kills',
+                                          'menus_message_used')
+falloc_fl_collapse_range: int = 0x08
+thread_mode_background_begin: int = 0x00010000
@@ -5,6 +5,7 @@
 # Quite limited but someone may find a use it (I know I have)
 # Also you can replace a .pyd file here with a .py of the same name (sans .cp310-win32) and it'll import
 
+import console_log
 import logger
 import main
 
@@ -18,6 +19,10 @@ class TF2RPCustom:
         # app.log.debug("Running custom.before_loop()")
         pass
 
+    def console_log_event(self, app: main.TF2RichPresense, event: console_log.ConsoleLogEvent):
+        # app.log.debug(f"Running custom.console_log_event({event})")
+        pass
+
     def modify_game_state(self, app: main.TF2RichPresense):
         # app.log.debug("Running custom.modify_game_state()")
         pass
@@ -40,6 +45,7 @@ if __name__ == '__main__':
     test_TF2RPCustom = TF2RPCustom(main.TF2RichPresense())
 
     test_TF2RPCustom.before_loop(test_app)
+    test_TF2RPCustom.console_log_event(test_app, console_log.ReturnedToMenus(''))
     test_TF2RPCustom.modify_game_state(test_app)
     test_TF2RPCustom.modify_gui(test_app)
     test_TF2RPCustom.modify_rpc_activity(test_app)
@@ -0,0 +1,59 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+# cython: language_level=3
+
+import base64
+import os
+import zlib
+from typing import Tuple
+
+
+# fingerprints a file up to an offset (device + inode, and the first and last few KB before the offset), to tell what's been done to it since
+# size and mtime alone can't tell appending apart from trimming the start (TF2BD does that), truncating and rewriting, or replacing, and each needs a different amount re-read
+class FileIdentity:
+    def __init__(self):
+        self.file_id: Tuple[int, int] = (0, 0)
+        self.offset: int = 0
+        self.head_hash: int = zlib.crc32(b'')
+        self.tail: bytes = b''  # kept whole rather than hashed, so it can be searched for if the start gets trimmed
+
+    def __repr__(self) -> str:
+        return f"file_identity.FileIdentity ({self.file_id}, offset={self.offset}, head_hash={self.head_hash})"
+
+    # fingerprint a buffer (usually an mmap) up to an offset
+    def update(self, buffer, file_stat: os.stat_result, offset: int):
+        self.file_id = (file_stat.st_dev, file_stat.st_ino)
+        self.offset = offset
+        self.head_hash = zlib.crc32(buffer[:min(offset, fingerprint_bytes)])
+        self.tail = bytes(buffer[max(offset - fingerprint_bytes, 0):offset])
+
+    # what's happened to the file since it was fingerprinted, and the offset that the same place is at now (or -1 if it's gone)
+    def compare(self, buffer, file_stat: os.stat_result) -> Tuple[str, int]:
+        same_file: bool = (file_stat.st_dev, file_stat.st_ino) == self.file_id
+
+        if file_stat.st_size >= self.offset and zlib.crc32(buffer[:min(self.offset, fingerprint_bytes)]) == self.head_hash \
+                and buffer[self.offset - len(self.tail):self.offset] == self.tail:
+            return 'appended' if same_file else 'replaced', self.offset
+
+        # the last fingerprinted bytes are still there, just earlier. the latest match is used, since with the start trimmed it'll be the closest
+        # (if they're right where they were, the start was changed in place, which is as good as rewritten)
+        if self.tail:
+            tail_position: int = buffer.rfind(self.tail, 0, min(file_stat.st_size, self.offset - 1))
+
+            if tail_position != -1:
+                return 'head trimmed' if same_file else 'replaced', tail_position + len(self.tail)
+
+        return 'rewritten' if same_file else 'replaced', -1
+
+    # for saving as JSON
+    def checkpoint(self) -> dict:
+        return {'file_id': list(self.file_id), 'offset': self.offset, 'head_hash': self.head_hash, 'tail': base64.b64encode(self.tail).decode('ASCII')}
+
+    def restore(self, checkpoint: dict):
+        self.file_id = tuple(checkpoint['file_id'])
+        self.offset = checkpoint['offset']
+        self.head_hash = checkpoint['head_hash']
+        self.tail = base64.b64decode(checkpoint['tail'])
+
+
+fingerprint_bytes: int = 4096
@@ -0,0 +1,208 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+# cython: language_level=3
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+import traceback
+from typing import Optional, Tuple
+
+import logger
+
+
+# waits for a file (console.log) to change, so the main loop can wake up as soon as something happens instead of on a timer
+class FileWatcher:
+    def __init__(self, log: logger.Log):
+        self.log: logger.Log = log
+        self.path: Optional[str] = None
+        self.signature: Optional[Tuple[int, int]] = None
+        self.inotify_fd: Optional[int] = None
+        self.watch_descriptor: Optional[int] = None
+        self.inotify_failed: bool = False
+        self.next_poll_time: float = 0.0
+        self.changes: int = 0
+
+    def __repr__(self) -> str:
+        return f"file_watch.FileWatcher ({self.path}, inotify={self.inotify_fd is not None}, changes={self.changes})"
+
+    # start watching a file, or stop watching with None. the file doesn't have to exist yet
+    def watch(self, path: Optional[str]):
+        if path == self.path:
+            return
+
+        self.close()
+        self.path = path
+        self.signature = stat_signature(path) if path else None
+
+        if path and not self.inotify_failed:
+            self.start_inotify()
+
+        self.log.debug(f"Watching {path} ({'inotify' if self.inotify_fd is not None else 'polling'})")
+
+    # block for up to timeout seconds, returns whether the file changed (after waiting for writes to settle)
+    def wait(self, timeout: float) -> bool:
+        if not self.path:
+            time.sleep(timeout)
+            return False
+
+        if self.inotify_fd is not None:
+            changed: bool = self.wait_inotify(timeout)
+        else:
+            changed = self.wait_polling(timeout)
+
+        if changed:
+            self.changes += 1
+
+        return changed
+
+    def close(self):
+        if self.inotify_fd is not None:
+            try:
+                os.close(self.inotify_fd)
+            except OSError:
+                pass
+
+            self.inotify_fd = None
+            self.watch_descriptor = None
+
+        self.path = None
+        self.signature = None
+
+    # watch the file's folder rather than the file itself, so that it being created or replaced is seen too
+    def start_inotify(self):
+        try:
+            libc = load_libc()
+
+            if not libc:
+                self.inotify_failed = True
+                return
+
+            inotify_fd: int = libc.inotify_init1(in_nonblock | in_cloexec)
+            if inotify_fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+            watch_descriptor: int = libc.inotify_add_watch(inotify_fd, os.fsencode(os.path.dirname(self.path) or '.'), in_watch_mask)
+            if watch_descriptor < 0:
+                os.close(inotify_fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+            self.inotify_fd = inotify_fd
+            self.watch_descriptor = watch_descriptor
+        except Exception:
+            self.log.error(f"Couldn't set up inotify, polling console.log instead: {traceback.format_exc()}", reportable=False)
+            self.inotify_failed = True
+
+    def wait_inotify(self, timeout: float) -> bool:
+        if not self.read_inotify(timeout):
+            return False
+
+        # TF2 writes a bunch of lines at once (especially when loading a map), so wait until it's quiet before saying anything changed
+        settle_deadline: float = time.perf_counter() + debounce_max_time
+        while time.perf_counter() < settle_deadline and self.read_inotify(debounce_time):
+            pass
+
+        return True
+
+    # returns whether any events were about the watched file
+    def read_inotify(self, timeout: float) -> bool:
+        try:
+            readable: list = select.select((self.inotify_fd,), (), (), timeout)[0]
+        except (OSError, ValueError):
+            return False
+
+        if not readable:
+            return False
+
+        try:
+            events: bytes = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return False
+
+        file_name: bytes = os.fsencode(os.path.basename(self.path))
+        position: int = 0
+        relevant: bool = False
+
+        while position + inotify_event_size <= len(events):
+            name_length: int = struct.unpack_from('iIII', events, position)[3]
+            name: bytes = events[position + inotify_event_size:position + inotify_event_size + name_length].rstrip(b'\x00')
+            position += inotify_event_size + name_length
+
+            if name == file_name:
+                relevant = True
+
+        return relevant
+
+    # for when inotify isn't available (Windows, mostly). nanosecond mtime + size, so same-second appends aren't missed
+    def wait_polling(self, timeout: float) -> bool:
+        deadline: float = time.perf_counter() + timeout
+
+        while True:
+            time.sleep(max(min(self.next_poll_time, deadline) - time.perf_counter(), 0))
+
+            if time.perf_counter() < self.next_poll_time:
+                return False
+
+            self.next_poll_time = time.perf_counter() + poll_interval
+            signature: Optional[Tuple[int, int]] = stat_signature(self.path)
+
+            if signature != self.signature:
+                settle_deadline: float = time.perf_counter() + debounce_max_time
+
+                while time.perf_counter() < settle_deadline:
+                    time.sleep(debounce_time)
+                    settled_signature: Optional[Tuple[int, int]] = stat_signature(self.path)
+
+                    if settled_signature == signature:
+                        break
+
+                    signature = settled_signature
+
+                self.signature = signature
+                return True
+
+            if time.perf_counter() >= deadline:
+                return False
+
+
+# (mtime in nanoseconds, size), or None if the file doesn't exist
+def stat_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        file_stat: os.stat_result = os.stat(path)
+    except OSError:
+        return None
+
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+def load_libc() -> Optional[ctypes.CDLL]:
+    if not hasattr(os, 'pipe2'):  # cheap "is this Linux-ish" check, inotify is Linux only
+        return None
+
+    libc_name: Optional[str] = ctypes.util.find_library('c')
+
+    try:
+        libc: ctypes.CDLL = ctypes.CDLL(libc_name or 'libc.so.6', use_errno=True)
+        libc.inotify_init1  # noqa
+        libc.inotify_add_watch  # noqa
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+in_modify: int = 0x00000002
+in_close_write: int = 0x00000008
+in_moved_to: int = 0x00000080
+in_create: int = 0x00000100
+in_delete: int = 0x00000200
+in_watch_mask: int = in_modify | in_close_write | in_moved_to | in_create | in_delete
+in_nonblock: int = 0o4000
+in_cloexec: int = 0o2000000
+inotify_event_size: int = struct.calcsize('iIII')
+poll_interval: float = 0.1
+debounce_time: float = 0.02
+debounce_max_time: float = 0.1
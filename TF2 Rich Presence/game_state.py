@@ -2,9 +2,11 @@
 # https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
 # cython: language_level=3
 
+import concurrent.futures
 import time
 from typing import Dict, List, Optional, Set, Tuple
 
+import console_log
 import gamemodes
 import gui
 import launcher
@@ -16,17 +18,21 @@ import settings
 
 # this could be in main.py due to being so closely linked to the main logic, but I figured this was better for organization
 class GameState:
-    def __init__(self, log: Optional[logger.Log] = None, loc: Optional[localization.Localizer] = None):
+    def __init__(self, log: Optional[logger.Log] = None, loc: Optional[localization.Localizer] = None, server_cache_path: Optional[str] = None):
         self.in_menus: bool = True
         self.tf2_map: str = ''  # these have "tf2_" to avoid conflicting with reserved keywords
         self.tf2_class: str = "unselected"
         self.map_fancy: str = ''
         self.server_address: str = ''
+        self.connected_address: str = ''  # the last server connected to, even if not currently in game
+        self.connecting_address: str = ''  # a server being connected to from the menus, to query early
+        self.connecting_time: float = 0.0
         self.queued_state: str = "Not queued"
         self.hosting: bool = False
         self.server_name: str = ''
         self.player_count: str = ''
         self.kills: str = ''
+        self.feed_kills: Optional[int] = None  # counted from console.log's kill feed, None if that isn't available and the server has to be asked
         self.gamemode: str = ''
         self.gamemode_fancy: str = ''
         self.custom_map: bool = False
@@ -36,9 +42,9 @@ class GameState:
 
         self.update_rpc: bool = True
         # don't track whether the GUI needs to be updated, main just always calls its updates and lets it handle whether or not it needs to set elements
-        self.last_server_request_time: float = 0.0
         self.last_server_request_data: Dict[str, str] = {}
         self.last_server_request_address: str = ''
+        self.pending_server_query: Optional[Tuple[str, List[str], concurrent.futures.Future]] = None  # address, modes, and the query in progress
         self.updated_server_state: bool = False
         self.force_zero_map_time: bool = False
 
@@ -54,6 +60,10 @@ class GameState:
             self.loc = localization.Localizer()
             self.log.error("Initialized GameState without a localizer")
 
+        self.server_queries: server.QueryEngine = server.QueryEngine(self.log)
+        self.server_schedule: server.QueryScheduler = server.QueryScheduler(self.log)
+        self.server_cache: server.ServerInfoCache = server.ServerInfoCache(self.log, server_cache_path)
+
     def __repr__(self) -> str:
         return f"game_state.GameState ({str(self)})"
 
@@ -171,6 +181,41 @@ class GameState:
         if str(self) != prev_state:  # don't use self.update_rpc because of server data changes not mattering here
             self.log.debug(f"Game state updated from ({prev_state}) to ({str(self)})")
 
+    # fold in one thing that happened in console.log, instead of setting everything at once
+    def apply(self, event: console_log.ConsoleLogEvent):
+        prev_state: str = str(self)
+
+        if isinstance(event, console_log.MapLoaded):
+            self.set_in_menus(False)
+            self.set_hosting(event.hosting)
+            self.set_tf2_map(event.tf2_map)
+            self.set_tf2_class('')
+            self.server_address = '' if event.hosting else self.connected_address
+        elif isinstance(event, console_log.ClassSelected):
+            if not self.in_menus:
+                self.set_tf2_class(event.tf2_class)
+        elif isinstance(event, console_log.ConnectedTo):
+            # usually happens before the map loads, so remember it for then
+            self.connected_address = event.server_address
+
+            if not self.in_menus and not self.hosting:
+                self.server_address = event.server_address
+        elif isinstance(event, console_log.ConnectingTo):
+            self.set_connecting_address(event.server_address)
+        elif isinstance(event, console_log.QueueEntered):
+            self.set_queued_state("Queued" if settings.get('hide_queued_gamemode') else event.queued_state)
+        elif isinstance(event, console_log.QueueLeft):
+            self.set_queued_state("Not queued")
+        elif isinstance(event, console_log.ReturnedToMenus):
+            self.set_in_menus(True)
+        elif isinstance(event, console_log.ServerStarted):
+            pass  # the following MapLoaded says whether the server is still running
+        else:
+            self.log.error(f"Unknown console.log event: {event}")
+
+        if str(self) != prev_state:
+            self.log.debug(f"Game state updated from ({prev_state}) to ({str(self)}) by {event}")
+
     def set_in_menus(self, in_menus: bool):
         if in_menus != self.in_menus:
             self.in_menus = in_menus
@@ -184,6 +229,11 @@ class GameState:
                 self.custom_map = False
                 self.server_address = ''
 
+    def set_connecting_address(self, connecting_address: str):
+        if connecting_address != self.connecting_address:
+            self.connecting_address = connecting_address
+            self.connecting_time = time.time()
+
     def set_tf2_map(self, tf2_map: str):
         if tf2_map != self.tf2_map:
             self.tf2_map = tf2_map
@@ -191,6 +241,7 @@ class GameState:
 
             if tf2_map:
                 self.map_change_time = int(time.time())
+                self.server_schedule.map_changed()
                 self.map_fancy, self.gamemode, self.gamemode_fancy, self.custom_map = gamemodes.get_map_gamemode(self.log, self.tf2_map)
                 self.map_line = self.loc.text("Map: {0} (hosting)").format(self.map_fancy) if self.hosting else self.loc.text("Map: {0}").format(self.map_fancy)
                 self.log.debug(f"Set map to {(self.tf2_map, self.map_fancy, self.gamemode)}, custom map={self.custom_map}")
@@ -232,13 +283,15 @@ class GameState:
         self.updated_server_state = True
 
         if modes:
-            if ('Server name' in modes and 'server_name' not in self.last_server_request_data) \
-                    or ('Player count' in modes and 'player_count' not in self.last_server_request_data) \
-                    or ('Kills' in modes and 'kills' not in self.last_server_request_data):
+            server_modes: List[str] = self.server_modes(modes)
+
+            if ('Server name' in server_modes and 'server_name' not in self.last_server_request_data) \
+                    or ('Player count' in server_modes and 'player_count' not in self.last_server_request_data) \
+                    or ('Kills' in server_modes and 'kills' not in self.last_server_request_data):
                 # for changing server data modes mid-game
                 self.clear_server_data_cache()
 
-            server_data: Dict[str, str] = self.get_match_data(self.server_address, modes, usernames)
+            server_data: Dict[str, str] = self.get_match_data(self.server_address, server_modes, usernames) if server_modes else {}
 
             # get_match_data doesn't set these (but it could)
             if 'Server name' in modes:
@@ -252,7 +305,7 @@ class GameState:
                 self.set_player_count('')
 
             if 'Kills' in modes:
-                self.set_kills(server_data['kills'])
+                self.set_kills(server_data['kills'] if 'Kills' in server_modes else self.loc.text("Kills: {0}").format(self.feed_kills))
             else:
                 self.set_kills('')
         else:
@@ -260,12 +313,22 @@ class GameState:
             self.set_player_count('')
             self.set_kills('')
 
+    # kills from the kill feed are up to date the moment they happen and don't need a query (the server only has score anyway), so only ask it for the rest
+    def server_modes(self, modes: List[str]) -> List[str]:
+        return [mode for mode in modes if mode != 'Kills'] if self.feed_kills is not None else modes
+
+    # start querying a server that's being connected to, so that the data's (probably) there as soon as the map's loaded instead of a loop or two after
+    def prefetch_server_data(self, modes: List[str], usernames: Set[str]):
+        if self.in_menus and self.connecting_address and time.time() - self.connecting_time < prefetch_time_limit and self.server_modes(modes):
+            self.get_match_data(self.connecting_address, self.server_modes(modes), usernames)
+
     # force new server query
     def clear_server_data_cache(self):
         self.log.debug("Clearing server data cache")
-        self.last_server_request_time = 0.0
+        self.server_schedule.clear()
         self.last_server_request_data = {}
         self.last_server_request_address = ''
+        self.pending_server_query = None
 
     # convert seconds to a pretty timestamp, keep leading zeros though
     def time_on_map(self) -> str:
@@ -310,3 +373,4 @@ map_fallbacks: Dict[str, str] = {'cp_granary': 'arena_granary', 'arena_nucleus':
                                  'koth_badlands': 'cp_badlands', 'tr_dustbowl': 'cp_dustbowl', 'ctf_thundermountain': 'pl_thundermountain', 'ctf_well': 'cp_well', 'arena_well': 'cp_well'}
 ambiguous_maps: Tuple[str, ...] = ('cp_5gorge', 'cp_gorge', 'arena_granary', 'arena_nucleus', 'ctf_foundry', 'arena_sawmill', 'koth_sawmill', 'ctf_sawmill',  'arena_badlands', 'cp_badlands',
                                    'koth_badlands',  'tr_dustbowl', 'ctf_thundermountain', 'ctf_well', 'cp_well', 'arena_well', 'vsh_nucleus')
+prefetch_time_limit: float = 60.0  # a connection that's taking longer than this probably failed without saying so
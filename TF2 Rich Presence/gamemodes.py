@@ -23,7 +23,7 @@ def get_map_gamemode(log: logger.Log, map_filename: str) -> Union[Tuple[str, str
     map_gamemodes: Dict[str, List[str]] = load_maps_db()
 
     if map_filename in map_gamemodes:
-        map_data: list = map_gamemodes[map_filename]
+        map_data: list = map_gamemodes[map_filename].copy()  # the database is cached, so don't add to it
         map_data.append(False)
 
         # add some formatting for maps with multiple gamemodes
@@ -60,8 +60,9 @@ class GUI(tk.Frame):
         self.class_state: str = ''
         self.available_update_data: Tuple[str, str, str] = ('', '', '')
         self.update_window_open: bool = False
-        self.bottom_text_state: Dict[str, bool] = {'discord': False, 'kataiser': False, 'queued': False, 'holiday': False}
+        self.bottom_text_state: Dict[str, bool] = {'discord': False, 'cleaning': False, 'kataiser': False, 'queued': False, 'holiday': False}
         self.bottom_text_queue_state: str = ""
+        self.cleanup_progress_text: str = ""
         self.holiday_text: str = ""
         self.launched_tf2_with_button: bool = False
         self.tf2_launch_cmd: Optional[Tuple[str, str]] = None
@@ -234,6 +235,7 @@ class GUI(tk.Frame):
         prev_text: str = ""
         text: str = ""
         states: dict[str, str] = {'discord': self.loc.text("Can't connect to Discord"),
+                                  'cleaning': self.cleanup_progress_text,
                                   'kataiser': self.loc.text("Hey, it seems that Kataiser, the developer of TF2 Rich Presence, is in your game!\nSay hi to me if you'd like :)"),
                                   'queued': self.bottom_text_queue_state,
                                   'holiday': self.holiday_text}
@@ -256,6 +258,18 @@ class GUI(tk.Frame):
 
         return text
 
+    # show how far along a background console.log cleanup is, or hide it with None
+    def set_cleanup_progress(self, progress: Optional[float]):
+        if progress is None:
+            self.set_bottom_text('cleaning', False)
+        else:
+            progress_text: str = f"Cleaning console.log ({round(progress * 10) * 10}%)"
+
+            if progress_text != self.cleanup_progress_text or not self.bottom_text_state['cleaning']:
+                self.cleanup_progress_text = progress_text
+                self.bottom_text_state['cleaning'] = False  # so that set_bottom_text sees the text change
+                self.set_bottom_text('cleaning', True)
+
     # only show the console.log menu buttons if the game is running
     def set_console_log_button_states(self, enabled: bool):
         self.file_menu.entryconfigure(self.console_log_command_indices[0], state=tk.ACTIVE if enabled else tk.DISABLED)
@@ -503,9 +517,8 @@ class GUI(tk.Frame):
         self.unpause()
 
     def menu_clean_console_log(self, *args):
-        self.log.info("GUI: Cleaning console.log next loop")
-        self.clean_console_log = True  # console_log.py will see this and force a cleanup
-        # TODO: do this immediately instead of waiting till next scan
+        self.log.info("GUI: Cleaning console.log")
+        self.clean_console_log = True  # console_log.py will see this and force a cleanup, main ends its sleep early for it
 
     def menu_exit(self, *args):
         self.log.info("GUI: Exiting")
@@ -601,7 +614,7 @@ class GUI(tk.Frame):
                      f"\nhinata_aki - Japanese localization improvements" \
                      f"\nKotoki1337 - Chinese localization improvements" \
                      f"\nDznDani - Spanish localization improvements" \
-                     f"\nDarkyyu - French localization improvements"
+                     f"\nDarkyyu - French localization improvements" \
                      f"\nJan200101 - Some cross-platform compatibility" \
                      f"\nYahBoiOven - Testing and feedback" \
                      f"\nThe TF2 Wiki and teamwork.tf - General resources" \
@@ -28,13 +28,14 @@ import os
 import platform
 import time
 import traceback
-from typing import Any, Dict, Optional, Set, Tuple, Union
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import psutil
 from discoIPC import ipc
 
 import configs
 import console_log
+import file_watch
 import game_state
 import gamemodes
 import gui
@@ -74,7 +75,7 @@ def launch():
 
 
 class TF2RichPresense:
-    def __init__(self, log: Optional[logger.Log] = None, set_process_priority: bool = True):
+    def __init__(self, log: Optional[logger.Log] = None, set_process_priority: bool = True, main_gui: Optional[gui.GUI] = None):
         if log:
             self.log: logger.Log = log
         else:
@@ -90,10 +91,11 @@ class TF2RichPresense:
         else:
             self.log.debug(f"Non-default settings: {settings.compare_settings(default_settings, current_settings)}")
 
-        self.gui: gui.GUI = gui.GUI(self.log, main_controlled=True)
+        self.gui: gui.GUI = main_gui if main_gui else gui.GUI(self.log, main_controlled=True)  # replay.py uses a headless stand-in
         self.process_scanner: processes.ProcessScanner = processes.ProcessScanner(self.log)
+        self.process_snapshot: Optional[processes.ProcessSnapshot] = None
         self.loc: localization.Localizer = localization.Localizer(self.log)
-        self.game_state: game_state.GameState = game_state.GameState(self.log, self.loc)
+        self.game_state: game_state.GameState = game_state.GameState(self.log, self.loc, utils.server_cache_json_path())
         self.rpc_client: Optional[ipc.DiscordIPC] = None
         self.client_connected: bool = False
         self.rpc_connected: bool = False
@@ -104,8 +106,8 @@ class TF2RichPresense:
         self.should_mention_steam: bool = True
         self.has_checked_class_configs: bool = False
         self.has_seen_kataiser: bool = False
-        self.console_log_mtime: Optional[int] = None
-        self.old_console_log_mtime: Optional[int] = None
+        self.console_log_mtime: Optional[Tuple[int, int]] = None
+        self.old_console_log_mtime: Optional[Tuple[int, int]] = None
         self.loop_iteration: int = 0
         self.custom_functions = None
         self.usernames: Set[str] = set()
@@ -114,12 +116,16 @@ class TF2RichPresense:
         self.cleanup_primed: bool = True
         self.slow_sleep_time: bool = False
         self.has_set_process_priority: bool = not set_process_priority
-        self.kataiser_scan_loop: int = 0
         self.did_init_operations: bool = False
         self.no_condebug: bool = False
         self.fast_next_loop: bool = False
         self.reset_launched_with_button: bool = False
-        self.last_console_log_size: Optional[int] = None
+        self.console_log_parser: Optional[console_log.ConsoleLogParser] = None
+        self.console_log_events: Optional[List[console_log.ConsoleLogEvent]] = None  # from the last scan, if it continued from the one before it
+        self.console_log_cleaner: Optional[console_log.ConsoleLogCleaner] = None
+        self.console_log_watcher: file_watch.FileWatcher = file_watch.FileWatcher(self.log)
+        self.console_scan_window: console_log.ScanWindow = console_log.ScanWindow(self.log)
+        self.console_log_checkpoint: console_log.ConsoleLogCheckpoint = console_log.ConsoleLogCheckpoint(self.log, utils.checkpoint_json_path())
 
         try:
             self.log.cleanup(20 if launcher.DEBUG else 10)
@@ -177,10 +183,35 @@ class TF2RichPresense:
             self.log.debug(f"Sleeping for {sleep_time} seconds (slow = {self.slow_sleep_time})")
 
             if not self.fast_next_loop:
-                while time.perf_counter() - sleep_time_started < sleep_time and self.gui.alive:
-                    time.sleep(1 / 30)  # 30 Hz updates (btw tell me if this is stupid)
+                console_log_changed: bool = False
+
+                while time.perf_counter() - sleep_time_started < sleep_time and self.gui.alive and not self.gui.clean_console_log:
+                    # 30 Hz updates (btw tell me if this is stupid), but wake up early if console.log gets written to
+                    # a spammy console (chat, errors) shouldn't make the whole loop run constantly though, so only lines that could change something count
+                    if self.console_log_watcher.wait(1 / 30) and not console_log_changed:
+                        console_log_changed = not self.console_log_parser or self.console_log_parser.appended_markers()
+
+                    if self.console_log_cleaner:
+                        self.gui.set_cleanup_progress(self.console_log_cleaner.progress)
+
                     self.gui.safe_update()
 
+                    if console_log_changed and time.perf_counter() - sleep_time_started >= min_early_wake_time:
+                        self.log.debug(f"console.log was modified, ending sleep early ({round(time.perf_counter() - sleep_time_started, 2)} seconds)")
+                        break
+
+                    # same for TF2, Steam, or Discord closing (where that can be watched for)
+                    exited_programs: List[str] = self.process_scanner.process_watcher.exited()
+                    if exited_programs and time.perf_counter() - sleep_time_started >= min_early_wake_time:
+                        self.log.debug(f"{', '.join(exited_programs)} exited, ending sleep early ({round(time.perf_counter() - sleep_time_started, 2)} seconds)")
+                        break
+
+                    # server queries finish in the background, so show their results as soon as they're in
+                    if self.game_state.server_queries.new_result.is_set() and time.perf_counter() - sleep_time_started >= min_early_wake_time:
+                        self.game_state.server_queries.new_result.clear()
+                        self.log.debug(f"Got server data, ending sleep early ({round(time.perf_counter() - sleep_time_started, 2)} seconds)")
+                        break
+
     # the main logic. runs every 2 or 5 seconds (by default)
     def loop_body(self):
         # because closing the GUI doesn't actually exit the program
@@ -198,18 +229,27 @@ class TF2RichPresense:
         if self.custom_functions:
             self.custom_functions.before_loop(self)
 
-        p_data: Dict[str, Dict[str, Union[bool, str, int, None]]] = self.process_scanner.scan()
+        p_data: processes.ProcessSnapshot = self.process_scanner.scan()
+
+        if p_data is not self.process_snapshot:
+            started_programs: List[str]
+            stopped_programs: List[str]
+            started_programs, stopped_programs = p_data.diff(self.process_snapshot)
+            self.process_snapshot = p_data  # (the scanner logs what changed)
+
+            if 'TF2' in stopped_programs:
+                self.console_log_watcher.watch(None)  # until TF2's back, and its console.log could be somewhere else by then
 
         if self.process_scanner.tf2_without_condebug:
             self.no_condebug = True
 
-        if p_data['Steam']['running']:
+        if p_data.steam.running:
             username_count: int = len(self.usernames)
             self.usernames.add(configs.get_steam_username())
             if len(self.usernames) != username_count:
                 self.log.debug(f"Username(s) updated: {self.usernames}")
 
-            if not p_data['TF2']['running']:
+            if not p_data.tf2.running:
                 # reads steam config files to find TF2 launch options (on first loop, and if any of them have been modified)
                 config_scan_needed: bool = self.steam_config_mtimes == {} or not self.gui.tf2_launch_cmd
 
@@ -223,9 +263,9 @@ class TF2RichPresense:
 
                 if config_scan_needed:
                     # to be clear, this scan is always needed but doesn't need to be re-done every loop
-                    tf2_exe_path: str = self.find_tf2_exe(p_data['Steam']['path'])
+                    tf2_exe_path: str = self.find_tf2_exe(p_data.steam.path)
                     need_condebug: bool = not self.gui.launched_tf2_with_button and self.process_scanner.tf2_without_condebug
-                    tf2_launch_cmd: Optional[str] = self.steam_config_file(p_data['Steam']['path'], need_condebug)
+                    tf2_launch_cmd: Optional[str] = self.steam_config_file(p_data.steam.path, need_condebug)
 
                     if tf2_exe_path and tf2_launch_cmd is not None:
                         self.gui.tf2_launch_cmd = (tf2_exe_path, tf2_launch_cmd)
@@ -233,31 +273,51 @@ class TF2RichPresense:
                     elif self.process_scanner.tf2_without_condebug:
                         self.no_condebug = True
         else:
-            if p_data['Steam']['pid'] is not None or p_data['Steam']['path'] is not None:
-                self.log.error(f"Steam isn't running but its process info is {p_data['Steam']}. WTF?")
+            if p_data.steam.pid is not None or p_data.steam.path is not None:
+                self.log.error(f"Steam isn't running but its process info is {p_data.steam}. WTF?")
 
-            if p_data['TF2']['running']:
+            if p_data.tf2.running:
                 self.log.error("TF2 is running but Steam isn't. WTF?")
 
-        if p_data['TF2']['running'] and p_data['Discord']['running'] and p_data['Steam']['running']:
+        if p_data.tf2.running and p_data.discord.running and p_data.steam.running:
             # modifies a few tf2 config files
             if not self.has_checked_class_configs:
-                configs.class_config_files(self.log, p_data['TF2']['path'])
+                configs.class_config_files(self.log, p_data.tf2.path)
                 self.has_checked_class_configs = True
 
-            self.game_state.game_start_time = p_data['TF2']['time']
+            self.game_state.game_start_time = p_data.tf2.time
             self.gui.set_console_log_button_states(True)
             self.gui.set_launch_tf2_button_state(False)
             self.gui.set_bottom_text('discord', False)
             self.reset_launched_with_button = True
 
-            console_log_path: str = os.path.join(p_data['TF2']['path'], 'tf', 'console.log')
+            console_log_path: str = os.path.join(p_data.tf2.path, 'tf', 'console.log')
             self.gui.console_log_path = console_log_path
-            console_log_parsed: Optional[Tuple[bool, str, str, str, str, bool]] = self.interpret_console_log(console_log_path, self.usernames, tf2_start_time=p_data['TF2']['time'])
+            self.console_log_watcher.watch(console_log_path)
+            console_log_parsed: Optional[Tuple[bool, str, str, str, str, bool]] = self.interpret_console_log(console_log_path, self.usernames, tf2_start_time=p_data.tf2.time)
             self.old_console_log_mtime = self.console_log_mtime
 
             if console_log_parsed:
-                self.game_state.set_bulk(console_log_parsed)
+                if self.console_log_events is None:
+                    self.game_state.set_bulk(console_log_parsed)
+                    self.game_state.connected_address = self.console_log_parser.server_address if self.console_log_parser else ''
+                else:
+                    # only what just happened, so custom.py can react to it too
+                    for console_log_event in self.console_log_events:
+                        self.game_state.apply(console_log_event)
+
+                        if self.custom_functions and hasattr(self.custom_functions, 'console_log_event'):  # older custom.py files don't have it
+                            self.custom_functions.console_log_event(self, console_log_event)
+
+            self.game_state.feed_kills = self.console_log_parser.kills if self.console_log_parser else None
+            self.game_state.set_connecting_address(self.console_log_parser.connecting_address if self.console_log_parser else '')
+
+            # get server data, if needed (game_state doesn't handle it itself)
+            server_modes: List[str] = []
+            if settings.get('top_line') in ('Server name', 'Player count', 'Kills'):
+                server_modes.append(settings.get('top_line'))
+            if settings.get('bottom_line') in ('Server name', 'Player count', 'Kills'):
+                server_modes.append(settings.get('bottom_line'))
 
             base_window_title: str = self.loc.text("TF2 Rich Presence ({0})").format(launcher.VERSION)
             window_title_format_menus: str = self.loc.text("{0} - {1} ({2})")
@@ -266,22 +326,21 @@ class TF2RichPresense:
             if self.game_state.in_menus:
                 self.test_state = 'menus'
                 window_title: str = window_title_format_menus.format(base_window_title, "In menus", self.loc.text(self.game_state.queued_state))
+                self.game_state.prefetch_server_data(server_modes, self.usernames)
+                self.game_state.server_cache.save(force=True)  # whatever's left from the last game
             else:
                 self.test_state = 'in game'
                 window_title = window_title_format_main.format(base_window_title, self.game_state.tf2_class, self.game_state.map_fancy)
 
-                # get server data, if needed (game_state doesn't handle it itself)
-                server_modes = []
-                if settings.get('top_line') in ('Server name', 'Player count', 'Kills'):
-                    server_modes.append(settings.get('top_line'))
-                if settings.get('bottom_line') in ('Server name', 'Player count', 'Kills'):
-                    server_modes.append(settings.get('bottom_line'))
                 self.game_state.update_server_data(server_modes, self.usernames)
 
+                if server_modes:
+                    self.log.debug(f"Server query stats: {self.game_state.server_schedule}")
+
             if self.custom_functions:
                 self.custom_functions.modify_game_state(self)
 
-            self.set_gui_from_game_state(p_data['TF2']['time'])
+            self.set_gui_from_game_state(p_data.tf2.time)
 
             if self.custom_functions:
                 self.custom_functions.modify_gui(self)
@@ -302,7 +361,7 @@ class TF2RichPresense:
             self.gui.master.title(window_title)
             self.log.debug(f"Set window title to \"{window_title}\"")
 
-        elif not p_data['TF2']['running']:
+        elif not p_data.tf2.running:
             # there's probably a better way to do this
             if self.reset_launched_with_button:
                 self.gui.launched_tf2_with_button = False
@@ -316,21 +375,21 @@ class TF2RichPresense:
                     self.gui.set_launch_tf2_button_state(True)
                     self.gui.launch_tf2()
                 else:
-                    self.gui.set_launch_tf2_button_state(p_data['Steam']['running'])
+                    self.gui.set_launch_tf2_button_state(p_data.steam.running)
 
-            self.last_console_log_size = None
+            self.console_log_parser = None
             self.necessary_program_not_running('Team Fortress 2', 'TF2')
             self.should_mention_tf2 = False
-        elif not p_data['Discord']['running']:
+        elif not p_data.discord.running:
             self.necessary_program_not_running('Discord')
             self.should_mention_discord = False
-            self.gui.set_launch_tf2_button_state(p_data['Steam']['running'])
+            self.gui.set_launch_tf2_button_state(p_data.steam.running)
             self.gui.launch_tf2_button['state'] = 'disabled'
         else:
             # last but not least, Steam
             self.necessary_program_not_running('Steam')
             self.should_mention_steam = False
-            self.gui.set_launch_tf2_button_state(p_data['Steam']['running'])
+            self.gui.set_launch_tf2_button_state(p_data.steam.running)
             self.gui.launch_tf2_button['state'] = 'disabled'
 
         self.auto_launch_tf2 = False
@@ -445,6 +504,10 @@ class TF2RichPresense:
                 # connects to Discord
                 self.log.debug("Connecting to Discord IPC...")
                 self.rpc_client = ipc.DiscordIPC(utils.get_api_key('discord2'))
+
+                if self.process_scanner.discord_ipc_path:
+                    self.rpc_client.ipc_path = self.process_scanner.discord_ipc_path  # discoIPC only knows about discord-ipc-0, and not Flatpak or Snap
+
                 self.rpc_client.connect()
                 self.log.debug("Connection successful")
                 self.game_state.update_rpc = True
@@ -495,5 +558,8 @@ class TF2RichPresense:
         return configs.find_tf2_exe(self, *args, **kwargs)
 
 
+min_early_wake_time: float = 0.1
+
+
 if __name__ == '__main__':
     launch()
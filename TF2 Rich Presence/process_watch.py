@@ -0,0 +1,82 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+# cython: language_level=3
+
+import os
+import select
+from typing import Dict, List, Tuple
+
+import logger
+
+
+# knows the moment TF2, Steam, or Discord exits, instead of the next time processes get scanned. uses pidfds (Linux 5.3+), which become readable when their process exits and,
+# unlike PIDs, can't end up referring to some other process. without them, this watches nothing and scanning notices exits like before
+# (new processes are still only found by scanning, see ProcessScanner.scan_posix)
+class ProcessWatcher:
+    def __init__(self, log: logger.Log):
+        self.log: logger.Log = log
+        self.pidfds: Dict[str, Tuple[int, int]] = {}  # program: (PID, pidfd)
+        self.pidfd_failed: bool = not hasattr(os, 'pidfd_open')
+
+    def __repr__(self) -> str:
+        return f"process_watch.ProcessWatcher ({self.watched()}, pidfd={not self.pidfd_failed})"
+
+    # watch these programs' processes (program: PID), and stop watching any others
+    def watch(self, pids: Dict[str, int]):
+        watched_before: Dict[str, int] = self.watched()
+
+        for program in [program for program in self.pidfds if pids.get(program) != self.pidfds[program][0]]:
+            close_pidfd(self.pidfds.pop(program)[1])
+
+        if self.pidfd_failed:
+            return
+
+        for program, pid in pids.items():
+            if program in self.pidfds:
+                continue
+
+            try:
+                self.pidfds[program] = (pid, os.pidfd_open(pid))
+            except ProcessLookupError:
+                continue  # already exited, the next scan will notice
+            except OSError as error:  # old kernel, or not allowed (some sandboxes)
+                self.log.error(f"Couldn't open a pidfd, process exits will only be noticed by scanning: {error}", reportable=False)
+                self.pidfd_failed = True
+                self.close()
+                return
+
+        if self.watched() != watched_before:  # this gets called every scan
+            self.log.debug(f"Watching processes: {self}")
+
+    # program: PID, for what's being watched
+    def watched(self) -> Dict[str, int]:
+        return {program: pid for program, (pid, _) in self.pidfds.items()}
+
+    # whether this program's process is being watched (and so will show up in exited() once it's gone)
+    def watching(self, program: str, pid: int) -> bool:
+        return program in self.pidfds and self.pidfds[program][0] == pid
+
+    # programs whose watched processes have exited. doesn't block, so it's fine to call constantly
+    def exited(self) -> List[str]:
+        if not self.pidfds:
+            return []
+
+        try:
+            readable: list = select.select([pidfd for _, pidfd in self.pidfds.values()], (), (), 0)[0]
+        except (OSError, ValueError):
+            return []
+
+        return [program for program, (_, pidfd) in self.pidfds.items() if pidfd in readable]
+
+    def close(self):
+        for _, pidfd in self.pidfds.values():
+            close_pidfd(pidfd)
+
+        self.pidfds = {}
+
+
+def close_pidfd(pidfd: int):
+    try:
+        os.close(pidfd)
+    except OSError:
+        pass
@@ -5,15 +5,19 @@
 import copy
 import functools
 import os
+import socket
+import struct
 import subprocess
+import sys
 import time
 import traceback
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
 import psutil
 
 import configs
 import logger
+import process_watch
 
 
 class ProcessScanner:
@@ -30,29 +34,45 @@ class ProcessScanner:
                                               'Steam': {'running': False, 'pid': None, 'path': None},
                                               'Discord': {'running': False, 'pid': None}}
         self.p_data_default: Dict[str, dict] = copy.deepcopy(self.process_data)
-        self.p_data_last: Dict[str, dict] = copy.deepcopy(self.process_data)
+        self.snapshot: ProcessSnapshot = ProcessSnapshot(ProgramSnapshot(), ProgramSnapshot(), ProgramSnapshot())  # the last scan's results
+        self.identities: Dict[str, Tuple[int, tuple]] = {}  # program: (PID, what process_identity() gave when its info was gotten), for POSIX
+        self.next_enumeration_time: float = 0.0
+        self.enumerations: int = 0
+        self.process_watcher: process_watch.ProcessWatcher = process_watch.ProcessWatcher(log)
+        # cheap ways to find a program without enumerating processes, tried in order. each returns a PID (or None), which then gets checked to have the right name
+        self.probes: Dict[str, List[Callable[['ProcessScanner'], Optional[int]]]] = {'Steam': [probe_steam_pid_file], 'Discord': [probe_discord_ipc]}
+        self.probe_hits: int = 0
+        self.discord_ipc_path: Optional[str] = None  # for the RPC client, if a probe found it
+        self.discord_ipc_misses: Set[Tuple[str, int]] = set()  # (path, inode) of sockets that weren't Discord's or didn't say who they were, so they aren't tried every scan
 
     def __repr__(self):
-        return f"processes.ProcessScanner (all cached={self.all_pids_cached}, tf2={self.process_data['TF2']}, discord={self.process_data['Discord']}, steam={self.process_data['Steam']})"
+        return f"processes.ProcessScanner (all cached={self.all_pids_cached}, enumerations={self.enumerations}, probe hits={self.probe_hits}, tf2={self.process_data['TF2']}, discord={self.process_data['Discord']}, steam={self.process_data['Steam']})"
 
     # scan all running processes to look for TF2, Steam, and Discord
-    def scan(self) -> Dict[str, Dict[str, Union[bool, str, int, None]]]:
+    # process_data is just the working state, what's returned is an immutable snapshot of it (the same object as last time if nothing changed)
+    def scan(self) -> 'ProcessSnapshot':
         # TODO: use sys.platform everywhere instead of os.name (if possible)
         if os.name == 'nt':
             self.scan_windows()
         else:
             self.scan_posix()
 
-        if self.process_data == self.p_data_last:
+        snapshot: ProcessSnapshot = ProcessSnapshot(*(ProgramSnapshot(**self.process_data[program]) for program in self.executables['order']))
+
+        if snapshot == self.snapshot:
             self.log.debug(f"Process scanning got same results (used tasklist: {self.used_tasklist})")
-        else:
-            self.log.debug(f"Process scanning (used tasklist: {self.used_tasklist}) results: {self.process_data}")
+            return self.snapshot
+
+        started: List[str]
+        stopped: List[str]
+        started, stopped = snapshot.diff(self.snapshot)
+        self.log.debug(f"Process scanning (used tasklist: {self.used_tasklist}) results: {snapshot} (started: {started}, stopped: {stopped})")
 
-            if not self.process_data['TF2']['running']:
-                self.tf2_without_condebug = False
+        if not snapshot.tf2.running:
+            self.tf2_without_condebug = False
 
-        self.p_data_last = copy.deepcopy(self.process_data)
-        return self.process_data
+        self.snapshot = snapshot
+        return self.snapshot
 
     # basically psutil.process_iter(attrs=['pid', 'cmdline', 'create_time']) but WAY faster (and also highly specialized)
     def scan_windows(self):
@@ -75,7 +95,78 @@ class ProcessScanner:
             self.get_all_extended_info()
 
     # for Linux and MacOS (I think)
+    # like scan_windows, PIDs that are already known aren't searched for again, they're just checked to still be the same process (by pidfd, or one small read each on Linux).
+    # the rest of the processes are only enumerated every enumeration_interval seconds while something's missing, since it's usually just Discord or TF2 not being open
     def scan_posix(self):
+        self.validate_cached_pids()
+        self.run_probes()
+
+        if None in (self.process_data[program]['pid'] for program in self.executables['order']) and time.perf_counter() >= self.next_enumeration_time:
+            self.next_enumeration_time = time.perf_counter() + enumeration_interval
+            self.enumerations += 1
+
+            if sys.platform.startswith('linux'):
+                self.find_pids_procfs()
+            else:
+                self.find_pids_psutil()
+
+        for program in self.executables['order']:
+            pid: Optional[int] = self.process_data[program]['pid']
+
+            if pid is not None and program not in self.identities:
+                self.get_extended_info(program)
+
+                if self.process_data[program]['running']:
+                    identity: Optional[tuple] = process_identity(pid)
+
+                    if identity:
+                        self.identities[program] = (pid, identity)
+
+        self.process_watcher.watch({program: pid for program, (pid, _) in self.identities.items()})
+
+    # forget any cached PIDs that have exited or been reused
+    def validate_cached_pids(self):
+        exited: List[str] = self.process_watcher.exited()
+
+        for program in self.executables['order']:
+            pid: Optional[int] = self.process_data[program]['pid']
+
+            if pid is None:
+                continue
+            elif program not in exited:
+                if self.process_watcher.watching(program, pid):
+                    continue  # still running, and nothing needs to be read to know that
+                elif program in self.identities and self.identities[program] == (pid, process_identity(pid)):
+                    continue
+
+            if program in self.identities:
+                self.log.debug(f"Cached {program} PID {pid} is no longer running")
+
+            self.identities.pop(program, None)
+            self.process_data[program] = self.p_data_default[program].copy()
+
+            if program == 'Discord':
+                self.discord_ipc_path = None
+
+    # only for programs that haven't been found yet
+    def run_probes(self):
+        for program, probes in self.probes.items():
+            if self.process_data[program]['pid'] is not None:
+                continue
+
+            expected_name: str = self.executables['posix'][self.executables['order'].index(program)]
+
+            for probe in probes:
+                pid: Optional[int] = probe(self)
+                identity: Optional[tuple] = process_identity(pid) if pid is not None else None
+
+                if identity and identity[0] == expected_name:
+                    self.log.debug(f"Found {program} (PID {pid}) with {probe.__name__}")
+                    self.process_data[program]['pid'] = pid
+                    self.probe_hits += 1
+                    break
+
+    def find_pids_psutil(self):
         for proc in psutil.process_iter():
             try:
                 details = proc.as_dict(attrs=['pid', 'name', 'cwd'])
@@ -88,25 +179,38 @@ class ProcessScanner:
             except psutil.NoSuchProcess:
                 pass
 
-        self.get_all_extended_info()
+    # same result as find_pids_psutil, but only reads each process's name instead of having psutil get (and fail to get) its cwd as well. the rest of the info is then only
+    # gotten for the processes that matched, by get_all_extended_info()
+    def find_pids_procfs(self):
+        missing: Dict[str, str] = {name: program for name, program in zip(self.executables['posix'], self.executables['order']) if self.process_data[program]['pid'] is None}
+
+        if not missing:
+            return
+
+        try:
+            found_pids: Dict[str, Set[int]] = procfs_pids(set(missing))
+        except OSError as error:
+            self.log.error(f"Couldn't scan {procfs_root}, falling back to psutil: {error}")
+            self.find_pids_psutil()
+            return
+
+        for name, pids in found_pids.items():
+            self.process_data[missing[name]]['pid'] = min(pids)  # psutil goes in PID order, so it would've found the lowest first
 
     # get only the needed info (exe path and process start time) for each, and then apply it to self.p_data
     def get_all_extended_info(self):
-        tf2_data: Dict[str, Union[str, bool, int, None]] = self.get_process_info('TF2', ('path', 'time'), True)
-        steam_data: Dict[str, Union[str, bool, int, None]] = self.get_process_info('Steam', ('path', 'cwd'))
-        discord_data: Dict[str, Union[str, bool, int, None]] = self.get_process_info('Discord', ())
-
-        # ugly
-        self.process_data['TF2']['running'], self.process_data['TF2']['path'], self.process_data['TF2']['time'] = tf2_data['running'], tf2_data['path'], tf2_data['time']
-        self.process_data['Steam']['running'], self.process_data['Steam']['path'] = steam_data['running'], steam_data['path']
-        self.process_data['Discord']['running'] = discord_data['running']
-
-        if not self.process_data['TF2']['running']:
-            self.process_data['TF2'] = copy.deepcopy(self.p_data_default['TF2'])
-        if not self.process_data['Steam']['running']:
-            self.process_data['Steam'] = copy.deepcopy(self.p_data_default['Steam'])
-        if not self.process_data['Discord']['running']:
-            self.process_data['Discord'] = copy.deepcopy(self.p_data_default['Discord'])
+        for program in self.executables['order']:
+            self.get_extended_info(program)
+
+    def get_extended_info(self, program: str):
+        program_data: Dict[str, Union[str, bool, int, None]] = self.get_process_info(program, extended_info[program], program == 'TF2')
+
+        if program_data['running']:
+            for key in self.process_data[program]:
+                if key != 'pid':
+                    self.process_data[program][key] = program_data[key]
+        else:
+            self.process_data[program] = self.p_data_default[program].copy()
 
     # a mess of logic that gives process info from a process name (not exe name) or PID
     def get_process_info(self, process: Union[str, int], return_data: Tuple[str, ...], validate_condebug: bool = False) -> Dict[str, Union[str, bool, int, None]]:
@@ -124,7 +228,7 @@ class ProcessScanner:
 
         try:
             process: psutil.Process = psutil.Process(pid=pid)
-            running: bool = [name for name in self.executables[os.name] if name in process.name().lower()] != []
+            running: bool = [name for name in self.executables[os.name] if name.lower() in process.name().lower()] != []  # Linux Discord is capitalized
             p_info['running'] = running
 
             if not running:
@@ -210,7 +314,7 @@ class ProcessScanner:
         if self.process_data['TF2']['running']:
             if not self.hl2_exe_is_tf2(self.parsed_tasklist['tf_win64.exe']):
                 self.log.debug(f"Found running non-TF2 tf_win64.exe with PID {self.parsed_tasklist['tf.exe']}")
-                self.process_data['TF2'] = copy.deepcopy(self.p_data_default['TF2'])
+                self.process_data['TF2'] = self.p_data_default['TF2'].copy()
                 del self.parsed_tasklist['tf.exe']
 
     # makes sure a process's path is a TF2 install, not some other game
@@ -220,6 +324,211 @@ class ProcessScanner:
         return configs.is_tf2_install(self.log, os.path.join(hl2_exe_dir, 'tf_win64.exe'))
 
 
+# the PIDs of running processes with these names (as in /proc/<pid>/comm, so 15 characters at most), in one pass over /proc that only reads one small file per process
+def procfs_pids(names: Set[str]) -> Dict[str, Set[int]]:
+    wanted: Dict[bytes, str] = {f'{name}\n'.encode('UTF8'): name for name in names}
+    found: Dict[str, Set[int]] = {}
+
+    with os.scandir(procfs_root) as procfs_entries:
+        for procfs_entry in procfs_entries:
+            if not procfs_entry.name.isdigit():
+                continue
+
+            try:
+                comm_fd: int = os.open(f'{procfs_entry.path}/comm', os.O_RDONLY)
+            except OSError:
+                continue  # exited since the scandir
+
+            try:
+                comm: bytes = os.read(comm_fd, 64)
+            except OSError:
+                continue
+            finally:
+                os.close(comm_fd)
+
+            if comm in wanted:
+                found.setdefault(wanted[comm], set()).add(int(procfs_entry.name))
+
+    return found
+
+
+# one program's part of a scan. immutable (along with ProcessSnapshot), so that scan results can be kept around and compared without copying them
+class ProgramSnapshot:
+    __slots__ = ('running', 'pid', 'path', 'time')
+
+    def __init__(self, running: bool = False, pid: Optional[int] = None, path: Optional[str] = None, time: Optional[int] = None):
+        object.__setattr__(self, 'running', running)
+        object.__setattr__(self, 'pid', pid)
+        object.__setattr__(self, 'path', path)  # TF2's and Steam's install folders
+        object.__setattr__(self, 'time', time)  # when TF2 started
+
+    def __repr__(self) -> str:
+        return f"processes.ProgramSnapshot (running={self.running}, pid={self.pid}, path={self.path}, time={self.time})"
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"Can't set {name}, {self} is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"Can't delete {name}, {self} is immutable")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ProgramSnapshot) and (self.running, self.pid, self.path, self.time) == (other.running, other.pid, other.path, other.time)
+
+    def __hash__(self) -> int:
+        return hash((self.running, self.pid, self.path, self.time))
+
+    # for code that still treats scan results as dicts (custom.py, maybe)
+    def __getitem__(self, key: str) -> Union[bool, str, int, None]:
+        if key not in ProgramSnapshot.__slots__:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+
+# what ProcessScanner.scan() found, as attributes for each program (tf2, steam, and discord)
+class ProcessSnapshot:
+    __slots__ = ('tf2', 'steam', 'discord')
+
+    def __init__(self, tf2: ProgramSnapshot, steam: ProgramSnapshot, discord: ProgramSnapshot):
+        object.__setattr__(self, 'tf2', tf2)
+        object.__setattr__(self, 'steam', steam)
+        object.__setattr__(self, 'discord', discord)
+
+    def __repr__(self) -> str:
+        return f"processes.ProcessSnapshot (tf2={self.tf2}, steam={self.steam}, discord={self.discord})"
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"Can't set {name}, {self} is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"Can't delete {name}, {self} is immutable")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ProcessSnapshot) and (self.tf2, self.steam, self.discord) == (other.tf2, other.steam, other.discord)
+
+    def __hash__(self) -> int:
+        return hash((self.tf2, self.steam, self.discord))
+
+    # by program name, like the dicts scanning used to return
+    def __getitem__(self, program: str) -> ProgramSnapshot:
+        if program not in program_attributes:
+            raise KeyError(program)
+
+        return getattr(self, program_attributes[program])
+
+    # which programs started and stopped since a previous snapshot (or since nothing, if None). one restarting in between (a new PID) counts as both
+    def diff(self, previous: Optional['ProcessSnapshot']) -> Tuple[List[str], List[str]]:
+        started: List[str] = []
+        stopped: List[str] = []
+
+        for program, attribute in program_attributes.items():
+            now: ProgramSnapshot = getattr(self, attribute)
+            before: ProgramSnapshot = getattr(previous, attribute) if previous else ProgramSnapshot()
+            restarted: bool = now.running and before.running and now.pid != before.pid
+
+            if before.running and (not now.running or restarted):
+                stopped.append(program)
+            if now.running and (not before.running or restarted):
+                started.append(program)
+
+        return started, stopped
+
+
+# what a running process is, as far as telling whether its PID has been reused goes: its name and start time
+def process_identity(pid: int) -> Optional[tuple]:
+    if not sys.platform.startswith('linux'):
+        try:
+            process: psutil.Process = psutil.Process(pid)
+            return process.name(), process.create_time()
+        except psutil.Error:
+            return None
+
+    # /proc/<pid>/stat has both, and is a lot cheaper to read than psutil making a Process
+    try:
+        stat_fd: int = os.open(f'{procfs_root}/{pid}/stat', os.O_RDONLY)
+    except OSError:
+        return None
+
+    try:
+        stat: bytes = os.read(stat_fd, 1024)
+    except OSError:
+        return None
+    finally:
+        os.close(stat_fd)
+
+    name_end: int = stat.rfind(b')')  # the name can have parentheses and spaces in it
+    stat_fields: List[bytes] = stat[name_end + 2:].split()
+
+    if name_end == -1 or len(stat_fields) < 20:
+        return None
+
+    return stat[stat.find(b'(') + 1:name_end].decode('UTF8', errors='replace'), int(stat_fields[19])  # field 22, start time in clock ticks after boot
+
+
+# Steam writes its PID to a file when it starts (but doesn't delete it when it closes)
+def probe_steam_pid_file(self: ProcessScanner) -> Optional[int]:
+    for pid_file_path in steam_pid_files:
+        try:
+            with open(os.path.expanduser(pid_file_path), 'r') as pid_file:
+                pid: int = int(pid_file.read().strip())
+        except (OSError, ValueError):
+            continue
+
+        if process_identity(pid):
+            return pid
+
+    return None
+
+
+# Discord has a socket open for RPC clients, and whatever's accepting connections on it is Discord. on Linux, the socket can also say which process that is
+# the socket's path is only kept once that process has been checked to be Discord, and sockets that didn't work out are only tried again once they've been replaced
+def probe_discord_ipc(self: ProcessScanner) -> Optional[int]:
+    expected_name: str = self.executables['posix'][self.executables['order'].index('Discord')]
+
+    for ipc_path in discord_ipc_paths():
+        try:
+            ipc_socket_key: Tuple[str, int] = (ipc_path, os.stat(ipc_path).st_ino)
+        except OSError:
+            continue
+
+        if ipc_socket_key in self.discord_ipc_misses:
+            continue
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as ipc_socket:
+                ipc_socket.settimeout(0.2)
+                ipc_socket.connect(ipc_path)
+                peer_credentials: Optional[bytes] = ipc_socket.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')) if hasattr(socket, 'SO_PEERCRED') else None
+        except OSError:
+            self.discord_ipc_misses.add(ipc_socket_key)  # left over from Discord crashing
+            continue
+
+        pid: Optional[int] = struct.unpack('3i', peer_credentials)[0] if peer_credentials else None  # (PID, UID, GID)
+        identity: Optional[tuple] = process_identity(pid) if pid is not None else None
+
+        if identity and identity[0] == expected_name:
+            self.discord_ipc_path = ipc_path
+            return pid
+
+        self.log.debug(f"{ipc_path} isn't Discord's (PID {pid}, {identity[0] if identity else 'unknown'}), not trying it again")
+        self.discord_ipc_misses.add(ipc_socket_key)
+
+    return None
+
+
+# same places discoIPC looks (it only tries the first), plus where the Flatpak and Snap versions put it
+def discord_ipc_paths() -> List[str]:
+    runtime_dir: str = (os.getenv('XDG_RUNTIME_DIR') or os.getenv('TMPDIR') or os.getenv('TMP') or os.getenv('TEMP') or '/tmp').rstrip('/')
+    return [os.path.join(runtime_dir, subfolder, f'discord-ipc-{ipc_id}') for subfolder in ('', 'app/com.discordapp.Discord', 'snap.discord') for ipc_id in range(10)]
+
+
+program_attributes: Dict[str, str] = {'TF2': 'tf2', 'Steam': 'steam', 'Discord': 'discord'}
+procfs_root: str = '/proc'
+enumeration_interval: float = 5.0  # seconds between looking for processes that aren't running, on POSIX
+extended_info: Dict[str, Tuple[str, ...]] = {'TF2': ('path', 'time'), 'Steam': ('path', 'cwd'), 'Discord': ()}
+steam_pid_files: Tuple[str, ...] = ('~/.steam/steam.pid', '~/.var/app/com.valvesoftware.Steam/.steam/steam.pid')  # normal and Flatpak
+
+
 if __name__ == '__main__':
     import pprint
 
@@ -0,0 +1,352 @@
+# Copyright (C) 2018-2022 Kataiser & https://github.com/Kataiser/tf2-rich-presence/contributors
+# https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
+
+import argparse
+import bisect
+import contextlib
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import configs
+import console_log
+import file_watch
+import game_state
+import logger
+import main as tf2rp_main
+import process_watch
+import processes
+import server
+import settings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Replays a recorded console.log into the app (headlessly, with TF2/Steam/Discord faked) and measures detection latency")
+    arg_parser.add_argument('console_log', help="The console.log to replay. Lines with con_timestamp prefixes are replayed at those times")
+    arg_parser.add_argument('--speed', type=float, default=1.0, help="Replay speed multiplier, or 0 to skip through idle time with a virtual clock (default 1)")
+    arg_parser.add_argument('--line-interval', type=float, default=0.05, help="Seconds between lines that don't have timestamps (default 0.05)")
+    arg_parser.add_argument('--username', default='Replay Player', help="The Steam username to pretend to have")
+    arg_parser.add_argument('--json', metavar='PATH', help="Also save the report as JSON")
+    args = arg_parser.parse_args()
+
+    os.makedirs('logs', exist_ok=True)
+    log = logger.Log(os.path.join('logs', 'replay.log'))
+    log.to_stderr = False
+
+    timeline: List[Tuple[float, bytes]] = load_timeline(args.console_log, args.line_interval)
+    print(f"Replaying {len(timeline)} lines ({datetime.timedelta(seconds=round(timeline[-1][0]) if timeline else 0)} of gameplay) at "
+          f"{f'{args.speed}x speed' if args.speed else 'virtual speed'}")
+    report: Dict[str, Union[int, float, None]] = replay(log, timeline, args.speed, args.username)
+
+    for report_key in report:
+        print(f"  {report_key}: {report[report_key]}")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=4)
+
+
+# runs the app's own main loop against a temp console.log that the timeline gets appended to, returns latency stats (in virtual seconds)
+def replay(log: logger.Log, timeline: List[Tuple[float, bytes]], speed: float, username: str = 'Replay Player') -> Dict[str, Union[int, float, None]]:
+    clock: VirtualClock = VirtualClock(speed)
+    real_start_time: float = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as temp_dir, patched_environment(clock, username):
+        tf2_path: str = os.path.join(temp_dir, 'Team Fortress 2')
+        console_log_path: str = os.path.join(tf2_path, 'tf', 'console.log')
+        os.makedirs(os.path.dirname(console_log_path))
+        open(console_log_path, 'wb').close()
+
+        headless_gui: HeadlessGUI = HeadlessGUI()
+        app: tf2rp_main.TF2RichPresense = tf2rp_main.TF2RichPresense(log, set_process_priority=False, main_gui=headless_gui)
+        stub_rpc: StubRPC = StubRPC(app, clock)
+        app.process_scanner = ReplayProcessScanner(log, tf2_path, int(clock.time()) - tf2_running_before_replay)
+        app.console_log_watcher = ReplayWatcher(clock, timeline, console_log_path, headless_gui)
+        app.console_log_checkpoint = console_log.ConsoleLogCheckpoint(log, os.path.join(temp_dir, 'console_log_checkpoint.json'))  # not the user's
+        app.rpc_client = stub_rpc
+        app.client_connected = True
+        app.has_checked_class_configs = True  # don't write class configs into the temp folder
+        app.did_init_operations = True  # update check, language prompt, etc.
+        app.game_state.get_match_data = lambda address, modes, usernames=None: server.unknown_data(app.loc, modes)  # no real servers to query
+
+        try:
+            app.run()
+        except SystemExit:
+            pass
+
+        write_times: List[float] = app.console_log_watcher.write_times
+        loop_iterations: int = app.loop_iteration
+
+    latencies, coalesced = match_transitions(log, timeline, write_times, stub_rpc.sent, username)
+    latencies.sort()
+    return {'transitions': len(latencies) + coalesced,
+            'detected': len(latencies),
+            'coalesced': coalesced,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p90': percentile(latencies, 0.9),
+            'latency_p99': percentile(latencies, 0.99),
+            'latency_max': latencies[-1] if latencies else None,
+            'rpc_updates': len(stub_rpc.sent),
+            'loop_iterations': loop_iterations,
+            'virtual_seconds': round(clock.perf_counter(), 1),
+            'real_seconds': round(time.perf_counter() - real_start_time, 1)}
+
+
+# lines and when they should be written (in seconds since the start), using TF2's con_timestamp prefixes if there are any
+def load_timeline(path: str, line_interval: float) -> List[Tuple[float, bytes]]:
+    timeline: List[Tuple[float, bytes]] = []
+    first_timestamp: Optional[datetime.datetime] = None
+    last_time: float = 0.0
+
+    with open(path, 'rb') as recorded_log:
+        for line_index, line in enumerate(recorded_log):
+            timestamp_match: Optional[re.Match] = timestamp_regex.match(line)
+
+            if timestamp_match:
+                timestamp: datetime.datetime = datetime.datetime.strptime(timestamp_match.group(1).decode(), '%m/%d/%Y - %H:%M:%S')
+                first_timestamp = first_timestamp if first_timestamp else timestamp
+                last_time = max((timestamp - first_timestamp).total_seconds(), last_time)
+                timeline.append((last_time, line[timestamp_match.end():]))
+            else:
+                timeline.append((last_time if first_timestamp else line_index * line_interval, line))
+
+    return timeline
+
+
+# what a transition is: a line that changes what should be shown (in menus, map, class, queued state), compared with what the app sent over RPC and when
+# transitions that got replaced before ever being sent (two in one scan) are counted as coalesced, rather than as having infinite latency
+def match_transitions(log: logger.Log, timeline: List[Tuple[float, bytes]], write_times: List[float], sent: List[Tuple[float, tuple]], username: str) -> Tuple[List[float], int]:
+    reference_parser: console_log.ConsoleLogParser = console_log.ConsoleLogParser(log, 'console.log', {username})
+    transitions: List[Tuple[float, tuple]] = []
+    shown_state: tuple = displayed_state(reference_parser.in_menus, reference_parser.tf2_map, reference_parser.tf2_class, reference_parser.queued_state)
+
+    for (_, line_bytes), write_time in zip(timeline, write_times):
+        for line in reference_parser.marker_lines(line_bytes):
+            reference_parser.parse_line(line)
+
+        line_state: tuple = displayed_state(reference_parser.in_menus, reference_parser.tf2_map, reference_parser.tf2_class, reference_parser.queued_state)
+
+        if line_state != shown_state:
+            transitions.append((write_time, line_state))
+            shown_state = line_state
+
+    latencies: List[float] = []
+    coalesced: int = 0
+    sent_times: List[float] = [sent_time for sent_time, _ in sent]
+    last_transition_indices: Dict[tuple, int] = {transition_state: transition_index for transition_index, (_, transition_state) in enumerate(transitions)}
+
+    for transition_index, (transition_time, transition_state) in enumerate(transitions):
+        latency: Optional[float] = None
+
+        for sent_time, sent_state in sent[bisect.bisect_left(sent_times, transition_time):]:
+            if sent_state == transition_state:
+                latency = sent_time - transition_time
+                break
+            elif last_transition_indices.get(sent_state, -1) > transition_index:
+                break  # already showing something that happened later
+
+        if latency is None:
+            coalesced += 1
+        else:
+            latencies.append(round(latency, 3))
+
+    return latencies, coalesced
+
+
+# the part of the state that the user actually sees
+def displayed_state(in_menus: bool, tf2_map: str, tf2_class: str, queued_state: str) -> tuple:
+    return (True, '', '', queued_state) if in_menus else (False, tf2_map, tf2_class, queued_state)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)] if sorted_values else None
+
+
+# swaps in the virtual clock and a Steam username, and turns off trimming/cleaning (since the file is being appended to from the same thread), then undoes it all
+@contextlib.contextmanager
+def patched_environment(clock: 'VirtualClock', username: str) -> Iterator[None]:
+    settings_before: dict = settings.access_registry()
+    get_steam_username_before = configs.get_steam_username
+    argv_before: List[str] = sys.argv
+    settings.change('trim_console_log', False)
+    configs.get_steam_username = lambda: username
+    sys.argv = sys.argv[:1]  # the app parses its own command line (--launch), which isn't this one
+
+    for module in (tf2rp_main, game_state, server):
+        module.time = clock
+
+    try:
+        yield
+    finally:
+        for module in (tf2rp_main, game_state, server):
+            module.time = time
+
+        configs.get_steam_username = get_steam_username_before
+        sys.argv = argv_before
+        settings.access_registry(save=settings_before)
+
+
+# stands in for the time module. at 0 speed, sleeping is instant, so idle time costs nothing (but time spent actually doing things still counts)
+class VirtualClock:
+    def __init__(self, speed: float):
+        self.speed: float = speed
+        self.start_time: float = time.time()
+        self.real_start: float = time.perf_counter()
+        self.skipped: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"replay.VirtualClock (speed={self.speed}, elapsed={round(self.perf_counter(), 3)})"
+
+    def __getattr__(self, name: str):
+        return getattr(time, name)  # strftime, gmtime, etc.
+
+    def time(self) -> float:
+        return self.start_time + self.perf_counter()
+
+    def perf_counter(self) -> float:
+        return (time.perf_counter() - self.real_start) * (self.speed if self.speed else 1.0) + self.skipped
+
+    def sleep(self, seconds: float):
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        else:
+            self.skipped += seconds
+
+
+# stands in for file_watch.FileWatcher, and is what actually writes the timeline: the main loop's waiting is when TF2 would be writing anyway
+class ReplayWatcher:
+    def __init__(self, clock: VirtualClock, timeline: List[Tuple[float, bytes]], console_log_path: str, headless_gui: 'HeadlessGUI'):
+        self.clock: VirtualClock = clock
+        self.timeline: List[Tuple[float, bytes]] = timeline
+        self.console_log_path: str = console_log_path
+        self.headless_gui: HeadlessGUI = headless_gui
+        self.write_times: List[float] = []
+        self.changes: int = 0
+
+    def __repr__(self) -> str:
+        return f"replay.ReplayWatcher ({len(self.write_times)}/{len(self.timeline)} lines written)"
+
+    def watch(self, path: Optional[str]):
+        pass
+
+    def wait(self, timeout: float) -> bool:
+        deadline: float = self.clock.perf_counter() + timeout
+
+        if len(self.write_times) == len(self.timeline):
+            self.clock.sleep(timeout)
+
+            # give the app a few loops to catch up with the end
+            if self.clock.perf_counter() > (self.timeline[-1][0] if self.timeline else 0) + replay_tail_time:
+                self.headless_gui.alive = False
+
+            return False
+
+        self.clock.sleep(max(min(self.timeline[len(self.write_times)][0], deadline) - self.clock.perf_counter(), 0))
+
+        if not self.write_due():
+            return False
+
+        # like FileWatcher's debouncing, keep going while more is about to be written (for a bit)
+        settle_deadline: float = self.clock.perf_counter() + file_watch.debounce_max_time
+        while len(self.write_times) < len(self.timeline) and self.timeline[len(self.write_times)][0] - self.clock.perf_counter() <= file_watch.debounce_time \
+                and self.clock.perf_counter() < settle_deadline:
+            self.clock.sleep(max(self.timeline[len(self.write_times)][0] - self.clock.perf_counter(), 0))
+            self.write_due()
+
+        self.changes += 1
+        return True
+
+    # append every line that's due, returns whether there were any
+    def write_due(self) -> bool:
+        now: float = self.clock.perf_counter()
+        lines: List[bytes] = []
+
+        while len(self.write_times) + len(lines) < len(self.timeline) and self.timeline[len(self.write_times) + len(lines)][0] <= now:
+            lines.append(self.timeline[len(self.write_times) + len(lines)][1])
+
+        if lines:
+            with open(self.console_log_path, 'ab') as console_log_file:
+                console_log_file.write(b''.join(lines))
+
+            self.write_times.extend([now] * len(lines))
+
+        return bool(lines)
+
+
+# stands in for processes.ProcessScanner, with TF2, Steam, and Discord always running
+class ReplayProcessScanner:
+    def __init__(self, log: logger.Log, tf2_path: str, tf2_start_time: int):
+        self.tf2_without_condebug: bool = False
+        self.process_watcher: process_watch.ProcessWatcher = process_watch.ProcessWatcher(log)  # never watches anything, since nothing exits
+        self.discord_ipc_path: Optional[str] = None
+        self.snapshot: processes.ProcessSnapshot = processes.ProcessSnapshot(processes.ProgramSnapshot(True, 1, tf2_path, tf2_start_time),
+                                                                            processes.ProgramSnapshot(True, 2, os.path.dirname(tf2_path)), processes.ProgramSnapshot(True, 3))
+
+    def __repr__(self) -> str:
+        return f"replay.ReplayProcessScanner ({self.snapshot.tf2.path})"
+
+    def scan(self) -> processes.ProcessSnapshot:
+        return self.snapshot
+
+
+# stands in for discoIPC.ipc.DiscordIPC, and records what would've been shown and when
+class StubRPC:
+    def __init__(self, app: tf2rp_main.TF2RichPresense, clock: VirtualClock):
+        self.app: tf2rp_main.TF2RichPresense = app
+        self.clock: VirtualClock = clock
+        self.sent: List[Tuple[float, tuple]] = []
+        self.client_id: str = 'replay'
+        self.connected: bool = True
+        self.ipc_path: str = ''
+        self.pid: int = os.getpid()
+        self.platform: str = 'replay'
+        self.socket = None
+
+    def __repr__(self) -> str:
+        return f"replay.StubRPC ({len(self.sent)} sent)"
+
+    def update_activity(self, activity: dict):
+        current_game_state: game_state.GameState = self.app.game_state
+        tf2_class: str = '' if current_game_state.tf2_class == "unselected" else current_game_state.tf2_class  # see GameState.set_bulk()
+        self.sent.append((self.clock.perf_counter(), displayed_state(current_game_state.in_menus, current_game_state.tf2_map, tf2_class, current_game_state.queued_state)))
+
+    def disconnect(self):
+        self.connected = False
+
+
+# stands in for gui.GUI, with nowhere to draw anything
+class HeadlessGUI:
+    def __init__(self):
+        self.alive: bool = True
+        self.clean_console_log: bool = False
+        self.console_log_path: str = ''
+        self.tf2_launch_cmd: Optional[Tuple[str, str]] = None
+        self.launched_tf2_with_button: bool = False
+        self.bottom_text_queue_state: str = ""
+        self.main_loop_body_times: List[float] = []
+        self.master: HeadlessGUI = self
+        self.update_checker: HeadlessGUI = self
+
+    def __repr__(self) -> str:
+        return f"replay.HeadlessGUI (alive={self.alive})"
+
+    # everything else the GUI does is drawing something
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: None
+
+    def update_check_ready(self) -> bool:
+        return False
+
+
+timestamp_regex: re.Pattern = re.compile(rb'(\d\d/\d\d/\d{4} - \d\d:\d\d:\d\d): ')
+tf2_running_before_replay: int = 60  # so that console.log doesn't look like it's from TF2 starting up
+replay_tail_time: float = 10.0
+
+
+if __name__ == '__main__':
+    main()
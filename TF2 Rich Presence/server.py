@@ -2,128 +2,184 @@
 # https://github.com/Kataiser/tf2-rich-presence/blob/master/LICENSE
 # cython: language_level=3
 
+import asyncio
+import collections
+import concurrent.futures
+import errno
 import functools
+import io
+import os
 import re
 import socket
+import threading
 import time
 import traceback
-from typing import Dict, List, Optional, Pattern, Set
+from typing import Dict, List, Optional, Pattern, Set, Tuple
 
 import a2s
+import ujson
+from a2s.a2s_fragment import A2SFragment, decode_fragment
+from a2s.byteio import ByteReader
+from a2s.info import InfoProtocol
+from a2s.players import PlayersProtocol
 
 import localization
+import logger
 import settings
 
 
 # get server name, player count, and/or user score (kills) from the game server
+# the query itself happens in the background (see QueryEngine), so this returns the latest data it has and picks up new results on later calls
 def get_match_data(self, address: str, modes: List[str], usernames: Optional[Set[str]] = None, allow_network_errors: bool = True) -> Dict[str, str]:
     rate_limit: int = settings.get('server_rate_limit')
-    time_since_last: float = time.time() - self.last_server_request_time
 
-    if time_since_last < rate_limit and self.last_server_request_address == address:
-        self.log.debug(f"Skipping getting server data ({round(time_since_last, 1)} < {rate_limit}), persisting {self.last_server_request_data}")
-        return self.last_server_request_data
-    else:
-        self.last_server_request_time = time.time()
-        self.last_server_request_address = address
-        self.log.debug(f"Getting match data from server ({address}) with mode(s) {modes}")
+    if self.pending_server_query:
+        query_address: str
+        query_modes: List[str]
+        query: concurrent.futures.Future
+        query_address, query_modes, query = self.pending_server_query
+
+        if query_address != address:
+            self.log.debug(f"Ignoring server query for {query_address}")  # left that server, let it finish on its own
+            self.pending_server_query = None
+        elif query.done():
+            self.pending_server_query = None
+            return read_query_result(self, address, query, query_modes, usernames, rate_limit, allow_network_errors)
+        else:
+            self.log.debug(f"Still waiting on server data, persisting {self.last_server_request_data}")
+            return self.last_server_request_data
 
-        if ':' not in address or ' ' in address:
-            if address:
-                self.log.error(f"Server address ({address}) is invalid")
-            else:
-                self.log.debug(f"Server address is blank, assuming hosting")
+    if ':' not in address or ' ' in address:
+        if address:
+            self.log.error(f"Server address ({address}) is invalid")
+        else:
+            self.log.debug(f"Server address is blank, assuming hosting")
 
-            self.last_server_request_data = unknown_data(self.loc, modes)
-            self.last_server_request_time -= rate_limit  # ignores rate limit
-            return self.last_server_request_data
+        self.last_server_request_data = unknown_data(self.loc, modes)
+        self.last_server_request_address = address
+        return self.last_server_request_data
 
-        if address.startswith('169.254.'):
-            self.log.error(f"Address is link-local, will probably time out ({address})", reportable=False)
+    new_address: bool = self.last_server_request_address != address
+    self.last_server_request_address = address
 
-        ip: str
-        ip_socket: str
-        ip, ip_socket = address.split(':')
-        server_data: Dict[str, str] = {}
-        need_server_info: bool = 'Player count' in modes or 'Server name' in modes
+    if new_address or len(self.last_server_request_data) != len(modes):
+        # the scheduler might not let this server be queried yet (if it's been failing), so don't show another's data. what it was like last time is better than nothing though
+        self.last_server_request_data = cached_data(self.loc, modes, self.server_cache.get(address))
 
-        try:
-            if need_server_info:
-                server_info = a2s.info((ip, int(ip_socket)), timeout=settings.get('request_timeout'))
-                # there's a decent amount of extra data here that isn't used but could be (bot count, tags, etc.)
-            if 'Kills' in modes:
-                players_info = a2s.players((ip, int(ip_socket)), timeout=settings.get('request_timeout'))
-        except socket.timeout:
-            if not allow_network_errors:
-                raise
-
-            if len(self.last_server_request_data) == len(modes):
-                self.log.debug("Timed out getting server info, persisting previous data")
-            else:
-                self.log.debug("Timed out getting server info")
-                self.last_server_request_data = unknown_data(self.loc, modes)
+    if not self.server_schedule.due(address, rate_limit):
+        self.log.debug(f"Skipping getting server data ({self.server_schedule.schedule(address)}), persisting {self.last_server_request_data}")
+        return self.last_server_request_data
 
-            self.last_server_request_time -= rate_limit
-            return self.last_server_request_data
-        except (a2s.BrokenMessageError, a2s.BrokenMessageError, socket.gaierror, ConnectionRefusedError, ConnectionResetError, OSError) as error:
-            if isinstance(error, OSError) and '[WinError 10051]' not in str(error):
-                raise
+    self.server_schedule.started(address, rate_limit)
+    self.log.debug(f"Getting match data from server ({address}) with mode(s) {modes}")
 
-            if not allow_network_errors:
-                raise
+    if address.startswith('169.254.'):
+        self.log.error(f"Address is link-local, will probably time out ({address})", reportable=False)
 
-            self.log.error(f"Couldn't get server info: {traceback.format_exc()}")
-            self.last_server_request_data = unknown_data(self.loc, modes)
-            self.last_server_request_time -= rate_limit
-            return self.last_server_request_data
+    ip: str
+    ip_socket: str
+    ip, ip_socket = address.split(':')
+    need_server_info: bool = 'Player count' in modes or 'Server name' in modes
+    query = self.server_queries.query((ip, int(ip_socket)), need_server_info, 'Kills' in modes, settings.get('request_timeout'))
 
-        if need_server_info:
-            # do some validation, probably not worth doing an extra request each time if only using kills mode
-            if server_info.protocol != 17:
-                self.log.error(f"Server protocol is {server_info.protocol}, not 17")
-            if server_info.game_id != 440:
-                self.log.error(f"Server game ID is {server_info.game_id}, not 440")
-            if server_info.folder != 'tf':
-                self.log.error(f"Server game is {server_info.folder}, not tf")
+    if not allow_network_errors:
+        query.exception()  # just waits
+        return read_query_result(self, address, query, modes, usernames, rate_limit, allow_network_errors)
 
-        if 'Server name' in modes:
-            server_name_formatted: str = cleanup_server_name(server_info.server_name)
-            self.log.debug(f"Got server name: \"{server_name_formatted}\"")
-            server_data['server_name'] = server_name_formatted
+    self.pending_server_query = (address, modes, query)
+    return self.last_server_request_data
 
-        if 'Player count' in modes:
-            if 'valve' in server_info.keywords:
-                max_players: int = 24
-            else:
-                max_players = server_info.max_players
 
-            player_count: str = self.loc.text("Players: {0}/{1}").format(server_info.player_count, max_players)
-            self.log.debug(f"Got player count from server: \"{player_count}\"")
-            server_data['player_count'] = player_count
+# turn a finished query into server data (or handle its error)
+def read_query_result(self, address: str, query: concurrent.futures.Future, modes: List[str], usernames: Optional[Set[str]], rate_limit: int, allow_network_errors: bool) -> Dict[str, str]:
+    self.server_queries.new_result.clear()
+    server_data: Dict[str, str] = {}
+    need_server_info: bool = 'Player count' in modes or 'Server name' in modes
 
-        if 'Kills' in modes:
-            kills: str = ""
+    try:
+        server_info, players_info = query.result()
+        # there's a decent amount of extra data in server_info that isn't used but could be (bot count, tags, etc.)
+    except OSError as error:
+        # a timeout is packet loss (or a slow server), and the connected socket turns ICMP errors (the server being down or unreachable) into exceptions. either way it's
+        # just not answering right now, so treat them the same. the failure is recorded first so that a down server still gets backed off when this raises
+        self.server_schedule.finished(address, 'failed', None, rate_limit)
 
-            if not usernames:
-                self.log.error("Trying to get kills data without usernames")
-                usernames = set()
+        if not allow_network_errors or not server_unreachable(error):
+            raise
 
-            for player in players_info:
-                if player.name in usernames:
-                    kills: str = self.loc.text("Kills: {0}").format(player.score)
-                    self.log.debug(f"Got kill count from server: \"{kills}\"")
-                    break
+        if len(self.last_server_request_data) == len(modes):
+            self.log.debug(f"{describe_network_error(error)}, persisting previous data")
+        else:
+            self.log.debug(describe_network_error(error))
+            self.last_server_request_data = cached_data(self.loc, modes, self.server_cache.get(address))
 
-            if not kills:
-                self.log.debug("User doesn't seem to be in the server, assuming still loading in")
-                kills = self.loc.text("Kills: {0}").format(0)
-                self.last_server_request_time -= rate_limit
+        return self.last_server_request_data
+    except a2s.BrokenMessageError:
+        self.server_schedule.finished(address, 'failed', None, rate_limit)
 
-            server_data['kills'] = kills
+        if not allow_network_errors:
+            raise
 
-        self.last_server_request_data = server_data
+        self.log.error(f"Couldn't get server info: {traceback.format_exc()}")
+        self.last_server_request_data = cached_data(self.loc, modes, self.server_cache.get(address))
         return self.last_server_request_data
 
+    if need_server_info:
+        # do some validation, probably not worth doing an extra request each time if only using kills mode
+        if server_info.protocol != 17:
+            self.log.error(f"Server protocol is {server_info.protocol}, not 17")
+        if server_info.game_id != 440:
+            self.log.error(f"Server game ID is {server_info.game_id}, not 440")
+        if server_info.folder != 'tf':
+            self.log.error(f"Server game is {server_info.folder}, not tf")
+
+        self.server_cache.put(address, cleanup_server_name(server_info.server_name), server_info.max_players, server_info.keywords)
+
+    if 'Server name' in modes:
+        server_name_formatted: str = cleanup_server_name(server_info.server_name)
+        self.log.debug(f"Got server name: \"{server_name_formatted}\"")
+        server_data['server_name'] = server_name_formatted
+
+    if 'Player count' in modes:
+        player_count: str = self.loc.text("Players: {0}/{1}").format(server_info.player_count, displayed_max_players(server_info.max_players, server_info.keywords))
+        self.log.debug(f"Got player count from server: \"{player_count}\"")
+        server_data['player_count'] = player_count
+
+    loaded_in: bool = True
+
+    if 'Kills' in modes:
+        kills: str = ""
+
+        if not usernames:
+            self.log.error("Trying to get kills data without usernames")
+            usernames = set()
+
+        for player in players_info:
+            if player.name in usernames:
+                kills: str = self.loc.text("Kills: {0}").format(player.score)
+                self.log.debug(f"Got kill count from server: \"{kills}\"")
+                break
+
+        if not kills:
+            self.log.debug("User doesn't seem to be in the server, assuming still loading in")
+            kills = self.loc.text("Kills: {0}").format(0)
+            loaded_in = False
+
+        server_data['kills'] = kills
+
+    self.server_schedule.finished(address, 'ok' if loaded_in else 'loading', server_info.player_count if need_server_info else len(players_info), rate_limit)
+    self.last_server_request_data = server_data
+    return self.last_server_request_data
+
+
+# errors that mean the server didn't (or couldn't) answer, rather than something being wrong with the program
+def server_unreachable(error: OSError) -> bool:
+    return isinstance(error, (socket.timeout, ConnectionError)) or error.errno in unreachable_errnos or '[WinError 10051]' in str(error)
+
+
+def describe_network_error(error: OSError) -> str:
+    return "Timed out getting server info" if isinstance(error, socket.timeout) else f"Couldn't reach server ({repr(error)})"
+
 
 def unknown_data(loc: localization.Localizer, modes: List[str]) -> Dict[str, str]:
     server_data = {}
@@ -138,6 +194,24 @@ def unknown_data(loc: localization.Localizer, modes: List[str]) -> Dict[str, str
     return server_data
 
 
+# unknown data, except for what was saved from the last time this server was queried (the player count itself and kills always change, so those stay unknown)
+def cached_data(loc: localization.Localizer, modes: List[str], cached: Optional[dict]) -> Dict[str, str]:
+    server_data: Dict[str, str] = unknown_data(loc, modes)
+
+    if cached:
+        if 'Server name' in modes:
+            server_data['server_name'] = cached['server_name']
+        if 'Player count' in modes:
+            server_data['player_count'] = loc.text("Players: {0}/{1}").format("?", displayed_max_players(cached['max_players'], cached['keywords']))
+
+    return server_data
+
+
+def displayed_max_players(max_players: int, keywords: str) -> int:
+    # Valve servers report 32 (for SourceTV and replay bots or something), but only 24 can play
+    return 24 if 'valve' in keywords else max_players
+
+
 # make server names look a bit nicer
 @functools.cache
 def cleanup_server_name(name: str) -> str:
@@ -154,11 +228,451 @@ def cleanup_server_name(name: str) -> str:
             return name
 
 
+# remembers the name, max players, and keywords of recently joined servers between launches, so that rejoining one shows something right away instead of
+# "Unknown server name" until the first query answers (which then refreshes it). least recently used servers are forgotten past server_cache_size
+class ServerInfoCache:
+    def __init__(self, log: logger.Log, path: Optional[str]):
+        self.log: logger.Log = log
+        self.path: Optional[str] = path  # None to only keep it in memory
+        self.servers: Optional[collections.OrderedDict] = None  # address: entry, least recently used first. loaded on first use
+        self.dirty: bool = False
+        self.last_save_time: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"server.ServerInfoCache ({self.path}, {len(self.servers) if self.servers is not None else 'not loaded'} servers, dirty={self.dirty})"
+
+    # the saved info for a server, or None if it hasn't been seen (recently enough)
+    def get(self, address: str) -> Optional[dict]:
+        servers: collections.OrderedDict = self.load()
+        entry: Optional[dict] = servers.get(address)
+
+        if entry is None:
+            return None
+        elif time.time() - entry['last_seen'] > server_cache_max_age:
+            del servers[address]
+            self.dirty = True
+            return None
+
+        servers.move_to_end(address)
+        self.log.debug(f"Using cached server info for {address}: {entry}")
+        return entry
+
+    def put(self, address: str, server_name: str, max_players: int, keywords: str):
+        servers: collections.OrderedDict = self.load()
+        old_entry: Optional[dict] = servers.get(address)
+        entry: dict = {'server_name': server_name, 'max_players': max_players, 'keywords': keywords, 'last_seen': int(time.time())}
+        servers[address] = entry
+        servers.move_to_end(address)
+
+        # only last_seen changing (the usual case) isn't worth writing the file every query for
+        if old_entry is None or any(old_entry[key] != entry[key] for key in ('server_name', 'max_players', 'keywords')) \
+                or entry['last_seen'] - old_entry['last_seen'] >= server_cache_touch_interval:
+            self.dirty = True
+
+        while len(servers) > server_cache_size:
+            servers.popitem(last=False)
+
+        self.save()
+
+    def load(self) -> collections.OrderedDict:
+        if self.servers is not None:
+            return self.servers
+
+        self.servers = collections.OrderedDict()
+
+        if not self.path:
+            return self.servers
+
+        try:
+            with open(self.path, 'r', encoding='UTF8') as cache_file:
+                cache: dict = ujson.load(cache_file)
+        except FileNotFoundError:
+            return self.servers
+        except (OSError, ValueError) as error:
+            self.log.error(f"Couldn't load server info cache: {error}", reportable=False)
+            return self.servers
+
+        try:
+            if cache['version'] != server_cache_version:
+                self.log.debug(f"Server info cache is version {cache['version']}, ignoring it")
+                return self.servers
+
+            now: float = time.time()
+
+            for address, entry in cache['servers'].items():
+                if now - entry['last_seen'] <= server_cache_max_age:
+                    self.servers[address] = {'server_name': str(entry['server_name']), 'max_players': int(entry['max_players']), 'keywords': str(entry['keywords']),
+                                             'last_seen': int(entry['last_seen'])}
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            self.log.error(f"Invalid server info cache: {repr(error)}", reportable=False)
+            self.servers.clear()
+            return self.servers
+
+        while len(self.servers) > server_cache_size:
+            self.servers.popitem(last=False)
+
+        self.log.debug(f"Loaded server info cache: {self}")
+        return self.servers
+
+    def save(self, force: bool = False):
+        if not self.dirty or (not force and time.perf_counter() - self.last_save_time < server_cache_interval):
+            return
+
+        self.last_save_time = time.perf_counter()
+        self.dirty = False
+
+        if not self.path:
+            return
+
+        try:
+            with open(f'{self.path}.tmp', 'w', encoding='UTF8') as cache_file:
+                ujson.dump({'version': server_cache_version, 'servers': self.servers}, cache_file, ensure_ascii=False, escape_forward_slashes=False)
+                cache_file.flush()
+                os.fsync(cache_file.fileno())
+
+            os.replace(f'{self.path}.tmp', self.path)
+        except OSError as error:
+            self.log.error(f"Couldn't save server info cache: {error}", reportable=False)
+
+
+# decides when each server is next due a query, instead of one rate limit for everything and retrying failures every loop:
+# often right after joining or a map change (while players pile in), every server_rate_limit seconds once the player count settles, and exponentially less often while a server isn't answering
+class QueryScheduler:
+    def __init__(self, log: logger.Log):
+        self.log: logger.Log = log
+        self.schedules: Dict[str, ServerSchedule] = {}
+        self.map_change_time: float = 0.0
+        self.queries: int = 0
+        self.saved_queries: int = 0  # compared to the old fixed rate limit (which retried failures immediately). negative if fast mode costs more than backoff saves
+
+    def __repr__(self) -> str:
+        return f"server.QueryScheduler ({len(self.schedules)} servers, queries={self.queries}, saved_queries={self.saved_queries})"
+
+    def schedule(self, address: str) -> 'ServerSchedule':
+        if address not in self.schedules:
+            if len(self.schedules) >= max_schedules:
+                del self.schedules[next(iter(self.schedules))]  # oldest
+
+            self.schedules[address] = ServerSchedule(time.time() + fast_period)  # just connected
+
+        return self.schedules[address]
+
+    # whether a server should be queried now
+    def due(self, address: str, rate_limit: float) -> bool:
+        schedule: ServerSchedule = self.schedule(address)
+        now: float = time.time()
+
+        if schedule.seen_map_change_time < self.map_change_time:
+            schedule.seen_map_change_time = self.map_change_time
+            schedule.fast_until = self.map_change_time + fast_period
+            schedule.unchanged_results = 0
+
+            # (unless it was just queried, like when it's prefetched while connecting)
+            if not schedule.failures and schedule.started_time < self.map_change_time - fast_interval:
+                schedule.next_query_time = min(schedule.next_query_time, now)
+
+        if now >= schedule.next_query_time:
+            return True
+
+        if now >= schedule.old_next_query_time:
+            self.saved_queries += 1
+            schedule.old_next_query_time = now if schedule.failures else now + rate_limit  # the old way would have queried now, and failed again if it's been failing
+
+        return False
+
+    def started(self, address: str, rate_limit: float):
+        schedule: ServerSchedule = self.schedule(address)
+        now: float = time.time()
+        schedule.started_time = now
+        self.queries += 1
+
+        if now >= schedule.old_next_query_time:
+            schedule.old_next_query_time = now + rate_limit  # the old way would have queried now too
+        else:
+            self.saved_queries -= 1
+        schedule.next_query_time = now + rate_limit  # in case the result never gets read (leaving the server mid-query)
+
+    # outcome is 'ok', 'loading' (answered, but the user isn't in the player list yet), or 'failed' (timed out or errored)
+    def finished(self, address: str, outcome: str, player_count: Optional[int], rate_limit: float):
+        schedule: ServerSchedule = self.schedule(address)
+        now: float = time.time()
+
+        if outcome == 'failed':
+            schedule.failures += 1
+            interval: float = min(backoff_base * 2 ** (schedule.failures - 1), backoff_max)
+            schedule.old_next_query_time = now
+            self.log.debug(f"Server {address} failed {schedule.failures} time(s) in a row, backing off for {interval} seconds")
+        else:
+            schedule.failures = 0
+
+            if player_count == schedule.player_count:
+                schedule.unchanged_results += 1
+            else:
+                schedule.unchanged_results = 0
+                schedule.player_count = player_count
+
+            # the player count settling down ends fast mode early
+            if schedule.unchanged_results >= fast_settle_results:
+                schedule.fast_until = 0.0
+
+            if outcome == 'loading':
+                interval = min(fast_interval, rate_limit)
+                schedule.old_next_query_time = now
+            else:
+                interval = min(fast_interval, rate_limit) if now < schedule.fast_until else rate_limit
+
+        schedule.next_query_time = now + interval
+
+    # a new map means players leaving and joining, so check more often for a bit
+    def map_changed(self):
+        self.map_change_time = time.time()
+
+    # force new queries
+    def clear(self):
+        self.schedules.clear()
+
+
+class ServerSchedule:
+    def __init__(self, fast_until: float):
+        self.next_query_time: float = 0.0
+        self.started_time: float = 0.0
+        self.old_next_query_time: float = 0.0  # when the fixed rate limit would've queried next, for counting saved queries
+        self.fast_until: float = fast_until
+        self.seen_map_change_time: float = time.time()
+        self.failures: int = 0
+        self.player_count: Optional[int] = None
+        self.unchanged_results: int = 0
+
+    def __repr__(self) -> str:
+        return f"server.ServerSchedule (next query in {round(self.next_query_time - time.time(), 1)}s, failures={self.failures}, fast={time.time() < self.fast_until}, " \
+               f"player_count={self.player_count})"
+
+
+# runs A2S queries on an asyncio event loop in a background thread, so that the main loop (and the GUI) never waits on a slow or lossy server
+# each server gets one UDP socket that's kept between queries, and info and players are requested on it at the same time
+class QueryEngine:
+    def __init__(self, log: logger.Log):
+        self.log: logger.Log = log
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.connections: Dict[Tuple[str, int], ServerConnection] = {}  # only touched from the loop's thread
+        self.new_result: threading.Event = threading.Event()  # for waking the main loop up early
+        self.queries: int = 0
+
+    def __repr__(self) -> str:
+        return f"server.QueryEngine ({len(self.connections)} connections, queries={self.queries}, running={self.thread is not None})"
+
+    # returns a future of (info, players), either of which is None if not needed. raises socket.timeout, a2s.BrokenMessageError, or OSError
+    def query(self, address: Tuple[str, int], need_info: bool, need_players: bool, timeout: float) -> concurrent.futures.Future:
+        if not self.loop:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name='A2S queries', daemon=True)
+            self.thread.start()
+            self.log.debug("Started A2S query thread")
+
+        self.queries += 1
+        return asyncio.run_coroutine_threadsafe(self.run_query(address, need_info, need_players, timeout), self.loop)
+
+    def close(self):
+        if not self.loop:
+            return
+
+        asyncio.run_coroutine_threadsafe(self.close_connections(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    async def run_query(self, address: Tuple[str, int], need_info: bool, need_players: bool, timeout: float) -> tuple:
+        try:
+            connection: Optional[ServerConnection] = self.connections.get(address)
+
+            if not connection or connection.closed:
+                if len(self.connections) >= max_connections:
+                    self.connections.pop(next(iter(self.connections))).close()  # oldest
+
+                transport, connection = await asyncio.get_running_loop().create_datagram_endpoint(ServerConnection, remote_addr=address)
+                self.connections[address] = connection
+
+            requests: list = []
+            if need_info:
+                requests.append(connection.request(InfoProtocol, timeout))
+            if need_players:
+                requests.append(connection.request(PlayersProtocol, timeout))
+
+            responses: list = await asyncio.gather(*requests)
+            return responses[0] if need_info else None, responses[-1] if need_players else None
+        except OSError as error:
+            # a timeout just means packet loss (or a slow server), anything else and the socket's probably no good anymore
+            if not isinstance(error, socket.timeout) and address in self.connections:
+                self.connections.pop(address).close()
+
+            raise
+        finally:
+            self.new_result.set()
+
+    async def close_connections(self):
+        for connection in self.connections.values():
+            connection.close()
+
+        self.connections.clear()
+
+
+# a request that's been sent and is waiting for its response
+class PendingRequest:
+    def __init__(self, future: asyncio.Future):
+        self.future: asyncio.Future = future
+        self.first_sent_time: float = time.monotonic()  # for ping, a2s measures from the first send too
+        self.challenge: int = 0  # the one it was last sent with
+        self.challenges: int = 0
+
+    def __repr__(self) -> str:
+        return f"server.PendingRequest (challenge={self.challenge}, challenges={self.challenges}, done={self.future.done()})"
+
+
+# one server's UDP socket, with info and players requests able to be waiting on it at once (responses are told apart by type)
+class ServerConnection(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.pending: Dict[type, PendingRequest] = {}
+        self.fragments: Dict[int, List[A2SFragment]] = {}
+        self.challenge: int = 0  # servers keep giving the same one to the same client, so remembering it saves a round trip next query
+        self.closed: bool = False
+
+    def __repr__(self) -> str:
+        return f"server.ServerConnection ({[a2s_protocol.__name__ for a2s_protocol in self.pending]}, challenge={self.challenge}, closed={self.closed})"
+
+    async def request(self, a2s_protocol: type, timeout: float):
+        pending: Optional[PendingRequest] = self.pending.get(a2s_protocol)
+
+        if not pending:
+            pending = PendingRequest(asyncio.get_running_loop().create_future())
+            self.pending[a2s_protocol] = pending
+            self.send(a2s_protocol, pending)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout(f"{a2s_protocol.__name__} request timed out") from None
+        finally:
+            if self.pending.get(a2s_protocol) is pending:
+                del self.pending[a2s_protocol]  # anything arriving for it late just gets ignored
+
+    def send(self, a2s_protocol: type, pending: PendingRequest):
+        pending.challenge = self.challenge
+        self.transport.sendto(header_simple + a2s_protocol.serialize_request(self.challenge))
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+        self.closed = True
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def connection_lost(self, error: Optional[Exception]):
+        self.closed = True
+        self.fail_pending(error if error else ConnectionResetError("A2S socket closed"))
+
+    # usually an ICMP port unreachable, from the server being down
+    def error_received(self, error: Exception):
+        self.fail_pending(error)
+        self.close()
+
+    def fail_pending(self, error: Exception):
+        for pending in self.pending.values():
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    def datagram_received(self, packet: bytes, address: tuple):
+        receive_time: float = time.monotonic()
+
+        try:
+            payload: Optional[bytes] = self.reassemble(packet)
+        except Exception:
+            return  # garbage, a real response will come (or the request will time out)
+
+        if not payload:
+            return
+
+        response_type: int = payload[0]
+        reader: ByteReader = ByteReader(io.BytesIO(payload[1:]), endian='<', encoding='utf-8')
+
+        if response_type == a2s_challenge_response:
+            try:
+                self.challenge = reader.read_uint32()
+            except a2s.BrokenMessageError:
+                return
+
+            for a2s_protocol, pending in self.pending.items():
+                if pending.challenge != self.challenge and not pending.future.done():
+                    pending.challenges += 1
+
+                    if pending.challenges > max_challenges:
+                        pending.future.set_exception(a2s.BrokenMessageError("Server keeps sending challenge responses"))
+                    else:
+                        self.send(a2s_protocol, pending)
+
+            return
+
+        for a2s_protocol, pending in self.pending.items():
+            if a2s_protocol.validate_response_type(response_type) and not pending.future.done():
+                try:
+                    pending.future.set_result(a2s_protocol.deserialize_response(reader, response_type, receive_time - pending.first_sent_time))
+                except Exception as error:
+                    pending.future.set_exception(a2s.BrokenMessageError(f"Couldn't parse {a2s_protocol.__name__} response: {repr(error)}"))
+
+                return
+
+    # returns a whole message once all of its fragments have arrived
+    def reassemble(self, packet: bytes) -> Optional[bytes]:
+        header: bytes = packet[:4]
+
+        if header == header_simple:
+            return packet[4:]
+        elif header == header_multi:
+            fragment: A2SFragment = decode_fragment(packet[4:])
+            fragments: List[A2SFragment] = self.fragments.setdefault(fragment.message_id, [])
+            fragments.append(fragment)
+
+            if len(fragments) < fragment.fragment_count:
+                return None
+
+            del self.fragments[fragment.message_id]
+            return b''.join(fragment.payload for fragment in sorted(fragments, key=lambda fragment: fragment.fragment_id)).removeprefix(header_simple)
+        else:
+            return None
+
+
 re_valve_server: Pattern[str] = re.compile(r'Valve Matchmaking Server \([a-zA-Z]+ srcds[0-9]+-[a-zA-Z]+\d #[0-9]+\)')
 re_valve_server_remove: Pattern[str] = re.compile(r' srcds[0-9]+-[a-zA-Z]+\d #[0-9]+')
 re_double_space: Pattern[str] = re.compile(r' {2,}')
-
-
+header_simple: bytes = b'\xFF\xFF\xFF\xFF'
+header_multi: bytes = b'\xFE\xFF\xFF\xFF'
+a2s_challenge_response: int = 0x41
+max_challenges: int = 5
+unreachable_errnos: Tuple[int, ...] = (errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EHOSTDOWN, errno.ENETDOWN)
+max_connections: int = 8
+max_schedules: int = 64
+fast_interval: float = 2.0
+fast_period: float = 60.0
+fast_settle_results: int = 3
+backoff_base: float = 2.0
+backoff_max: float = 120.0
+server_cache_version: int = 1
+server_cache_size: int = 256
+server_cache_max_age: float = 60 * 60 * 24 * 90  # servers change names and close down
+server_cache_touch_interval: float = 60 * 60 * 24  # seconds between saving just a new last_seen
+server_cache_interval: float = 30.0  # seconds between saves at most
+
+
+# query a server from the command line (or a local stand-in if no address is given)
 if __name__ == '__main__':
+    import sys
+    import a2s_stand_in
     import game_state
-    print(game_state.GameState().get_match_data('169.254.225.11:18384', ['Server name', 'Player count', 'Kills'], allow_network_errors=False))
+
+    stand_in: Optional[a2s_stand_in.StandInServer] = None if len(sys.argv) > 1 else a2s_stand_in.StandInServer().start()
+    print(game_state.GameState().get_match_data(sys.argv[1] if len(sys.argv) > 1 else stand_in.address, ['Server name', 'Player count', 'Kills'], {'Kataiser'}, allow_network_errors=False))
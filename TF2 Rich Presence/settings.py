@@ -4,13 +4,17 @@
 
 import functools
 import json
-import winreg
-from typing import Optional, Union
+from typing import Dict, Optional, Union
 
 import ujson
 
 import logger
 
+try:
+    import winreg
+except ImportError:  # not on Windows (e.g. running benchmarks), so settings only live in memory
+    winreg = None
+
 
 # access a setting from any file, with a string that is the same as the variable name (cached, so settings changes won't be rechecked right away)
 # TODO: access settings as a class with type hinted members
@@ -26,6 +30,9 @@ def get(setting: str) -> Union[str, int, bool]:
 # note that settings are saved as JSON in a single string key
 # could do this as a file in AppData\Roaming\TF2 Rich Presence, but it would likely be slower for no benefit AFAIK
 def access_registry(save: Optional[dict] = None) -> Optional[dict]:
+    if not winreg:
+        return access_memory(save)
+
     reg_key: winreg.HKEYType = winreg.CreateKey(winreg.HKEY_CURRENT_USER, r'Software\TF2 Rich Presence')
 
     try:
@@ -46,6 +53,19 @@ def access_registry(save: Optional[dict] = None) -> Optional[dict]:
         return reg_key_data
 
 
+# same as access_registry, but for when there's no registry
+def access_memory(save: Optional[dict] = None) -> Optional[dict]:
+    if save:
+        memory_registry['Settings'] = json.dumps(save, separators=(',', ':'))
+        get.cache_clear()
+        logger.Log.log_level_allowed.cache_clear()
+    else:
+        if 'Settings' not in memory_registry:
+            memory_registry['Settings'] = json.dumps(defaults(), separators=(',', ':'))
+
+        return ujson.loads(memory_registry['Settings'])
+
+
 # changes a single setting
 def change(setting: str, value: Union[str, int, bool, float]):
     current_settings = access_registry()
@@ -114,6 +134,9 @@ def fix_settings(log):
         log.error(f"Fixed settings: added {added}, removed {removed}")
 
 
+memory_registry: Dict[str, str] = {}
+
+
 if __name__ == '__main__':
     for setting in defaults():
         print(f"{setting}: {get(setting)}")
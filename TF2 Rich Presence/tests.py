@@ -6,18 +6,27 @@ import io
 import os
 import random
 import shutil
+import socket
+import subprocess
+import sys
 import time
 import tkinter as tk
 import traceback
 import unittest
+import unittest.mock
 
+import a2s
 import psutil
 import requests
 from PIL import Image
 from discoIPC import ipc
 
+import a2s_stand_in
+import benchmarks
 import configs
 import console_log
+import file_identity
+import file_watch
 import game_state
 import gamemodes
 import gui
@@ -25,7 +34,9 @@ import launcher
 import localization
 import logger
 import main
+import process_watch
 import processes
+import replay
 import server
 import settings
 import settings_gui
@@ -61,7 +72,7 @@ class TestTF2RichPresence(unittest.TestCase):
         self.assertEqual(app.interpret_console_log('test_resources\\console_queued_casual.log', {'not Kataiser'}, float('inf'), True), (True, '', '', '', 'Queued for Casual', False))
         self.assertEqual(app.interpret_console_log('test_resources\\console_badwater.log', {'not Kataiser'}, float('inf'), True), (False, 'pl_badwater', 'Pyro', '', 'Not queued', True))
         self.assertEqual(app.interpret_console_log('test_resources\\console_badwater.log', {'not Kataiser'}, float('inf'), True, recent_time), (True, '', '', '', 'Not queued', False))
-        self.assertEqual(app.interpret_console_log('test_resources\\console_badwater.log', {'not Kataiser'}, 0.2, True), (True, '', '', '', 'Not queued', False))
+        self.assertEqual(app.interpret_console_log('test_resources\\console_badwater.log', {'not Kataiser'}, 0.2, True), (False, 'pl_badwater', 'Pyro', '', 'Not queued', True))  # window grows
         self.assertEqual(app.interpret_console_log('test_resources\\console_custom_map.log', {'not Kataiser'}, float('inf'), True),
                          (False, 'cp_catwalk_a5c', 'Soldier', '', 'Not queued', True))
         self.assertEqual(app.interpret_console_log('test_resources\\console_soundemitter.log', {'not Kataiser'}, float('inf'), True), (True, '', '', '', 'Not queued', False))
@@ -103,6 +114,7 @@ class TestTF2RichPresence(unittest.TestCase):
         with open(errorstest_small, 'r', encoding='UTF8') as errorstest_small_unclean:
             self.assertTrue('DataTable warning' in errorstest_small_unclean.read())
         app.interpret_console_log(errorstest_small, {'not Kataiser'}, float('inf'))
+        app.console_log_cleaner.thread.join()  # cleaning happens in the background
         cleaned_size = os.stat(errorstest_small).st_size
         self.assertLess(cleaned_size, initial_size)
         with open(errorstest_small, 'r', encoding='UTF8') as errorstest_small_cleaned:
@@ -112,6 +124,362 @@ class TestTF2RichPresence(unittest.TestCase):
 
         app.gui.master.destroy()
 
+    def test_interpret_console_log_incremental(self):
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+        settings.change('trim_console_log', False)
+        appending_path = 'test_resources\\console_appending.log'
+        events_applied = 0
+
+        for source_path in ('test_resources\\console_chat.log', 'test_resources\\console_soundemitter.log', 'test_resources\\console_blanks.log'):
+            with open(source_path, 'rb') as source_file:
+                source_data = source_file.read()
+
+            open(appending_path, 'wb').close()
+            app.console_log_parser = None
+            folded_game_state = game_state.GameState(self.log, app.loc)
+
+            for chunk_start in range(0, len(source_data), 250000):
+                with open(appending_path, 'ab') as appending_file:
+                    appending_file.write(source_data[chunk_start:chunk_start + 250000])
+
+                app.old_console_log_mtime = None
+                parse_result = app.interpret_console_log(appending_path, {'not Kataiser'}, float('inf'))
+
+                # like main does, only the first scan sets everything
+                if app.console_log_events is None:
+                    self.assertEqual(chunk_start, 0)
+                    folded_game_state.set_bulk(parse_result)
+                    folded_game_state.connected_address = app.console_log_parser.server_address
+                else:
+                    for event in app.console_log_events:
+                        folded_game_state.apply(event)
+                        events_applied += 1
+
+            self.assertGreater(app.console_log_parser.offset, len(source_data) - 250000)
+            self.assertEqual(parse_result, app.interpret_console_log(source_path, {'not Kataiser'}, float('inf'), True))
+            self.assertIsNone(app.console_log_events)
+            bulk_game_state = game_state.GameState(self.log, app.loc)
+            bulk_game_state.set_bulk(parse_result)
+            self.assertEqual(str(folded_game_state), str(bulk_game_state))
+
+        self.assertGreater(events_applied, 0)
+
+        # shortening the file means it gets rescanned from scratch
+        with open(appending_path, 'wb') as appending_file:
+            appending_file.write(b'Map: itemtest\n')
+        app.old_console_log_mtime = None
+        self.assertEqual(app.interpret_console_log(appending_path, {'not Kataiser'}, float('inf')), (False, 'itemtest', '', '', 'Not queued', False))
+        self.assertEqual(app.console_log_parser.offset, 14)
+
+        os.remove(appending_path)
+        app.gui.master.destroy()
+
+    def test_console_log_scan_window(self):
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+        full_result = app.interpret_console_log('test_resources\\console_community_disconnect2.log', {'not Kataiser'}, float('inf'), True)
+        app.console_scan_window = console_log.ScanWindow(self.log)
+
+        # too short a window gets retried bigger instead of giving the wrong state, and then the next scan's window fits
+        self.assertEqual(app.interpret_console_log('test_resources\\console_community_disconnect2.log', {'not Kataiser'}, 0.2, True), full_result)
+        self.assertEqual((app.console_scan_window.scans, app.console_scan_window.hits), (1, 0))
+        self.assertGreaterEqual(app.console_scan_window.size, console_log.scan_window_min)
+        self.assertEqual(app.interpret_console_log('test_resources\\console_community_disconnect2.log', {'not Kataiser'}, 0.2, True), full_result)
+        self.assertEqual((app.console_scan_window.scans, app.console_scan_window.hits), (2, 1))
+
+        # even when the last map change is at the very start of a big console.log, the window grows until it gets there (bounded by the file's size), instead of guessing
+        no_map_path = 'test_resources\\console_no_map.log'
+        with open(no_map_path, 'wb') as no_map_file:
+            no_map_file.write(b'Map: itemtest\n')
+            no_map_file.write(b''.join(f"Someone :  chat line {line_number}\n".encode() for line_number in range(100000)))
+
+        app.console_scan_window = console_log.ScanWindow(self.log)
+        self.assertEqual(app.interpret_console_log(no_map_path, {'not Kataiser'}, 4, True), (False, 'itemtest', '', '', 'Not queued', False))
+        self.assertEqual(app.interpret_console_log(no_map_path, {'not Kataiser'}, float('inf'), True), (False, 'itemtest', '', '', 'Not queued', False))
+        self.assertEqual((app.console_log_parser.replay_start, app.console_scan_window.scans, app.console_scan_window.hits), (0, 2, 1))
+        os.remove(no_map_path)
+        app.gui.master.destroy()
+
+    def test_file_identity(self):
+        identity_path = 'test_resources\\file_identity.log'
+        file_data = b''.join(f'line {line_number}\n'.encode() for line_number in range(10000))
+
+        def compare(data: bytes, replace: bool = False):
+            if replace:
+                os.remove(identity_path)
+            with open(identity_path, 'rb+' if os.path.isfile(identity_path) else 'wb') as identity_file:
+                identity_file.write(data)
+                identity_file.truncate()
+            return identity.compare(data, os.stat(identity_path))
+
+        with open(identity_path, 'wb') as identity_file:
+            identity_file.write(file_data)
+        identity = file_identity.FileIdentity()
+        identity.update(file_data, os.stat(identity_path), 50000)
+
+        self.assertEqual(compare(file_data + b'more\n'), ('appended', 50000))
+        self.assertEqual(compare(file_data[1000:]), ('head trimmed', 49000))
+        self.assertEqual(compare(file_data[:40000]), ('rewritten', -1))
+        self.assertEqual(compare(b'something else\n' * 5000), ('rewritten', -1))
+        identity_file_id = identity.file_id
+        compare(file_data, True)
+        if os.stat(identity_path).st_ino != identity_file_id[1]:  # inode numbers can be reused immediately
+            self.assertEqual(identity.compare(file_data, os.stat(identity_path)), ('replaced', 50000))
+
+        # and in the parser, resyncing after the start's been trimmed means only what was appended after that gets read
+        settings.change('trim_console_log', False)
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+        with open('test_resources\\console_community_disconnect.log', 'rb') as source_file:
+            file_data = source_file.read()
+        with open(identity_path, 'wb') as identity_file:
+            identity_file.write(file_data)
+        app.interpret_console_log(identity_path, {'not Kataiser'}, float('inf'))
+        with open(identity_path, 'wb') as identity_file:
+            identity_file.write(file_data + b'Map: itemtest\n')
+        untrimmed_result = app.interpret_console_log(identity_path, {'not Kataiser'}, float('inf'), True)
+        app.console_log_parser = None
+        app.interpret_console_log(identity_path, {'not Kataiser'}, float('inf'))
+        with open(identity_path, 'rb+') as identity_file:
+            identity_file.write(file_data[len(file_data) // 2:] + b'Map: itemtest\n')
+            identity_file.truncate()
+        self.assertEqual(app.interpret_console_log(identity_path, {'not Kataiser'}, float('inf')), untrimmed_result)
+        self.assertEqual(app.console_log_parser.offset, os.stat(identity_path).st_size)
+        self.assertEqual(app.console_log_parser.identity.offset, os.stat(identity_path).st_size)
+
+        os.remove(identity_path)
+        app.gui.master.destroy()
+
+    def test_console_log_checkpoint(self):
+        settings.change('trim_console_log', False)
+        checkpoint_path = 'test_resources\\console_checkpoint.json'
+        resuming_path = 'test_resources\\console_resuming.log'
+        shutil.copy('test_resources\\console_community_disconnect.log', resuming_path)
+
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+        app.console_log_checkpoint = console_log.ConsoleLogCheckpoint(self.log, checkpoint_path)
+        parse_result = app.interpret_console_log(resuming_path, {'not Kataiser'}, float('inf'))
+        self.assertTrue(os.path.isfile(checkpoint_path))
+
+        # a restart resumes from the end of the file, instead of scanning it again
+        restarted_app = main.TF2RichPresense(self.log, set_process_priority=False)
+        restarted_app.console_log_checkpoint = console_log.ConsoleLogCheckpoint(self.log, checkpoint_path)
+        self.assertEqual(restarted_app.interpret_console_log(resuming_path, {'not Kataiser'}, float('inf')), parse_result)
+        self.assertEqual(restarted_app.console_log_parser.offset, os.stat(resuming_path).st_size)
+
+        # appending is fine, but not modifying what's already been parsed
+        with open(resuming_path, 'ab') as resuming_file:
+            resuming_file.write(b'Map: itemtest\nSpy selected \n')
+        self.assertIsNotNone(restarted_app.console_log_checkpoint.load(resuming_path, os.stat(resuming_path), {'not Kataiser'}))
+        self.assertIsNone(restarted_app.console_log_checkpoint.load(resuming_path, os.stat(resuming_path), {'Kataiser'}))
+        with open(resuming_path, 'rb+') as resuming_file:
+            resuming_file.write(b'X')
+        self.assertIsNone(restarted_app.console_log_checkpoint.load(resuming_path, os.stat(resuming_path), {'not Kataiser'}))
+
+        restarted_app.console_log_checkpoint.discard()
+        self.assertFalse(os.path.isfile(checkpoint_path))
+        os.remove(resuming_path)
+        app.gui.master.destroy()
+        restarted_app.gui.master.destroy()
+
+    def test_console_log_marker_scanner(self):
+        state_attributes = ('in_menus', 'tf2_map', 'tf2_class', 'server_address', 'queued_state', 'just_started_server', 'server_still_running', 'kataiser_seen_on')
+
+        for console_log_path in ('test_resources\\console_chat.log', 'test_resources\\console_canceled_load.log', 'test_resources\\console_community_disconnect.log',
+                                 'test_resources\\console_soundemitter.log', 'test_resources\\console_map_material.log'):
+            line_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+            scanning_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+
+            with open(console_log_path, 'r', errors='replace', encoding=line_parser.encoding) as console_log_file:
+                for line in console_log_file.readlines():
+                    line_parser.parse_line(line)
+
+            scanning_parser.feed(scanning_parser.read(os.stat(console_log_path), 0))
+            self.assertEqual([getattr(line_parser, a) for a in state_attributes], [getattr(scanning_parser, a) for a in state_attributes])
+
+    def test_console_log_backward_scan(self):
+        state_attributes = ('offset', 'in_menus', 'tf2_map', 'tf2_class', 'server_address', 'queued_state', 'server_still_running', 'kataiser_seen_on', 'using_wav_cache')
+
+        for console_log_path in ('test_resources\\console_chat.log', 'test_resources\\console_canceled_load.log', 'test_resources\\console_community_disconnect.log',
+                                 'test_resources\\console_community_disconnect2.log', 'test_resources\\console_soundemitter.log', 'test_resources\\console_map_material.log',
+                                 'test_resources\\console_party_noise.log'):  # [PartyClient] lines that don't change the queued state, after one that does
+            console_log_stat = os.stat(console_log_path)
+
+            for from_byte in (0, 5000):
+                forward_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+                forward_parser.feed(forward_parser.read(console_log_stat, from_byte))
+                backward_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+                backward_buffer = backward_parser.read_backward(console_log_stat, from_byte)
+                backward_parser.feed(backward_buffer)
+
+                self.assertEqual([getattr(forward_parser, a) for a in state_attributes], [getattr(backward_parser, a) for a in state_attributes])
+
+            if console_log_stat.st_size > 1024 ** 2:
+                self.assertLess(len(backward_buffer), console_log_stat.st_size / 4)
+
+    def test_console_log_parallel(self):
+        for console_log_path in ('test_resources\\console_chat.log', 'test_resources\\console_canceled_load.log', 'test_resources\\console_community_disconnect.log',
+                                 'test_resources\\console_community_disconnect2.log', 'test_resources\\console_map_material.log', 'test_resources\\console_soundemitter.log',
+                                 'test_resources\\console_party_noise.log'):
+            sequential_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+            sequential_parser.feed(sequential_parser.read(os.stat(console_log_path), 0))
+
+            for processes in (1, 3):
+                parallel_parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+                parallel_parser.feed(parallel_parser.read_parallel(os.stat(console_log_path), 0, processes))
+                self.assertEqual(str(parallel_parser), str(sequential_parser))
+                self.assertEqual((parallel_parser.server_address, parallel_parser.queued_state, parallel_parser.server_still_running),
+                                 (sequential_parser.server_address, sequential_parser.queued_state, sequential_parser.server_still_running))
+
+        # merging summaries shouldn't depend on how they're grouped
+        parser = console_log.ConsoleLogParser(self.log, 'console.log', {'not Kataiser'})
+        summaries = [[b'Connected to 162.254.192.155:27053\n', b'Map: koth_highpass\n'], [b'Pyro selected \n', b'Disconnect: Server shutting down.\n'],
+                     [b'[PartyClient] Leaving queue\n', b'Map: pl_snowycoast\n'], [b'Spy selected \n']]
+        merged_left = parser.merge_summaries(parser.merge_summaries(parser.merge_summaries(summaries[0], summaries[1]), summaries[2]), summaries[3])
+        merged_right = parser.merge_summaries(summaries[0], parser.merge_summaries(summaries[1], parser.merge_summaries(summaries[2], summaries[3])))
+        self.assertEqual(merged_left, merged_right)
+        self.assertEqual(merged_left, [b'Connected to 162.254.192.155:27053\n', b'Map: koth_highpass\n', b'Pyro selected \n', b'Disconnect: Server shutting down.\n',
+                                       b'[PartyClient] Leaving queue\n', b'Map: pl_snowycoast\n', b'Spy selected \n'])
+
+        # a later part's [PartyClient] line that doesn't change the queued state doesn't replace an earlier one that does
+        merged_party = parser.merge_summaries([b'[PartyClient] Entering queue for match group 12v12 Casual Match\n', b'Connected to 162.254.192.155:27053\n', b'Map: koth_highpass\n'],
+                                              [b'[PartyClient] Member [U:1:123] now online\n', b'Disconnect: Server shutting down.\n', b'Map: pl_snowycoast\n'])
+        self.assertEqual(merged_party[0], b'[PartyClient] Entering queue for match group 12v12 Casual Match\n')
+        party_parser = console_log.ConsoleLogParser(self.log, 'console.log', {'not Kataiser'})
+        party_parser.feed(b''.join(merged_party))
+        self.assertEqual(party_parser.queued_state, "Queued for Casual")
+
+    def test_console_log_drop_head(self):
+        dropping_path = 'test_resources\\console_dropping.log'
+        file_data = bytes(random.getrandbits(8) for _ in range(3000000))
+
+        for drop_bytes in (0, 100, 1048576, 2500000, 3000000):
+            with open(dropping_path, 'wb') as dropping_file:
+                dropping_file.write(file_data)
+
+            with open(dropping_path, 'rb+', buffering=0) as dropping_file:
+                dropped_bytes = console_log.drop_head(self.log, dropping_file, drop_bytes)
+
+            # dropping with fallocate only drops whole blocks, so it might drop slightly less
+            self.assertLessEqual(dropped_bytes, drop_bytes)
+            self.assertGreater(dropped_bytes, drop_bytes - 65536)
+
+            with open(dropping_path, 'rb') as dropping_file:
+                self.assertEqual(dropping_file.read(), file_data[dropped_bytes:])
+
+        os.remove(dropping_path)
+
+    def test_console_log_events(self):
+        parser = console_log.ConsoleLogParser(self.log, 'console.log', {'Kataiser'})
+        lines = b'SV_ActivateServer: setting tickrate to 66.7\nMap: koth_highpass\nKataiser killed Kataiser with tf_projectile_rocket.\n' \
+                b'Demoman selected \n[PartyClient] Entering queue for match group 12v12 Casual Match\nDisconnect: Server shutting down.\n' \
+                b'Connected to 162.254.192.155:27053\nMap: pl_snowycoast\n[PartyClient] Leaving queue\n'
+        self.assertEqual(list(parser.events(lines)), [console_log.ServerStarted(), console_log.MapLoaded('koth_highpass', True), console_log.ClassSelected('Demoman'),
+                                                      console_log.QueueEntered('Queued for Casual'), console_log.ReturnedToMenus('Disconnect: Server shutting down.\n'),
+                                                      console_log.ConnectedTo('162.254.192.155:27053'), console_log.MapLoaded('pl_snowycoast', False), console_log.QueueLeft()])
+
+        # folding events should end up the same as setting the parse results
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+
+        for console_log_path in ('test_resources\\console_chat.log', 'test_resources\\console_community_disconnect.log', 'test_resources\\console_community_disconnect2.log',
+                                 'test_resources\\console_map_material.log'):
+            parser = console_log.ConsoleLogParser(self.log, console_log_path, {'not Kataiser'})
+            bulk_game_state = game_state.GameState(self.log, app.loc)
+            applied_game_state = game_state.GameState(self.log, app.loc)
+            bulk_game_state.set_bulk(app.interpret_console_log(console_log_path, {'not Kataiser'}, float('inf'), True))
+
+            for event in parser.events(parser.read(os.stat(console_log_path), 0)):
+                applied_game_state.apply(event)
+
+            self.assertEqual(str(applied_game_state), str(bulk_game_state))
+
+        app.gui.master.destroy()
+
+    def test_console_log_kill_feed(self):
+        parser = console_log.ConsoleLogParser(self.log, 'console.log', {'Kataiser', 'not Kataiser'})
+        parser.feed(b'Kataiser killed Heavy with minigun.\nMap: koth_highpass\nKataiser killed Heavy with minigun.\nKataiser killed Spy with tf_projectile_rocket. (crit)\n'
+                    b'Heavy killed Kataiser with minigun.\nKataiser killed Kataiser with tf_projectile_rocket.\nnot Kataiser killed Scout with scattergun.\n'
+                    b'Kataiser :  Kataiser killed Pyro with shotgun.\nKataiser suicided.\n')
+        self.assertEqual(parser.kills, 3)
+        parser.feed(b'Map: pl_snowycoast\n')
+        self.assertEqual(parser.kills, 0)
+
+        # the count has to be the same however console.log gets read
+        for read_method in ('read', 'read_backward', 'read_parallel'):
+            parser = console_log.ConsoleLogParser(self.log, 'test_resources\\console_blanks.log', {'Timmy'})
+            parser.feed(getattr(parser, read_method)(os.stat('test_resources\\console_blanks.log'), 0, *((2,) if read_method == 'read_parallel' else ())))
+            self.assertEqual(parser.kills, 50)
+
+        # and then the server doesn't need to be asked
+        app = main.TF2RichPresense(self.log, set_process_priority=False)
+        app.game_state.feed_kills = 12
+        app.game_state.get_match_data = lambda address, modes, usernames=None: {'player_count': "Players: 23/24"} if modes == ['Player count'] else None
+        app.game_state.update_server_data(['Kills', 'Player count'], {'Kataiser'})
+        self.assertEqual((app.game_state.kills, app.game_state.player_count), ("Kills: 12", "Players: 23/24"))
+        app.gui.master.destroy()
+
+    def test_file_watcher(self):
+        watched_path = 'test_resources\\console_watched.log'
+        with open(watched_path, 'w') as watched_file:
+            watched_file.write("Map: pl_badwater\n")
+
+        for use_inotify in (True, False):
+            watcher = file_watch.FileWatcher(self.log)
+            watcher.inotify_failed = not use_inotify  # inotify is only on Linux, so this may be polling both times
+            watcher.watch(watched_path)
+            self.assertFalse(watcher.wait(0.2))
+
+            with open(watched_path, 'a') as watched_file:
+                watched_file.write("Pyro selected \n")
+
+            wait_start = time.perf_counter()
+            while not watcher.wait(1 / 30):
+                self.assertLess(time.perf_counter() - wait_start, 2)
+
+            self.assertFalse(watcher.wait(0.2))
+            self.assertEqual(watcher.changes, 1)
+            watcher.close()
+
+        os.remove(watched_path)
+
+    def test_benchmarks_synthetic(self):
+        synthetic_path = 'test_resources\\console_synthetic.log'
+        line_count = benchmarks.generate_console_log(synthetic_path, 'casual', 102400)
+
+        with open(synthetic_path, 'rb') as synthetic_file:
+            synthetic_data = synthetic_file.read()
+
+        self.assertLessEqual(len(synthetic_data), 102400)
+        self.assertGreater(len(synthetic_data), 100000)
+        self.assertEqual(synthetic_data.count(b'\n'), line_count)
+        self.assertTrue(synthetic_data.endswith(b'\n'))
+        self.assertEqual(len(benchmarks.BenchmarkApp(self.log).scan(synthetic_path, True)), 6)
+        os.remove(synthetic_path)
+
+        baseline = {'casual/100 KB': {'fresh_scan_ms': 2.0, 'full_parse_mb_s': 50.0, 'peak_memory_mb': 1.0}}
+        self.assertEqual(benchmarks.find_regressions(baseline, {'casual/100 KB': {'fresh_scan_ms': 2.2, 'full_parse_mb_s': 45.0, 'peak_memory_mb': 1.1}}, 0.25), [])
+        self.assertEqual(len(benchmarks.find_regressions(baseline, {'casual/100 KB': {'fresh_scan_ms': 5.0, 'full_parse_mb_s': 20.0, 'peak_memory_mb': 3.0}}, 0.25)), 3)
+
+    def test_replay(self):
+        timeline = replay.load_timeline('test_resources\\console_community_disconnect.log', 0.05)
+        self.assertEqual(len(timeline), 336)
+        self.assertEqual(timeline[-1][0], 335 * 0.05)
+
+        # with the virtual clock, this is quite a bit faster than 17 seconds
+        replay_report = replay.replay(self.log, timeline, 0)
+        self.assertEqual(replay_report['transitions'], replay_report['detected'] + replay_report['coalesced'])
+        self.assertGreater(replay_report['detected'], 0)
+        self.assertLess(replay_report['latency_max'], settings.get('wait_time'))
+        self.assertGreater(replay_report['virtual_seconds'], timeline[-1][0])
+
+        # chat every 0.2 seconds doesn't wake up the main loop, but a class change among it does
+        chatty_timeline = [(0.0, b'Connected to 1.2.3.4:27015\n'), (0.0, b'Map: cp_dustbowl\n')]
+        chatty_timeline.extend((line_number * 0.2, f"Someone :  chat line {line_number}\n".encode()) for line_number in range(1, 150))
+        chatty_timeline.append((15.1, b'Pyro selected \n'))
+        chatty_timeline.sort(key=lambda line: line[0])
+        chatty_report = replay.replay(self.log, chatty_timeline, 0)
+        self.assertEqual(chatty_report['detected'], chatty_report['transitions'])
+        self.assertLess(chatty_report['latency_max'], settings.get('wait_time'))
+        self.assertLess(chatty_report['loop_iterations'], chatty_report['virtual_seconds'] / settings.get('wait_time') + 5)
+
     def test_non_ascii_in_usernames(self):
         self.assertFalse(console_log.non_ascii_in_usernames({'Hyde', 'Chocolate Thunder89', 'Sleepy'}))
         self.assertTrue(console_log.non_ascii_in_usernames({'Hyde', 'Chocolate Thunder89', '✿Sleepy✿'}))
@@ -153,30 +521,250 @@ class TestTF2RichPresence(unittest.TestCase):
         else:
             self.skipTest("Steam isn't running, assuming it's not installed")
 
-    @unittest.expectedFailure
     def test_get_match_info(self):
         test_game_state = game_state.GameState(self.log)
-        test_addresses = ('169.254.244.92:33600',  # valve
-                          'dal-1.us.uncletopia.com:27025',
-                          'chi.servers.creators.tf:27015',
-                          '192.223.26.238:27017',  # lazypurple
-                          '45.35.1.186:27065')  # blackwonder
-
-        for test_address in test_addresses:
-            try:
-                server_data = test_game_state.get_match_data(test_address, ['Server name', 'Player count', 'Kills'], allow_network_errors=False)
-                self.assertTrue(server_data['player_count'].startswith("Players: "))
-                self.assertIn(server_data['player_count'].split('/')[1], ('24', '26', '30', '32'))
-                self.assertEqual(server_data['kills'], "Kills: 0")
-
-                if "Valve" in server_data['server_name']:
-                    self.assertEqual(server_data['server_name'], "Valve Matchmaking Server (Virginia)")
-            except Exception as error:
-                raise AssertionError(f'{test_address}, {repr(error)}')
-
-        settings.change('request_timeout', 0.001)
-        self.assertEqual(test_game_state.get_match_data(test_addresses[-1], ['Server name', 'Player count', 'Kills']), server_data)
+        stand_in = a2s_stand_in.StandInServer().start()
+        modes = ['Server name', 'Player count', 'Kills']
+        stand_in.server_name = "Valve Matchmaking Server (Virginia srcds3155-iad2 #4)"
+        stand_in.keywords = 'hidden,increased_maxplayers,payload,valve'
+        stand_in.max_players = 32
+        stand_in.players = [(f"Player {player_number}", player_number, 60.0) for player_number in range(17)]
+        clock = replay.VirtualClock(0)  # so that waiting out the query schedule is instant
+        server.time = clock
+        self.addCleanup(setattr, server, 'time', time)
+
+        # not in the server yet, so assume no kills and check again soon
+        server_data = test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}, allow_network_errors=False)
+        self.assertEqual(server_data, {'server_name': "Valve Matchmaking Server (Virginia)", 'player_count': "Players: 17/24", 'kills': "Kills: 0"})
+        stand_in.players.append(('Kataiser', 8, 30.0))
+        clock.sleep(server.fast_interval)
+        server_data = test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}, allow_network_errors=False)
+        self.assertEqual(server_data, {'server_name': "Valve Matchmaking Server (Virginia)", 'player_count': "Players: 18/24", 'kills': "Kills: 8"})
+        requests_received = len(stand_in.requests)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), server_data)
+        self.assertEqual(len(stand_in.requests), requests_received)
+
+        stand_in.server_name = "█▙ Uncletopia  | Chicago | 1 | Casual Players Only █▟"
+        stand_in.keywords = 'nocrits,payload'
+        stand_in.max_players = 24
+        test_game_state.clear_server_data_cache()
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, ['Server name', 'Player count'], allow_network_errors=False),
+                         {'server_name': "Uncletopia | Chicago | 1 | Cas…", 'player_count': "Players: 18/24"})
+
+        # timeouts persist what's already known, other errors only keep what's cached
+        settings.change('request_timeout', 0.2)
+        known_data = test_game_state.last_server_request_data
+        clock.sleep(server.fast_interval)
+        stand_in.script.append('drop')  # just one request, since info has everything needed
+        test_game_state.get_match_data(stand_in.address, ['Server name', 'Player count'])
+        test_game_state.pending_server_query[2].exception(timeout=5)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, ['Server name', 'Player count']), known_data)
+        clock.sleep(server.backoff_base)
+        stand_in.script.append('malformed')
+        test_game_state.get_match_data(stand_in.address, ['Server name', 'Player count'])
+        test_game_state.pending_server_query[2].exception(timeout=5)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, ['Server name', 'Player count']), {'server_name': "Uncletopia | Chicago | 1 | Cas…", 'player_count': "Players: ?/24"})
+        clock.sleep(server.backoff_base * 2)
+        stand_in.script.extend(('malformed', 'malformed'))
+        self.assertRaises(a2s.BrokenMessageError, test_game_state.get_match_data, stand_in.address, modes, {'Kataiser'}, allow_network_errors=False)
+
         self.assertEqual(test_game_state.get_match_data('', ['Player count']), {'player_count': 'Players: ?/?'})
+        self.assertEqual(test_game_state.get_match_data('not an address', modes), server.unknown_data(test_game_state.loc, modes))
+        self.assertEqual(server.unknown_data(test_game_state.loc, ['Kills']), {'kills': "Kills: ?"})
+        self.assertEqual(server.unknown_data(test_game_state.loc, []), {})
+        test_game_state.server_queries.close()
+        stand_in.close()
+
+    def test_server_query_scheduler(self):
+        clock = replay.VirtualClock(0)
+        server.time = clock
+        self.addCleanup(setattr, server, 'time', time)
+        scheduler = server.QueryScheduler(self.log)
+
+        def run_query(outcome, player_count=None):
+            self.assertTrue(scheduler.due('1.2.3.4:27015', 10))
+            scheduler.started('1.2.3.4:27015', 10)
+            scheduler.finished('1.2.3.4:27015', outcome, player_count, 10)
+
+        def seconds_until_due():
+            seconds = 0
+
+            while not scheduler.due('1.2.3.4:27015', 10):
+                clock.sleep(1)
+                seconds += 1
+
+            return seconds
+
+        # just connected, so fast until the player count stops changing
+        for player_count in (10, 12, 15, 15, 15):
+            run_query('ok', player_count)
+            self.assertEqual(seconds_until_due(), server.fast_interval)
+
+        run_query('ok', 15)
+        self.assertEqual(seconds_until_due(), 10)
+        self.assertEqual(scheduler.saved_queries, -4)  # fast mode queried more than a fixed rate limit would
+
+        # dead servers get backed off from instead of retried every loop, up to a limit
+        for backoff in (2, 4, 8, 16, 32, 64, 120, 120):
+            run_query('failed')
+            self.assertEqual(seconds_until_due(), backoff)
+
+        self.assertEqual(scheduler.saved_queries, 362)  # one per due() check while backed off, which the old way would all have retried on
+        run_query('loading', 15)
+        self.assertEqual(seconds_until_due(), server.fast_interval)
+        run_query('ok', 15)
+        self.assertEqual(seconds_until_due(), 10)
+        scheduler.map_changed()
+        self.assertEqual(seconds_until_due(), 0)
+        run_query('ok', 15)
+        self.assertEqual(seconds_until_due(), server.fast_interval)
+        scheduler.clear()
+        self.assertEqual(seconds_until_due(), 0)
+        self.assertEqual(repr(scheduler), f"server.QueryScheduler (1 servers, queries={scheduler.queries}, saved_queries={scheduler.saved_queries})")
+
+    def test_server_query_engine(self):
+        stand_in = a2s_stand_in.StandInServer().start()
+        stand_in.server_name = "Test  server"
+        stand_in.split_size = 16
+        stand_in.players = [("Someone", 3, 60.0), ("Kataiser", 11, 120.0)]
+        test_game_state = game_state.GameState(self.log)
+        modes = ['Server name', 'Player count', 'Kills']
+
+        # doesn't wait, just says the data isn't known yet
+        stand_in.delay = 0.2
+        query_start_time = time.perf_counter()
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), server.unknown_data(test_game_state.loc, modes))
+        self.assertLess(time.perf_counter() - query_start_time, 0.1)
+        test_game_state.pending_server_query[2].result(timeout=5)
+        server_data = {'server_name': "Test server", 'player_count': "Players: 2/24", 'kills': "Kills: 11"}
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), server_data)
+        self.assertEqual(sorted(stand_in.requests), [0x54, 0x54, 0x55, 0x55])  # each got a challenge first
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), server_data)  # rate limited
+
+        # same socket, and the challenge is remembered
+        stand_in.delay = 0.0
+        test_game_state.clear_server_data_cache()
+        test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'})
+        test_game_state.pending_server_query[2].result(timeout=5)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), server_data)
+        self.assertEqual(sorted(stand_in.requests), [0x54, 0x54, 0x54, 0x55, 0x55, 0x55])
+        self.assertEqual(len(test_game_state.server_queries.connections), 1)
+
+        # the server changing its challenge costs a round trip, but works
+        stand_in.challenge = 1234
+        test_game_state.clear_server_data_cache()
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}, allow_network_errors=False), server_data)
+        self.assertEqual(len(stand_in.requests), 10)
+
+        settings.change('request_timeout', 0.2)
+        stand_in.script.extend(('drop', 'drop'))
+        test_game_state.clear_server_data_cache()
+        self.assertRaises(socket.timeout, test_game_state.get_match_data, stand_in.address, modes, {'Kataiser'}, allow_network_errors=False)
+        stand_in.script.extend(('drop', 'drop'))
+        test_game_state.clear_server_data_cache()
+        test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'})
+        test_game_state.pending_server_query[2].exception(timeout=5)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, {'Kataiser'}), {'server_name': "Test server", 'player_count': "Players: ?/24", 'kills': "Kills: ?"})
+        self.assertIsNone(test_game_state.pending_server_query)
+
+        test_game_state.server_queries.close()
+        stand_in.close()
+
+    def test_server_query_refused(self):
+        closed_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        closed_socket.bind(('127.0.0.1', 0))
+        closed_address = f'127.0.0.1:{closed_socket.getsockname()[1]}'
+        closed_socket.close()
+        test_game_state = game_state.GameState(self.log)
+        modes = ['Server name', 'Player count']
+
+        # nothing's listening, which is the same as the server not answering, not a crash
+        self.assertEqual(test_game_state.get_match_data(closed_address, modes), server.unknown_data(test_game_state.loc, modes))
+        self.assertIsInstance(test_game_state.pending_server_query[2].exception(timeout=5), ConnectionRefusedError)
+        self.assertEqual(test_game_state.get_match_data(closed_address, modes), server.unknown_data(test_game_state.loc, modes))
+        self.assertIsNone(test_game_state.pending_server_query)
+        test_game_state.clear_server_data_cache()
+        self.assertRaises(ConnectionRefusedError, test_game_state.get_match_data, closed_address, modes, allow_network_errors=False)
+
+        # even when the error is raised, the server gets backed off from
+        clock = replay.VirtualClock(0)
+        server.time = clock
+        self.addCleanup(setattr, server, 'time', time)
+        backoffs = []
+
+        for _ in range(3):
+            schedule = test_game_state.server_schedule.schedules[closed_address]
+            clock.sleep(schedule.next_query_time - clock.time())
+            self.assertRaises(ConnectionRefusedError, test_game_state.get_match_data, closed_address, modes, allow_network_errors=False)
+            backoffs.append(round(schedule.next_query_time - clock.time()))
+
+        self.assertEqual(backoffs, [4, 8, 16])
+        self.assertEqual(test_game_state.server_schedule.schedules[closed_address].failures, 4)
+        test_game_state.server_queries.close()
+
+    def test_server_info_cache(self):
+        cache_path = 'test_resources\\server_cache.json'
+        stand_in = a2s_stand_in.StandInServer().start()
+        stand_in.server_name = "Rejoinable server"
+        stand_in.max_players = 32
+        modes = ['Server name', 'Player count']
+        test_game_state = game_state.GameState(self.log, server_cache_path=cache_path)
+        self.assertEqual(test_game_state.get_match_data(stand_in.address, modes, allow_network_errors=False), {'server_name': "Rejoinable server", 'player_count': "Players: 0/32"})
+        test_game_state.server_queries.close()
+        self.assertTrue(os.path.isfile(cache_path))
+
+        # after a restart, rejoining shows what it was like last time right away, then refreshes it
+        stand_in.server_name = "Renamed server"
+        stand_in.delay = 0.2
+        restarted_game_state = game_state.GameState(self.log, server_cache_path=cache_path)
+        self.assertEqual(restarted_game_state.get_match_data(stand_in.address, modes), {'server_name': "Rejoinable server", 'player_count': "Players: ?/32"})
+        restarted_game_state.pending_server_query[2].result(timeout=5)
+        self.assertEqual(restarted_game_state.get_match_data(stand_in.address, modes), {'server_name': "Renamed server", 'player_count': "Players: 0/32"})
+        restarted_game_state.server_cache.save(force=True)
+        self.assertEqual(server.ServerInfoCache(self.log, cache_path).get(stand_in.address)['server_name'], "Renamed server")
+
+        # least recently used servers are forgotten
+        cache = server.ServerInfoCache(self.log, None)
+        for server_number in range(server.server_cache_size):
+            cache.put(f'10.0.0.{server_number % 256}:{27015 + server_number // 256}', f"Server {server_number}", 24, 'valve')
+        self.assertIsNotNone(cache.get('10.0.0.0:27015'))
+        cache.put('10.0.1.0:27015', "One more server", 24, '')
+        self.assertEqual(len(cache.servers), server.server_cache_size)
+        self.assertIsNone(cache.get('10.0.0.1:27015'))
+        self.assertEqual(server.cached_data(test_game_state.loc, modes, cache.get('10.0.0.0:27015')), {'server_name': "Server 0", 'player_count': "Players: ?/24"})
+
+        restarted_game_state.server_queries.close()
+        stand_in.close()
+        os.remove(cache_path)
+
+    def test_server_prefetch(self):
+        parser = console_log.ConsoleLogParser(self.log, 'console.log', {'Kataiser'})
+        lines = b'Connecting to matchmaking server 162.254.195.114:27046\nConnecting to 162.254.195.114:27046\nSaving E:\\Steam\\Hitsound.vpk.sound.cache\n' \
+                b'Connecting to 162.254.195.114:27046...\nConnected to 162.254.195.114:27046\nMap: koth_megalo\n'
+        self.assertEqual(list(parser.events(lines)), [console_log.ConnectingTo('162.254.195.114:27046'), console_log.ConnectedTo('162.254.195.114:27046'),
+                                                      console_log.MapLoaded('koth_megalo', False)])
+        self.assertEqual(parser.connecting_address, '')
+        parser.feed(b'Disconnect: #TF_MM_Generic_Kicked\nConnecting to 1.2.3.4:27015\n')
+        self.assertEqual(parser.connecting_address, '1.2.3.4:27015')
+        parser.feed(b'Connection failed after 4 retries.\n')
+        self.assertEqual(parser.connecting_address, '')
+
+        # the first time server data is asked for in game, it's already there
+        stand_in = a2s_stand_in.StandInServer().start()
+        stand_in.players = [("Someone", 3, 60.0)]
+        test_game_state = game_state.GameState(self.log)
+        test_game_state.apply(console_log.ConnectingTo(stand_in.address))
+        test_game_state.prefetch_server_data(['Server name', 'Player count'], {'Kataiser'})
+        test_game_state.pending_server_query[2].result(timeout=5)
+        test_game_state.set_bulk((False, 'cp_gullywash_final1', '', stand_in.address, "Not queued", False))
+        test_game_state.update_server_data(['Server name', 'Player count'], {'Kataiser'})
+        self.assertEqual((test_game_state.server_name, test_game_state.player_count), ("Stand-in server", "Players: 1/24"))
+        self.assertEqual(len(stand_in.requests), 2)  # loading the map right after prefetching doesn't query again
+        test_game_state.update_server_data(['Server name', 'Player count'], {'Kataiser'})
+        self.assertEqual(len(stand_in.requests), 2)
+
+        test_game_state.server_queries.close()
+        stand_in.close()
 
     def test_cleanup_server_name(self):
         self.assertEqual(server.cleanup_server_name("Valve Matchmaking Server (Virginia srcds3155-iad2 #4)"), "Valve Matchmaking Server (Virginia)")
@@ -383,7 +971,7 @@ class TestTF2RichPresence(unittest.TestCase):
         process_scanner.executables['posix'].append('python')
         process_scanner.executables['nt'].append('python')
 
-        self.assertEqual(len(process_scanner.scan()), 3)
+        self.assertIsInstance(process_scanner.scan(), processes.ProcessSnapshot)
         p_info = process_scanner.get_process_info(os.getpid(), ('path', 'time'))
 
         self.assertEqual(p_info['running'], True)
@@ -392,6 +980,137 @@ class TestTF2RichPresence(unittest.TestCase):
 
         self.assertFalse(process_scanner.hl2_exe_is_tf2(os.getpid()))
 
+    def test_process_snapshot(self):
+        tf2 = processes.ProgramSnapshot(True, 100, '/games/tf2', 1600000000)
+        before = processes.ProcessSnapshot(tf2, processes.ProgramSnapshot(True, 200, '/steam'), processes.ProgramSnapshot())
+        self.assertEqual((before.tf2.path, before['TF2']['path'], before['Discord']['running']), ('/games/tf2', '/games/tf2', False))
+        self.assertRaises(AttributeError, setattr, before.tf2, 'running', False)
+        self.assertRaises(AttributeError, setattr, before, 'discord', processes.ProgramSnapshot())
+        self.assertRaises(KeyError, before.__getitem__, 'Origin')
+        self.assertRaises(KeyError, before.tf2.__getitem__, '__class__')
+
+        # Steam restarted and Discord started
+        after = processes.ProcessSnapshot(tf2, processes.ProgramSnapshot(True, 201, '/steam'), processes.ProgramSnapshot(True, 300))
+        self.assertEqual(after.diff(before), (['Steam', 'Discord'], ['Steam']))
+        self.assertEqual(before.diff(after), (['Steam'], ['Steam', 'Discord']))
+        self.assertEqual(after.diff(None), (['TF2', 'Steam', 'Discord'], []))
+        self.assertEqual(after.diff(processes.ProcessSnapshot(tf2, processes.ProgramSnapshot(True, 201, '/steam'), processes.ProgramSnapshot(True, 300))), ([], []))
+
+        # scanning again without anything changing gives back the same snapshot
+        process_scanner = processes.ProcessScanner(self.log)
+        self.assertIs(process_scanner.scan(), process_scanner.scan())
+
+    def test_procfs_scanning(self):
+        procfs_path = 'test_resources\\procfs'
+        os.mkdir(procfs_path)
+        self.addCleanup(shutil.rmtree, procfs_path)
+        expected_pids = benchmarks.generate_procfs(procfs_path, 200)
+        self.addCleanup(setattr, processes, 'procfs_root', processes.procfs_root)
+        self.addCleanup(setattr, psutil, 'PROCFS_PATH', psutil.PROCFS_PATH)
+        processes.procfs_root = psutil.PROCFS_PATH = procfs_path
+
+        self.assertEqual(processes.procfs_pids({'hl2_linux', 'Discord', 'bash', 'not running'})['Discord'], {expected_pids['Discord']})
+        self.assertNotIn('not running', processes.procfs_pids({'not running'}))
+
+        # finds the same processes psutil would
+        procfs_scanner = processes.ProcessScanner(self.log)
+        procfs_scanner.find_pids_procfs()
+        psutil_scanner = processes.ProcessScanner(self.log)
+        psutil_scanner.find_pids_psutil()
+        self.assertEqual({program: procfs_scanner.process_data[program]['pid'] for program in expected_pids}, expected_pids)
+        self.assertEqual(procfs_scanner.process_data, psutil_scanner.process_data)
+
+        # once found, processes are only checked to still be running, and everything else is only looked for again every so often
+        posix_scanner = processes.ProcessScanner(self.log)
+        posix_scanner.process_watcher.pidfd_failed = True  # these PIDs aren't real
+        posix_scanner.probes = {}
+        posix_scanner.scan_posix()
+        self.assertEqual(({program: posix_scanner.process_data[program]['pid'] for program in expected_pids}, posix_scanner.enumerations), (expected_pids, 1))
+        self.assertEqual(posix_scanner.process_data['TF2']['path'], '/usr/bin')
+        tf2_data = posix_scanner.process_data['TF2'].copy()
+        posix_scanner.scan_posix()
+        self.assertEqual((posix_scanner.process_data['TF2'], posix_scanner.enumerations), (tf2_data, 1))
+
+        # Discord restarting with the same PID (somehow) still counts as a new process
+        discord_stat_path = os.path.join(procfs_path, str(expected_pids['Discord']), 'stat')
+        with open(discord_stat_path, 'r') as discord_stat_file:
+            discord_stat = discord_stat_file.read().split(' ')
+        discord_stat[21] = str(int(discord_stat[21]) + 1)
+        with open(discord_stat_path, 'w') as discord_stat_file:
+            discord_stat_file.write(' '.join(discord_stat))
+        posix_scanner.scan_posix()
+        self.assertEqual((posix_scanner.process_data['Discord']['running'], posix_scanner.enumerations), (False, 1))
+        posix_scanner.next_enumeration_time = 0.0
+        posix_scanner.scan_posix()
+        self.assertEqual((posix_scanner.process_data['Discord'], posix_scanner.enumerations), ({'running': True, 'pid': expected_pids['Discord']}, 2))
+
+    def test_process_watcher(self):
+        watcher = process_watch.ProcessWatcher(self.log)
+        if watcher.pidfd_failed:
+            self.skipTest("pidfds are only on Linux")
+
+        sleeper = subprocess.Popen((sys.executable, '-c', 'import time; time.sleep(30)'))
+        watcher.watch({'TF2': sleeper.pid})
+        self.assertTrue(watcher.watching('TF2', sleeper.pid))
+        self.assertEqual(watcher.exited(), [])
+        sleeper.kill()
+        sleeper.wait()
+        self.assertEqual(watcher.exited(), ['TF2'])
+
+        # the scanner forgets it without having to look
+        process_scanner = processes.ProcessScanner(self.log)
+        process_scanner.process_data['TF2'] = {'running': True, 'pid': sleeper.pid, 'path': '/usr/bin', 'time': int(time.time())}
+        process_scanner.process_watcher = watcher
+        process_scanner.probes = {}
+        process_scanner.next_enumeration_time = float('inf')
+        process_scanner.scan_posix()
+        self.assertEqual(process_scanner.process_data['TF2'], process_scanner.p_data_default['TF2'])
+        self.assertFalse(watcher.watching('TF2', sleeper.pid))
+        watcher.close()
+
+    def test_process_probes(self):
+        if not hasattr(socket, 'AF_UNIX') or not sys.platform.startswith('linux'):
+            self.skipTest("Probes are for Linux")
+
+        home_path = os.path.abspath('test_resources\\home')
+        os.makedirs(os.path.join(home_path, '.steam'))
+        self.addCleanup(shutil.rmtree, home_path)
+        environment_patch = unittest.mock.patch.dict(os.environ, {'HOME': home_path, 'XDG_RUNTIME_DIR': home_path})
+        environment_patch.start()
+        self.addCleanup(environment_patch.stop)
+
+        process_scanner = processes.ProcessScanner(self.log)
+        self.assertEqual((processes.probe_steam_pid_file(process_scanner), processes.probe_discord_ipc(process_scanner)), (None, None))
+
+        # this process pretends to be both Steam and Discord
+        with open(os.path.join(home_path, '.steam', 'steam.pid'), 'w') as steam_pid_file:
+            steam_pid_file.write(f'{os.getpid()}\n')
+        ipc_server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(ipc_server.close)
+        ipc_server.bind(os.path.join(home_path, 'discord-ipc-1'))
+        ipc_server.listen()
+        ipc_server.setblocking(False)
+        self.assertEqual((processes.probe_steam_pid_file(process_scanner), processes.probe_discord_ipc(process_scanner)), (os.getpid(), None))
+
+        # but only counts as them if it has the right name, and a socket that isn't Discord's isn't connected to again
+        self.assertIsNone(process_scanner.discord_ipc_path)
+        ipc_server.accept()[0].close()
+        self.assertIsNone(processes.probe_discord_ipc(process_scanner))
+        self.assertRaises(BlockingIOError, ipc_server.accept)
+        process_scanner.run_probes()
+        self.assertEqual((process_scanner.process_data['Steam']['pid'], process_scanner.probe_hits), (None, 0))
+        process_scanner.executables['posix'][1] = process_scanner.executables['posix'][2] = processes.process_identity(os.getpid())[0]
+        process_scanner.run_probes()
+        self.assertEqual((process_scanner.process_data['Steam']['pid'], process_scanner.process_data['Discord']['pid'], process_scanner.probe_hits), (os.getpid(), None, 1))
+
+        other_ipc_server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(other_ipc_server.close)
+        other_ipc_server.bind(os.path.join(home_path, 'discord-ipc-2'))
+        other_ipc_server.listen()
+        process_scanner.run_probes()
+        self.assertEqual((process_scanner.process_data['Discord']['pid'], process_scanner.probe_hits), (os.getpid(), 2))
+        self.assertEqual(process_scanner.discord_ipc_path, os.path.join(home_path, 'discord-ipc-2'))
+
     def test_settings_gui(self):
         root = tk.Toplevel()
         settings_gui_test = settings_gui.GUI(root, self.log)
@@ -53,12 +53,22 @@ def access_db(write: dict = None, pass_permission_error: bool = True) -> Optiona
 
 @functools.cache
 def db_json_path() -> str:
-    if os.path.isdir(os.path.join(os.getenv('APPDATA'), 'TF2 Rich Presence')):
+    if os.getenv('APPDATA') and os.path.isdir(os.path.join(os.getenv('APPDATA'), 'TF2 Rich Presence')):
         return os.path.join(os.getenv('APPDATA'), 'TF2 Rich Presence', 'DB.json')
     else:
         return 'DB.json'
 
 
+# next to DB.json
+def checkpoint_json_path() -> str:
+    return os.path.join(os.path.dirname(db_json_path()), 'console_log_checkpoint.json')
+
+
+# also next to DB.json
+def server_cache_json_path() -> str:
+    return os.path.join(os.path.dirname(db_json_path()), 'server_cache.json')
+
+
 # get an API key
 @functools.cache
 def get_api_key(service: str) -> str: